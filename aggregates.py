@@ -0,0 +1,455 @@
+"""Aggregates
+
+Mergeable accumulators of the reports on the cases reported in Colombia. Each
+accumulator is updated one chunk of cases at a time, and the accumulators of
+different chunks can be merged, so the reports can be computed without holding
+every case in memory. Reading all the cases at once is a single update, so both
+ways produce the same reports.
+
+Classes
+----------
+ValueCounts
+    Counts the values of a column in the order they first appear
+AgeHistogram
+    Counts the cases of every age
+CityDailyCounts
+    Counts the cases and deaths per day of every city of every department, and
+    rolls them up to the departments and the whole country
+DemographicCube
+    Counts the cases of every combination of place, age group, sex, type,
+    treatment and date, and rolls them up to any breakdown
+"""
+
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+UNKNOWN_DEPARTMENT = "Desconocido"
+AGE_GROUP_SIZE = 10
+OLDEST_AGE_GROUP = 80
+
+class ValueCounts:
+    """Counts the values of the column `column` in the order they first appear.
+
+    Parameters
+    ----------
+    column : String
+        The name of the column whose values are counted
+    dropna : Boolean, optional
+        Whether missing values are left out of the counts
+    """
+
+    def __init__(self, column, dropna=True):
+        self.column = column
+        self.columns = [column]
+        self.key = "value_counts_" + column + ("" if dropna else "_nan")
+        self.dropna = dropna
+        self.counts = Counter()
+
+    def update(self, chunk):
+        """Adds the values of the chunk of cases `chunk` to the counts.
+
+        Parameters
+        ----------
+        chunk : Dataframe
+            A Dataframe with a row per reported case
+
+        Returns
+        ----------
+        self : ValueCounts
+        """
+        codes, uniques = pd.factorize(chunk[self.column])
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        items = list(zip(np.asarray(uniques, dtype=object).tolist(),
+                         counts.tolist()))
+        missing = codes < 0
+        if not self.dropna and missing.any():
+            first = missing.argmax()
+            position = codes[:first].max() + 1 if first else 0
+            items.insert(position, (None, int(missing.sum())))
+        self.counts.update(dict(items))
+        return self
+
+    def merge(self, other):
+        """Adds the counts of the accumulator `other` to the counts.
+
+        Parameters
+        ----------
+        other : ValueCounts
+            An accumulator of the same column
+
+        Returns
+        ----------
+        self : ValueCounts
+        """
+        self.counts.update(other.counts)
+        return self
+
+    def result(self):
+        """Returns a Series object `counts` of the number of cases of every
+        value, in the order the values first appeared.
+
+        Missing values are counted under a NaN label.
+
+        Returns
+        ----------
+        counts : Series
+        """
+        labels = [np.nan if label is None else label
+                  for label in self.counts]
+        counts = pd.Series(list(self.counts.values()), index=labels,
+            dtype="int64")
+        return counts
+
+    def most_common(self):
+        """Returns a Series object `counts` of the number of cases of every
+        value, from the most to the least common.
+
+        Values with the same number of cases are sorted by value.
+
+        Returns
+        ----------
+        counts : Series
+        """
+        counts = self.result().sort_index()\
+            .sort_values(ascending=False, kind="mergesort")
+        return counts
+
+class AgeHistogram:
+    """Counts the cases of every age."""
+
+    columns = ["age"]
+    key = "age_histogram"
+
+    def __init__(self):
+        self.counts = np.zeros(256, dtype="int64")
+
+    def update(self, chunk):
+        """Adds the ages of the chunk of cases `chunk` to the histogram.
+
+        Parameters
+        ----------
+        chunk : Dataframe
+            A Dataframe with a row per reported case
+
+        Returns
+        ----------
+        self : AgeHistogram
+        """
+        ages = chunk["age"].to_numpy(dtype="int64")
+        self.counts += np.bincount(ages, minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        """Adds the histogram `other` to the histogram.
+
+        Parameters
+        ----------
+        other : AgeHistogram
+
+        Returns
+        ----------
+        self : AgeHistogram
+        """
+        self.counts += other.counts
+        return self
+
+    def result(self):
+        """Returns a Series object `counts` of the number of cases of every age
+        with at least one case, from the most to the least common.
+
+        Ages with the same number of cases are sorted by age.
+
+        Returns
+        ----------
+        counts : Series
+        """
+        ages = np.flatnonzero(self.counts)
+        counts = pd.Series(self.counts[ages], index=ages, name="age")\
+            .sort_values(ascending=False, kind="mergesort")
+        return counts
+
+class CityDailyCounts:
+    """Counts the cases and deaths per day of every city of every department.
+
+    A case counts as a death when it has a date of death. The counts of the
+    departments and of the whole country are rolled up from the counts of the
+    cities, and cases without a department are counted under
+    `UNKNOWN_DEPARTMENT`.
+    """
+
+    columns = ["dept", "city", "date", "date_death"]
+    key = "dept_city_daily_counts"
+
+    def __init__(self):
+        self.counts = None
+
+    def update(self, chunk):
+        """Adds the cases of the chunk of cases `chunk` to the tallies.
+
+        Parameters
+        ----------
+        chunk : Dataframe
+            A Dataframe with a row per reported case
+
+        Returns
+        ----------
+        self : CityDailyCounts
+        """
+        died = chunk["date_death"].notnull().rename("died")
+        dept = chunk["dept"]
+        if dept.isnull().any():
+            if isinstance(dept.dtype, pd.CategoricalDtype):
+                dept = dept.cat.add_categories([UNKNOWN_DEPARTMENT])
+            dept = dept.fillna(UNKNOWN_DEPARTMENT)
+        counts = chunk.groupby([dept, "city", died, "date"],
+                               observed=True).size()
+        for level in ("dept", "city"):
+            names = counts.index.levels[counts.index.names.index(level)]
+            counts.index = counts.index.set_levels(names.astype(object),
+                                                   level=level)
+        return self.__add(counts)
+
+    def merge(self, other):
+        """Adds the tallies of the accumulator `other` to the tallies.
+
+        Parameters
+        ----------
+        other : CityDailyCounts
+
+        Returns
+        ----------
+        self : CityDailyCounts
+        """
+        if other.counts is not None:
+            self.__add(other.counts)
+        return self
+
+    def result(self):
+        """Returns two Series objects, `ccpd` and `cdpd`, with the cases and
+        deaths per day of every city.
+
+        Returns
+        ----------
+        ccpd : Series
+            A Series indexed by city and date that contains the cases per day
+        cdpd : Series
+            A Series indexed by city and date that contains the deaths per day
+        """
+        return self.rollup("city")
+
+    def rollup(self, level=None):
+        """Returns two Series objects, `cases` and `deaths`, with the cases
+        that did not die and the deaths per day of every city, of every
+        department, or of the whole country, summed up from the tallies.
+
+        Parameters
+        ----------
+        level : String, optional
+            "city" or "dept". The counts of the whole country are returned if
+            no level is provided
+
+        Returns
+        ----------
+        cases : Series
+            A Series indexed by `level` and date, or by date, that contains
+            the cases that did not die per day
+        deaths : Series
+            A Series indexed like `cases` that contains the deaths per day
+        """
+        counts = self.counts
+        if counts is None:
+            counts = self.__empty()
+        levels = ["date"] if level is None else [level, "date"]
+        deaths = counts.index.get_level_values("died").to_numpy(dtype=bool)
+        cases = counts[~deaths].groupby(level=levels).sum()
+        deaths = counts[deaths].groupby(level=levels).sum()
+        return cases, deaths
+
+    def cities(self):
+        """Returns a list `cities` of every city with at least one case.
+
+        Returns
+        ----------
+        cities : List
+        """
+        if self.counts is None:
+            return []
+        cities = sorted(self.counts.index.unique(level="city"))
+        return cities
+
+    def changed(self, other):
+        """Returns a list `cities` of every city whose tallies differ from its
+        tallies in the accumulator `other`.
+
+        Parameters
+        ----------
+        other : CityDailyCounts
+
+        Returns
+        ----------
+        cities : List
+        """
+        counts = self.__empty() if self.counts is None else self.counts
+        previous = self.__empty() if other.counts is None else other.counts
+        difference = counts.sub(previous, fill_value=0)
+        cities = sorted(difference[difference != 0].index.unique(level="city"))
+        return cities
+
+    def __add(self, counts):
+        if self.counts is not None:
+            counts = pd.concat([self.counts, counts])\
+                .groupby(level=["dept", "city", "died", "date"]).sum()
+        self.counts = counts.sort_index()
+        return self
+
+    @staticmethod
+    def __empty():
+        index = pd.MultiIndex.from_arrays(
+            [pd.Index([], dtype=object), pd.Index([], dtype=object),
+             pd.Index([], dtype=bool), pd.DatetimeIndex([])],
+            names=["dept", "city", "died", "date"])
+        return pd.Series([], index=index, dtype="int64")
+
+class DemographicCube:
+    """Counts the cases of every combination of department, city, age group,
+    sex, type, treatment and date that has at least one case.
+
+    The cube is stored sparsely, as a Series of the counts indexed by the
+    integer codes of every dimension, and is computed in a single pass over
+    the codes of a chunk of cases. Any breakdown of the cases by some of the
+    dimensions, such as the cases per sex of a department, is then a roll-up
+    of the cube instead of another pass over the cases. Missing values are
+    counted under a NaN label.
+
+    The age groups are named by their youngest age, and span `AGE_GROUP_SIZE`
+    years, except the oldest one, which has every age from `OLDEST_AGE_GROUP`
+    on.
+    """
+
+    dimensions = ["dept", "city", "age_group", "sex", "type", "locTreatment",
+                  "date"]
+    columns = ["dept", "city", "age", "sex", "type", "locTreatment", "date"]
+    key = "demographic_cube"
+
+    def __init__(self):
+        self.counts = None
+
+    def update(self, chunk):
+        """Adds the cases of the chunk of cases `chunk` to the cube.
+
+        Parameters
+        ----------
+        chunk : Dataframe
+            A Dataframe with a row per reported case
+
+        Returns
+        ----------
+        self : DemographicCube
+        """
+        groups = (chunk["age"] // AGE_GROUP_SIZE * AGE_GROUP_SIZE)\
+            .clip(upper=OLDEST_AGE_GROUP)
+        values = [groups if column == "age" else chunk[column]
+                  for column in self.columns]
+        return self.__add(_tally(values, self.dimensions))
+
+    def merge(self, other):
+        """Adds the counts of the cube `other` to the cube.
+
+        Parameters
+        ----------
+        other : DemographicCube
+
+        Returns
+        ----------
+        self : DemographicCube
+        """
+        if other.counts is not None:
+            self.__add(other.counts)
+        return self
+
+    def result(self):
+        """Returns a Series object `counts` with the number of cases of every
+        combination of the dimensions with at least one case.
+
+        Returns
+        ----------
+        counts : Series
+            A Series indexed by every dimension
+        """
+        if self.counts is None:
+            return _tally([[] for _ in self.dimensions], self.dimensions)
+        return self.counts
+
+    def rollup(self, dimensions=(), **filters):
+        """Returns a Series object `counts` with the number of cases of every
+        combination of the dimensions provided, among the cases with the values
+        of the filters provided.
+
+        Parameters
+        ----------
+        dimensions : List, optional
+            The dimensions of the breakdown. The total of the cases is
+            returned if none are provided
+        **filters
+            The value of some dimensions of the cases counted, such as
+            `dept="Antioquia"`
+
+        Returns
+        ----------
+        counts : Series or Integer
+            A Series indexed by `dimensions` and sorted by them, with a single
+            level if there is one dimension, or the number of cases if no
+            dimension is provided
+        """
+        counts = self.result()
+        if filters:
+            selected = np.ones(len(counts), dtype=bool)
+            for dimension, value in filters.items():
+                selected &= counts.index.get_level_values(dimension) == value
+            counts = counts[selected]
+        if not dimensions:
+            return int(counts.sum())
+        counts = _tally([counts.index.get_level_values(dimension)
+                         for dimension in dimensions], list(dimensions),
+                        counts.to_numpy())
+        return counts
+
+    def __add(self, counts):
+        if self.counts is not None:
+            combined = pd.concat([self.counts, counts])
+            counts = _tally([combined.index.get_level_values(dimension)
+                             for dimension in self.dimensions],
+                            self.dimensions, combined.to_numpy())
+        self.counts = counts
+        return self
+
+def _tally(columns, names, weights=None):
+    """Returns a Series object `counts` indexed by the distinct combinations of
+    the values of `columns`, sorted, with the number of rows, or the sum of
+    their `weights`, of every combination.
+
+    Every column is factorized into integer codes, with missing values kept as
+    a code of their own, and the codes of every row are combined into a single
+    integer key that is counted at once.
+    """
+    codes = []
+    levels = []
+    for values in columns:
+        column_codes, uniques = pd.factorize(values, sort=True)
+        if isinstance(uniques, pd.Categorical):
+            uniques = np.asarray(uniques, dtype=object)
+        codes.append(column_codes + 1)
+        levels.append(pd.Index(uniques))
+    shape = [len(level) + 1 for level in levels]
+    keys = np.ravel_multi_index(codes, shape) if codes else np.array([])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=weights, minlength=len(unique))
+    index = pd.MultiIndex(levels=levels,
+        codes=[level_codes - 1
+               for level_codes in np.unravel_index(unique, shape)],
+        names=names)
+    if len(names) == 1:
+        index = index.get_level_values(0)
+    counts = pd.Series(counts.astype("int64"), index=index)
+    return counts
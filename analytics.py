@@ -0,0 +1,151 @@
+"""Analytics
+
+Rolling-window metrics of the daily values of many entities at once, such as
+countries, departments or cities. The daily values of every entity are held as
+a two dimensional array, with a row per entity and a column per day, and every
+metric is computed for all the entities in a single pass of vectorized
+operations over that array, instead of one entity at a time.
+
+For every entity and day, the metrics are the cumulative total, the average of
+the last `WINDOW` days, the growth factor of that average over the previous
+window, the number of days the total takes to double at the growth rate of the
+last window, and the total and the average per 100,000 inhabitants where the
+population of the entity is known.
+
+Functions
+----------
+rolling_mean : ndarray
+    Returns the mean of every window of days of every row of an array
+growth_factor : ndarray
+    Returns the ratio of every value of every row of an array to the value a
+    window of days earlier
+doubling_time : ndarray
+    Returns the number of days the cumulative totals of every row of an array
+    take to double at the growth rate of the last window of days
+metrics : Dataframe
+    Returns the metrics of every entity and day of a Dataframe of daily values
+"""
+
+import numpy as np
+import pandas as pd
+
+WINDOW = 7
+PER = 100000
+METRICS = ["new", "total", "average", "growth_factor", "doubling_time",
+           "total_per_100k", "average_per_100k"]
+
+def rolling_mean(values, window=WINDOW):
+    """Returns an ndarray object `means` with the mean of the last `window`
+    days of every day of every row of `values`.
+
+    Parameters
+    ----------
+    values : ndarray
+        A two dimensional array with a row per entity and a column per day
+    window : Integer, optional
+        The number of days of every window
+
+    Returns
+    ----------
+    means : ndarray
+        An array of floats shaped like `values`, with NaN on the days before
+        the first full window
+    """
+    sums = np.cumsum(values, axis=1, dtype="float64")
+    means = np.full(sums.shape, np.nan)
+    if sums.shape[1] >= window:
+        means[:, window - 1] = sums[:, window - 1]
+        means[:, window:] = sums[:, window:] - sums[:, :-window]
+        means[:, window - 1:] /= window
+    return means
+
+def growth_factor(values, window=WINDOW):
+    """Returns an ndarray object `factors` with the ratio of the value of every
+    day of every row of `values` to its value `window` days earlier.
+
+    Parameters
+    ----------
+    values : ndarray
+        A two dimensional array with a row per entity and a column per day
+    window : Integer, optional
+        The number of days between the values compared
+
+    Returns
+    ----------
+    factors : ndarray
+        An array of floats shaped like `values`, with NaN where there is no
+        earlier value or it is not positive
+    """
+    factors = np.full(values.shape, np.nan)
+    earlier = values[:, :-window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factors[:, window:] = np.where(earlier > 0,
+                                       values[:, window:] / earlier, np.nan)
+    return factors
+
+def doubling_time(totals, window=WINDOW):
+    """Returns an ndarray object `days` with the number of days the cumulative
+    total of every day of every row of `totals` takes to double, at the growth
+    rate it had over the last `window` days.
+
+    Parameters
+    ----------
+    totals : ndarray
+        A two dimensional array with a row per entity and a column per day of
+        cumulative totals
+    window : Integer, optional
+        The number of days the growth rate is measured over
+
+    Returns
+    ----------
+    days : ndarray
+        An array of floats shaped like `totals`, with NaN where the total did
+        not grow over the last window
+    """
+    factors = growth_factor(totals, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(factors > 1, window * np.log(2) / np.log(factors),
+                        np.nan)
+    return days
+
+def metrics(daily, populations=None, window=WINDOW):
+    """Returns a Dataframe object `table` with the metrics of every day of
+    every entity of the daily values provided.
+
+    Parameters
+    ----------
+    daily : Dataframe
+        A Dataframe with a row per entity, a column per consecutive day and
+        the values of every day, such as the cases per day
+    populations : Dictionary, optional
+        The number of inhabitants of the entities, keyed by entity. The values
+        per 100,000 inhabitants of the entities left out are empty
+    window : Integer, optional
+        The number of days of the rolling windows
+
+    Returns
+    ----------
+    table : Dataframe
+        A Dataframe indexed by entity and day, named like the index and the
+        columns of `daily`, with a column per metric of `METRICS`
+    """
+    values = daily.to_numpy(dtype="int64")
+    totals = np.cumsum(values, axis=1)
+    average = rolling_mean(values, window)
+    population = daily.index.map(lambda entity: (populations or {}).get(
+        entity, np.nan)).to_numpy(dtype="float64")[:, None]
+    columns = {
+        "new" : values,
+        "total" : totals,
+        "average" : average,
+        "growth_factor" : growth_factor(average, window),
+        "doubling_time" : doubling_time(totals, window),
+        "total_per_100k" : totals / population * PER,
+        "average_per_100k" : average / population * PER
+    }
+    index = pd.MultiIndex.from_product([daily.index, daily.columns],
+                                       names=[daily.index.name,
+                                              daily.columns.name])
+    table = pd.DataFrame({name : column.ravel()
+                          for name, column in columns.items()}, index=index)
+    return table
@@ -0,0 +1 @@
+# init file to stop PyLint from complaining
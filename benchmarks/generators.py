@@ -0,0 +1,160 @@
+"""Synthetic Data Generators
+
+Generators of synthetic csv files shaped like the datasets read by
+`corona_utils`, at any scale: the linelist of cases of the Instituto Nacional de
+Salud, with a row per case, and the global time series of Johns Hopkins
+University, with a row per location and a column per day. Uses `numpy` so that
+millions of rows can be generated in seconds.
+
+Functions
+----------
+write_linelist : Integer
+    Writes a synthetic linelist of the cases reported in Colombia to a csv file
+write_time_series : Integer
+    Writes a synthetic pair of global time series of cases and deaths to csv
+    files
+"""
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from variables.countries import COUNTRIES
+
+LINELIST_START = datetime(2020, 3, 6)
+TIME_SERIES_START = datetime(2020, 1, 22)
+
+CITIES = ["Bogotá", "Medellín", "Cali", "Barranquilla", "Cartagena", "Cúcuta",
+          "Soacha", "Soledad", "Bucaramanga", "Villavicencio", "Ibagué",
+          "Santa Marta", "Valledupar", "Manizales", "Pereira", "Montería",
+          "Neiva", "Pasto", "Armenia", "Popayán"]
+
+ORIGINS = ["Colombia", "España", "Italia", "Estados Unidos", "México",
+           "Estados Unidos - España", "Brasil - Perú - Chile", "Panamá",
+           "Francia - Alemania", "Ecuador"]
+
+def write_linelist(path, rows, cities=100, days=200, seed=0):
+    """Writes a synthetic linelist of `rows` cases reported in Colombia to the
+    csv file `path`, with the columns and date formats of the csv file of the
+    Instituto Nacional de Salud.
+
+    The cases are spread over `cities` cities, with a few large cities holding
+    most of them, and over `days` days, with more cases every day.
+
+    Parameters
+    ----------
+    path : String
+        The path of the csv file
+    rows : Integer
+        The number of cases
+    cities : Integer, optional
+        The number of cities with cases
+    days : Integer, optional
+        The number of days from the first to the last case
+    seed : Integer, optional
+        The seed of the random generator
+
+    Returns
+    ----------
+    rows : Integer
+        The number of cases written
+    """
+    random = np.random.default_rng(seed)
+    names = np.array(CITIES[:cities] + ["Municipio {:04d}".format(number)
+        for number in range(len(CITIES), cities)], dtype=object)
+    departments = np.array(["Departamento {:02d}".format(number % 33)
+        for number in range(cities)], dtype=object)
+    weights = 1 / np.arange(1, cities + 1)
+    city = random.choice(cities, size=rows, p=weights / weights.sum())
+    day = np.minimum((days * random.power(3, size=rows)).astype("int64"),
+        days - 1)
+    dates = pd.date_range(LINELIST_START, periods=days + 30)
+    reported = np.asarray(dates.strftime("%d/%m/%Y %H:%M:%S"), dtype=object)
+    iso = np.asarray(dates.strftime("%Y-%m-%dT00:00:00.000"), dtype=object)
+    died = random.random(rows) < 0.03
+    recovered = ~died & (random.random(rows) < 0.7)
+    origins = np.array(ORIGINS + [""] * 3 * len(ORIGINS), dtype=object)
+    linelist = pd.DataFrame({
+        "ID de caso" : np.arange(1, rows + 1),
+        "Fecha de notificación" : reported[day],
+        "Código DIVIPOLA" : 11001 + city,
+        "Nombre municipio" : names[city],
+        "Departamento" : departments[city],
+        "Atención" : np.where(died, "Fallecido", np.where(recovered,
+            "Recuperado", random.choice(["Casa", "Hospital"], size=rows))),
+        "Edad" : np.minimum(random.gamma(4, 9, size=rows), 110)\
+            .astype("int64"),
+        "Sexo" : random.choice(["M", "F"], size=rows),
+        "Tipo" : random.choice(["Importado", "Relacionado", "En estudio"],
+            size=rows, p=[0.05, 0.55, 0.4]),
+        "Estado" : np.where(died, "Fallecido", "Leve"),
+        "Nombre del país" : origins[random.integers(len(origins), size=rows)],
+        "FIS" : iso[day],
+        "Fecha de muerte" : np.where(died, reported[day + 7], ""),
+        "Fecha de diagnóstico" : iso[day],
+        "Fecha recuperado" : np.where(recovered, iso[day + 14], ""),
+        "fecha reporte web" : iso[day]
+    })
+    linelist.to_csv(path, index=False)
+    return rows
+
+def write_time_series(cases_path, deaths_path, locations=260, days=300,
+                      seed=0):
+    """Writes a synthetic pair of global time series of cumulative cases and
+    deaths to the csv files `cases_path` and `deaths_path`, with the columns
+    of the time series of Johns Hopkins University.
+
+    Every country of `COUNTRIES` is one of the locations, and some countries
+    are split into several provinces. The outbreak of every location starts on
+    a random day of the first half of the time series.
+
+    Parameters
+    ----------
+    cases_path : String
+        The path of the csv file of the cases
+    deaths_path : String
+        The path of the csv file of the deaths
+    locations : Integer, optional
+        The number of rows of the time series, at least as many as the
+        countries of `COUNTRIES`
+    days : Integer, optional
+        The number of days of the time series
+    seed : Integer, optional
+        The seed of the random generator
+
+    Returns
+    ----------
+    locations : Integer
+        The number of rows written
+    """
+    random = np.random.default_rng(seed)
+    countries = COUNTRIES + ["Country {:03d}".format(number)
+        for number in range(max(locations // 2 - len(COUNTRIES), 0))]
+    country = np.concatenate([np.arange(len(countries)),
+        random.integers(len(countries), size=max(locations - len(countries),
+        0))])[:locations]
+    country.sort(kind="stable")
+    province = np.where(np.r_[False, country[1:] == country[:-1]],
+        ["Province {:03d}".format(number) for number in range(locations)], "")
+    start = random.integers(days // 2, size=locations)
+    rate = random.uniform(0.05, 0.15, size=locations)
+    elapsed = np.arange(days)[None, :] - start[:, None]
+    daily = random.poisson(np.where(elapsed >= 0,
+        np.exp(np.minimum(rate[:, None] * elapsed, 12)), 0))
+    daily[np.arange(locations), start] += 1
+    cases = daily.cumsum(axis=1)
+    fatal = random.binomial(daily, 0.03)
+    fatal[np.arange(locations), np.minimum(start + 7, days - 1)] += 1
+    deaths = fatal.cumsum(axis=1)
+    labels = pd.date_range(TIME_SERIES_START, periods=days)
+    labels = ["{}/{}/{}".format(date.month, date.day, date.strftime("%y"))
+              for date in labels]
+    latitude = random.uniform(-60, 70, size=locations).round(4)
+    longitude = random.uniform(-180, 180, size=locations).round(4)
+    for values, path in ((cases, cases_path), (deaths, deaths_path)):
+        series = pd.DataFrame(values, columns=labels)
+        series.insert(0, "Province/State", province)
+        series.insert(1, "Country/Region", np.array(countries)[country])
+        series.insert(2, "Lat", latitude)
+        series.insert(3, "Long", longitude)
+        series.to_csv(path, index=False)
+    return locations
@@ -0,0 +1,289 @@
+"""Benchmarks Runner
+
+Times every public function of `corona_utils`, and a whole run of `corona.py`,
+over synthetic datasets of several sizes, and saves the wall time and the peak
+resident memory of every measurement to a json file, along with the commit
+measured, so that the results of different commits can be compared.
+
+Every measurement runs in a fresh process, in a folder laid out like the one
+`corona.py` runs in, so it includes parsing the datasets and writing the csv
+files as a real run does, and the peak memory of one measurement is not
+inflated by another. Run from the root of the repository with
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+
+Functions
+----------
+public_functions : List
+    Returns the names of the public functions of `corona_utils` that take no
+    arguments
+prepare : String
+    Writes the synthetic datasets of a size to a folder laid out like the one
+    `corona.py` runs in
+measure : Dictionary
+    Measures a function of `corona_utils` or `corona.py` in a fresh process
+run : Dictionary
+    Measures every target at every size
+compare : Dataframe
+    Returns the ratios of the wall times and peak memory of two runs
+"""
+
+import argparse
+from datetime import datetime, timezone
+import inspect
+import json
+import os
+import platform
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from benchmarks.generators import write_linelist, write_time_series
+from instrumentation import peak_rss, rss
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SIZES = [10000, 100000, 1000000]
+SCRIPT = "corona.py"
+OUTPUT_FOLDERS = ["cities/cases/per_day", "cities/cases/total",
+                  "cities/deaths/per_day", "cities/deaths/total"]
+
+def public_functions():
+    """Returns a list `names` with the names of the public functions defined in
+    `corona_utils` that can be called without arguments.
+
+    Returns
+    ----------
+    names : List
+    """
+    import corona_utils
+    names = [name for name, function in inspect.getmembers(corona_utils,
+                                                           inspect.isfunction)
+             if not name.startswith("_")
+             and function.__module__ == corona_utils.__name__
+             and all(parameter.default is not parameter.empty
+                     or parameter.kind in (parameter.VAR_POSITIONAL,
+                                           parameter.VAR_KEYWORD)
+                     for parameter in inspect.signature(function)
+                     .parameters.values())]
+    return names
+
+def prepare(folder, rows, cities=100, days=200, seed=0):
+    """Writes the synthetic datasets with `rows` cases in Colombia to the
+    folder `folder`, laid out like the one `corona.py` runs in, and returns
+    the path of the folder to run it from.
+
+    Parameters
+    ----------
+    folder : String
+        The path of the folder
+    rows : Integer
+        The number of cases in Colombia
+    cities : Integer, optional
+        The number of cities with cases
+    days : Integer, optional
+        The number of days with cases
+    seed : Integer, optional
+        The seed of the random generators
+
+    Returns
+    ----------
+    workdir : String
+        The path of the folder with the datasets
+    """
+    workdir = os.path.join(folder, "corona")
+    os.makedirs(workdir, exist_ok=True)
+    for output in OUTPUT_FOLDERS:
+        os.makedirs(os.path.join(folder, "covid-in-colombia", "data", output),
+                    exist_ok=True)
+    write_linelist(os.path.join(workdir, "Casos.csv"), rows, cities, days,
+                   seed)
+    write_time_series(os.path.join(workdir, "confirmed-global.csv"),
+                      os.path.join(workdir, "confirmed-global-deaths.csv"),
+                      days=days + 100, seed=seed)
+    return workdir
+
+def measure(workdir, target):
+    """Measures the function `target` of `corona_utils`, or a whole run of
+    `corona.py` if `target` is "corona.py", in a fresh process run from the
+    folder `workdir`.
+
+    The cache of the datasets in the folder is removed first, so every
+    measurement parses the csv files.
+
+    Parameters
+    ----------
+    workdir : String
+        The path of the folder with the datasets
+    target : String
+        The name of the function, or "corona.py"
+
+    Returns
+    ----------
+    measurement : Dictionary
+        The wall time and CPU time in seconds, and the resident memory in
+        bytes before the call and at its peak
+    """
+    shutil.rmtree(os.path.join(workdir, ".cache"), ignore_errors=True)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None,
+        [ROOT, env.get("PYTHONPATH")]))
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.run",
+        "--measure", target], cwd=workdir, env=env, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        universal_newlines=True)
+    measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+    return measurement
+
+def run(sizes=None, targets=None, repeat=1, folder=None):
+    """Measures every target at every size, and returns the results along with
+    the commit and the environment measured.
+
+    Parameters
+    ----------
+    sizes : List, optional
+        The numbers of cases in Colombia, `SIZES` if none are provided
+    targets : List, optional
+        The functions of `corona_utils` to measure, and "corona.py" for a whole
+        run. Every public function and a whole run if none are provided
+    repeat : Integer, optional
+        The number of times every target is measured. The fastest time and the
+        highest peak memory are kept
+    folder : String, optional
+        The folder the datasets are written to. A temporary folder that is
+        removed afterwards is used if none is provided
+
+    Returns
+    ----------
+    report : Dictionary
+    """
+    sizes = sizes or SIZES
+    targets = targets or public_functions() + [SCRIPT]
+    temporary = None
+    if folder is None:
+        temporary = folder = tempfile.mkdtemp(prefix="corona-benchmarks-")
+    results = []
+    try:
+        for rows in sizes:
+            workdir = prepare(os.path.join(folder, str(rows)), rows)
+            for target in targets:
+                measurements = [measure(workdir, target)
+                                for _ in range(repeat)]
+                result = {
+                    "rows" : rows,
+                    "target" : target,
+                    "seconds" : min(item["seconds"] for item in measurements),
+                    "cpu_seconds" : min(item["cpu_seconds"]
+                                        for item in measurements),
+                    "rss_before" : max(item["rss_before"]
+                                       for item in measurements),
+                    "peak_rss" : max(item["peak_rss"] for item in measurements)
+                }
+                print("{rows:>9} {target:<30} {seconds:8.3f} s "
+                      "{peak:8.1f} MB".format(peak=result["peak_rss"] / 2**20,
+                                              **result), file=sys.stderr)
+                results.append(result)
+    finally:
+        if temporary is not None:
+            shutil.rmtree(temporary, ignore_errors=True)
+    report = {
+        "commit" : _commit(),
+        "created" : datetime.now(timezone.utc).isoformat(),
+        "python" : platform.python_version(),
+        "pandas" : pd.__version__,
+        "platform" : platform.platform(),
+        "repeat" : repeat,
+        "results" : results
+    }
+    return report
+
+def compare(base, current):
+    """Returns a Dataframe object `comparison` with the ratios of the wall time
+    and peak memory of every measurement of two reports.
+
+    Parameters
+    ----------
+    base : Dictionary
+        The report the other one is compared against
+    current : Dictionary
+        The report being compared
+
+    Returns
+    ----------
+    comparison : Dataframe
+        A Dataframe indexed by size and target, with ratios above 1 where
+        `current` is slower or uses more memory than `base`
+    """
+    columns = ["rows", "target", "seconds", "peak_rss"]
+    base = pd.DataFrame(base["results"], columns=columns)\
+        .set_index(["rows", "target"])
+    current = pd.DataFrame(current["results"], columns=columns)\
+        .set_index(["rows", "target"])
+    comparison = (current / base).dropna()\
+        .rename(columns={"seconds" : "time_ratio", "peak_rss" : "memory_ratio"})
+    return comparison
+
+def _measure(target):
+    """Calls `target` in the current process, and prints its measurement as a
+    line of json.
+    """
+    import corona_utils
+    rss_before = rss() or peak_rss(children=True)
+    start = time.perf_counter()
+    cpu = time.process_time()
+    if target == SCRIPT:
+        sys.argv = [SCRIPT]
+        runpy.run_path(os.path.join(ROOT, SCRIPT), run_name="__main__")
+    else:
+        getattr(corona_utils, target)()
+    measurement = {
+        "seconds" : time.perf_counter() - start,
+        "cpu_seconds" : time.process_time() - cpu,
+        "rss_before" : rss_before,
+        "peak_rss" : peak_rss(children=True)
+    }
+    print(json.dumps(measurement))
+
+def _commit():
+    """Returns the commit checked out in the repository, or None."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT,
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the functions of "
+        + "corona_utils and a whole run of corona.py over synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+        help="numbers of cases in Colombia of the synthetic linelists")
+    parser.add_argument("--targets", nargs="+", default=None,
+        help="functions of corona_utils to measure, or corona.py")
+    parser.add_argument("--repeat", type=int, default=1,
+        help="number of measurements of every target")
+    parser.add_argument("--folder", default=None,
+        help="folder for the synthetic datasets, kept afterwards")
+    parser.add_argument("--output", default=None,
+        help="json file of the results, by default one per commit in "
+        + "benchmarks/results")
+    parser.add_argument("--compare", default=None,
+        help="json file of previous results to compare against")
+    parser.add_argument("--measure", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure is not None:
+        _measure(args.measure)
+        sys.exit()
+    REPORT = run(args.sizes, args.targets, args.repeat, args.folder)
+    OUTPUT = args.output or os.path.join(RESULTS_DIR,
+        "{}.json".format((REPORT["commit"] or "results")[:12]))
+    os.makedirs(os.path.dirname(os.path.abspath(OUTPUT)), exist_ok=True)
+    with open(OUTPUT, "w") as results:
+        json.dump(REPORT, results, indent=2)
+    print("Results written to " + OUTPUT)
+    if args.compare is not None:
+        with open(args.compare) as previous:
+            print(compare(json.load(previous), REPORT).to_string())
@@ -2,56 +2,134 @@
 
 Main script to be called for generating the csv files containing all of the
 processed data of cases and deaths of Covid in Colombia and the world.
+
+Every csv file is written by a task of the pipeline of `pipeline`. The tasks
+named on the command line are run, or every task if none is named, and `--list`
+lists the tasks. Tasks that do not depend on each other run in parallel over a
+pool of `--jobs` processes, and a task only runs when its outputs are missing
+or its inputs changed since its last run, unless `--force` is set.
+
+With `--chunksize`, the cases in Colombia are streamed from their csv file in
+chunks of at most that many rows instead of being read whole. With
+`--incremental`, the aggregates of the cases are kept in a state file between
+runs, and only the cases appended since the previous run are processed. The
+state file is only saved when no task failed.
+
+When the tasks run over a pool, the datasets they read are parsed once by this
+process and placed in shared memory, which every process of the pool attaches
+to instead of parsing the csv files again. The cases in Colombia are not shared
+with `--chunksize`, since they are then never held whole in memory.
+
+Only the csv files whose content changed are rewritten. The csv files of every
+city are written over a pool of `--workers` threads, or processes with
+`--processes`, and the throughput of every folder is logged. With
+`--consolidated`, the series of every city are also written to a single csv
+file and Feather file, with an index of the rows of every city.
+
+The sha256 of every file written is kept in a manifest, and a file is only
+written again when the sha256 of its content changes. The paths of the files
+whose content changed in the run are listed in `--changed-files`, one per line,
+so that the deploy of the site only uploads those.
+
+With `--report`, the wall time, CPU time, rows and memory of every stage of the
+run are saved to a json file, and `--profile-stage` profiles one of the stages
+into `--profile-output`, with `cProfile` or as folded stacks for a flame graph.
+The incremental refresh and the instrumentation run every task in this
+process.
 """
 
-from corona_utils import cases_per_day
-from corona_utils import deaths_per_day
-from corona_utils import cases_per_city
-from corona_utils import cases_per_age
-from corona_utils import total_cases_per_day
-from corona_utils import total_deaths_per_day
-from corona_utils import origins_and_possible
-from corona_utils import countries_cases_progression
-from corona_utils import countries_deaths_progression
-from corona_utils import cities_cases_per_day
-from corona_utils import cities_cases_progression
-from corona_utils import cities_deaths_per_day
-from corona_utils import cities_deaths_progression
-
-# casesPerDept = data.dept.value_counts()
-# casesPerLoc = data.locTreatment.value_counts()
-# casesPerSex = data.sex.value_counts()
-# casesPertype = data.type.value_counts()
-# casesPerOrigin = data.origin.value_counts(dropna=False)
-
-cases_per_day = cases_per_day()
-deaths_per_day = deaths_per_day()
-cases_per_city = cases_per_city()
-cases_per_age = cases_per_age()
-total_cases_per_day = total_cases_per_day()
-total_deaths_per_day = total_deaths_per_day()
-cases_per_origin, possible_origins_cases = origins_and_possible()
-countries_cases_progression = countries_cases_progression()
-countries_deaths_progression = countries_deaths_progression()
-cities_cases_per_day()
-cities_cases_progression()
-cities_deaths_per_day()
-cities_deaths_progression()
-
-# Write CSVs
-cases_per_day.to_csv("../covid-in-colombia/data/cases_per_day.csv")
-deaths_per_day.to_csv("../covid-in-colombia/data/deaths_per_day.csv")
-cases_per_city.to_csv("../covid-in-colombia/data/cases_per_city.csv")
-cases_per_age.to_csv("../covid-in-colombia/data/cases_per_age.csv")
-cases_per_origin.to_csv("../covid-in-colombia/data/cases_per_origin.csv")
-possible_origins_cases.to_csv("../covid-in-colombia/data/"
-	+ "possible_origins_cases.csv")
-total_cases_per_day.to_csv("../covid-in-colombia/data/"
-	+ "total_cases_per_day.csv")
-total_deaths_per_day.to_csv("../covid-in-colombia/data/"
-	+ "total_deaths_per_day.csv")
-countries_cases_progression.to_csv("../covid-in-colombia/data/"
-	+ "countries_progression.csv")
-countries_deaths_progression.to_csv("../covid-in-colombia/data/"
-	+ "countries_death_progression.csv")
-###
+import argparse
+import logging
+from corona_utils import datasets, share_datasets
+from instrumentation import recorder
+from pipeline import configure, default_pipeline
+import writers
+
+REFRESH_STATE = ".cache/refresh-state.pkl"
+MANIFEST = ".cache/manifest.json"
+SHARED_DATASETS = ["cases_colombia", "cases_worldwide", "deaths_worldwide"]
+
+parser = argparse.ArgumentParser(description="Writes the csv files of the "
+	+ "processed cases and deaths of Covid in Colombia and the world.")
+parser.add_argument("tasks", nargs="*",
+	help="names of the tasks to run, every task if none is named")
+parser.add_argument("--list", action="store_true",
+	help="list the tasks with their inputs and outputs, and exit")
+parser.add_argument("--jobs", type=int, default=None,
+	help="number of processes running tasks in parallel")
+parser.add_argument("--force", action="store_true",
+	help="run the tasks even if their inputs have not changed")
+parser.add_argument("--chunksize", type=int, default=None,
+	help="maximum number of cases in Colombia held in memory at once")
+parser.add_argument("--incremental", action="store_true",
+	help="only process the cases appended since the previous run")
+parser.add_argument("--workers", type=int, default=None,
+	help="number of workers writing the csv files of the cities")
+parser.add_argument("--processes", action="store_true",
+	help="write the csv files of the cities with processes, not threads")
+parser.add_argument("--consolidated", action="store_true",
+	help="also write the series of every city to a single file")
+parser.add_argument("--changed-files", default=".cache/changed-files.txt",
+	help="file listing the files whose content changed in the run")
+parser.add_argument("--report", default=None,
+	help="json file to save the measurements of every stage of the run to")
+parser.add_argument("--trace-memory", action="store_true",
+	help="trace the peak memory of every stage, which slows the run down")
+parser.add_argument("--profile-stage", default=None,
+	help="name of the stage to profile, as in the report")
+parser.add_argument("--profile-output", default="stage.prof",
+	help="file of the profile: cProfile statistics, or folded stacks if it "
+	+ "ends in .folded")
+args = parser.parse_args()
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+pipeline = default_pipeline()
+
+if args.list:
+	for name in pipeline.order:
+		task = pipeline.tasks[name]
+		print("{}{}\n  reads {}\n  writes {}".format(name,
+			"" if task.default else " (only when requested)",
+			", ".join(task.inputs), ", ".join(task.outputs)))
+	raise SystemExit
+
+targets = list(args.tasks)
+unknown = [name for name in targets if name not in pipeline.tasks]
+if unknown:
+	parser.error("unknown tasks: " + ", ".join(unknown))
+if args.consolidated:
+	targets = (targets or pipeline.select()) + ["cities_consolidated"]
+state = REFRESH_STATE if args.incremental else None
+options = (args.chunksize, args.workers, args.processes, state, MANIFEST)
+jobs = args.jobs
+if args.incremental or args.report is not None \
+		or args.profile_stage is not None:
+	jobs = 1
+configure(*options)
+if args.report is not None or args.profile_stage is not None:
+	recorder.start(args.trace_memory, args.profile_stage, args.profile_output)
+
+shared = {}
+
+def share(tasks):
+	"""Places the datasets read by `tasks` in shared memory, and returns their
+	handles for the processes of the pool.
+	"""
+	inputs = {path for task in tasks for path in task.inputs}
+	names = [name for name in SHARED_DATASETS if datasets.path(name) in inputs
+		and not (name == "cases_colombia" and args.chunksize)]
+	shared.update(share_datasets(names))
+	return {name : frame.handle for name, frame in shared.items()}
+
+statuses = {}
+try:
+	statuses = pipeline.run(targets, jobs=jobs, force=args.force,
+		initializer=configure, initargs=options, prepare=share)
+finally:
+	for frame in shared.values():
+		frame.unlink()
+	if datasets.state is not None and statuses \
+			and not {"failed", "blocked"} & set(statuses.values()):
+		datasets.state.save()
+	writers.manifest.save(args.changed_files)
+	if args.report is not None:
+		recorder.save(args.report)
@@ -2,6 +2,15 @@
 Utils file which contains several useful functions for processing, organizing
 and writing data related to Covid cases and deaths in Colombia and the world.
 
+The datasets are loaded lazily through `datasets`, a `DataLoader` that parses
+each csv file the first time it is needed. The csv files of every city are
+written over the worker pool of `writer`, a `ParallelWriter`. Every public
+function is recorded as a stage of the run when the `instrumentation` recorder
+is started. The datasets can be placed in shared memory once, with
+`share_datasets`, for the processes of a pool to attach to. Ad hoc questions
+about a city, a department, a range of dates or a country are answered by
+`query`, a `Query` with a cache of its latest results.
+
 Functions
 ----------
 cases_per_day : Dataframe
@@ -19,6 +28,12 @@ total_cases_per_day : Dataframe
     Returns a Dataframe object of the total number of cases per day in Colombia
 total_deaths_per_day : Dataframe
     Returns a Dataframe object of the total number of deaths per day in Colombia
+demographics : Series
+    Returns a Series object of the number of cases in Colombia of every
+    combination of some demographic dimensions
+cases_per_demographic : (Dataframe, Dataframe, Dataframe, Dataframe, Dataframe)
+    Returns a Dataframe object of the number of cases in Colombia per
+    department, age group, sex, type and treatment
 origins_and_possible : (Series, Series)
     Returns two Series objects that list the original locations of where cases
     came from, and the possible places where some cases came from, respectively
@@ -40,171 +55,125 @@ cities_deaths_per_day : None
 cities_deaths_progression : None
     Writes a csv file for each Series representing the cumulative deaths per day
     of every single city with a reported death in Colombia
+cities_consolidated : Dataframe
+    Writes the cases and deaths per day of every city in Colombia to a single
+    csv file and Feather file, along with an index of the rows of every city
+departments_per_day : Dataframe
+    Returns a Dataframe object of the cases and deaths per day of every
+    department in Colombia, rolled up from those of the cities
+national_per_day : Dataframe
+    Returns a Dataframe object of the cases and deaths per day in Colombia,
+    rolled up from those of the cities, along with the global totals
+countries_metrics : Dataframe
+    Returns a Dataframe object of the rolling-window metrics of the cases and
+    deaths of every country
+departments_metrics : Dataframe
+    Returns a Dataframe object of the rolling-window metrics of the cases and
+    deaths of every department in Colombia
+cities_metrics : Dataframe
+    Returns a Dataframe object of the rolling-window metrics of the cases and
+    deaths of every city in Colombia
+share_datasets : Dictionary
+    Places datasets in shared memory for the processes of a pool
+attach_datasets : None
+    Provides the datasets shared by another process to `datasets`
 """
 
-from datetime import datetime, timedelta
+import os
+from functools import lru_cache
 import unidecode
 import pandas as pd
 import numpy as np
-from variables.first_dates import spain_first_date
-from variables.first_dates import italy_first_date
-from variables.first_dates import brazil_first_date
-from variables.first_dates import ecuador_first_date
-from variables.first_dates import mexico_first_date
-from variables.first_dates import peru_first_date
-from variables.first_dates import venezuela_first_date
-from variables.first_dates import colombia_first_date
-from variables.first_dates import argentina_first_date
-from variables.first_dates import chile_first_date
-from variables.first_dates import spain_first_death_date
-from variables.first_dates import italy_first_death_date
-from variables.first_dates import brazil_first_death_date
-from variables.first_dates import ecuador_first_death_date
-from variables.first_dates import mexico_first_death_date
-from variables.first_dates import peru_first_death_date
-from variables.first_dates import venezuela_first_death_date
-from variables.first_dates import colombia_first_death_date
-from variables.first_dates import argentina_first_death_date
-from variables.first_dates import chile_first_death_date
+from aggregates import AgeHistogram, CityDailyCounts, DemographicCube
+from aggregates import ValueCounts
+from analytics import metrics
+from data_loader import COLOMBIA_COLUMNS, default_loader
+from dates import date_labels
+from instrumentation import instrumented
+from writers import ParallelWriter, write_atomic, write_feather
+from countries import DATASET_OVERRIDES, CountryRegistry, dataset_registry
+from matrices import DailyMatrix
+from queries import Query
+from variables.countries import COUNTRIES, POPULATIONS, REFERENCE_COUNTRY
+from shared import SharedFrame
 
 #dateparse = lambda x : datetime.strptime(x[:10], '%Y-%m-%d')
 
-cases_colombia = pd.read_csv("Casos.csv",
-    parse_dates = ["Fecha de diagnóstico"]).rename(
-        columns = {
-            "Fecha de notificación" : "date",
-            "Fecha de muerte" : "date_death",
-            "Nombre municipio" : "city",
-            "Departamento" : "dept",
-            "Atención" : "locTreatment",
-            "Edad" : "age",
-            "Sexo" : "sex",
-            "Tipo" : "type",
-            "Nombre del país" : "origin"
-        }
-    ).drop('ID de caso', 1)
-
-cases_worldwide = pd.read_csv("confirmed-global.csv")
-deaths_worldwide = pd.read_csv("confirmed-global-deaths.csv")
-
-def __get_locations():
-    """Get the dictionaries of the locations and possible locations of cases
-    reported in Colombia.
-
-    Returns
-    ----------
-    locations : Dictionary
-        The dictionary containing the locations of origin and the number of
-        cases
-    possible_locations : Dictionary
-        The dictionary containing the possible locations of origin and the
-        number of cases
-    """
-    locations = {}
-    possible_locations = {}
-    for location in cases_colombia.origin.tolist():
-        __resolve_locations(locations, possible_locations, location)
-    return locations, possible_locations
-
-def __resolve_locations(locations, possible_locations, location):
-    """Handles the logic for determining whether the location is a Nan, multiple
-    locations, or a straight-forward single location.
-
-    Parameters
-    ----------
-    locations : Dictionary
-        The dictionary containing the locations of origin and the number of
-        cases
-    possible_locations : Dictionary
-        The dictionary containing the possible locations of origin and the
-        number of cases
-    location : String OR Nan
-        A Nan, or, in the case of a string, either a list of locations or a
-        single location
-
-    Returns
-    ----------
-    None
+datasets = default_loader()
+writer = ParallelWriter()
+query = Query(datasets)
+
+__SHARED_COLUMNS = list(COLOMBIA_COLUMNS.values())
+__ACCUMULATORS = [
+    lambda: ValueCounts("city"),
+    lambda: ValueCounts("origin", dropna=False),
+    AgeHistogram,
+    DemographicCube,
+    CityDailyCounts
+]
+
+def __getattr__(name):
+    """Returns the dataset `name` from `datasets`, so that the datasets can
+    still be accessed as attributes of this module. The global time series are
+    returned as the Dataframes of their csv files.
     """
-    if isinstance(location, float):
-        __resolve_nan(possible_locations)
-    elif "-" in location:
-        __add_possible_locations(possible_locations, location)
-    else:
-        __add_location(locations, location)
+    if name == "cases_colombia":
+        return datasets.get(name)
+    if name in ("cases_worldwide", "deaths_worldwide"):
+        return datasets.get(name).to_frame()
+    raise AttributeError("module " + repr(__name__) + " has no attribute "
+        + repr(name))
 
-def __resolve_nan(possible_locations):
-    if "Nan" in possible_locations:
-        possible_locations["Nan"] += 1
-    else:
-        possible_locations["Nan"] = 1
-
-def __add_possible_locations(possible_locations, locations):
-    """Handles the logic for dealing with locations values with more than one
-    possible origin country.
+def __get_locations():
+    """Get the Series of the locations and possible locations of cases reported
+    in Colombia.
 
-    Parameters
-    ----------
-    possible_locations : Dictionary
-        The dictionary containing the possible locations of origin and the
-        number of cases.
-    locations : String
-        The list of possible locations of origin.
+    Only the distinct origins are parsed, with vectorized string operations,
+    and each one is weighted by its number of cases. Both Series keep the order
+    in which their locations first appear among the cases.
 
     Returns
     ----------
-    None
+    locations : Series
+        The Series containing the locations of origin and the number of cases
+    possible_locations : Series
+        The Series containing the possible locations of origin and the number
+        of cases
     """
-    list_possible_places = locations.split("-")
-    for place in list_possible_places:
-        place = unidecode.unidecode(place.strip())
-        if place in possible_locations:
-            possible_locations[place] += 1
-        else:
-            possible_locations[place] = 1
+    origins = __aggregate(ValueCounts("origin", dropna=False)).result()
+    names = pd.Series(origins.index, dtype=object)
+    cases = pd.Series(origins.values, dtype="int64")
+    missing = names.isnull()
+    multiple = names.str.contains("-", regex=False).fillna(False).astype(bool)
+    single = ~missing & ~multiple
+
+    places = names[single].map(__transliterate)
+    locations = cases[single].groupby(places.values, sort=False).sum()
+
+    possible = names[multiple].str.split("-").explode().str.strip()\
+        .map(__transliterate)
+    nan = pd.Series("Nan", index=names.index[missing], dtype=object)
+    possible = pd.concat([possible, nan]).sort_index(kind="mergesort")
+    possible_locations = cases[possible.index]\
+        .groupby(possible.values, sort=False).sum()
+    return locations, possible_locations
 
-def __add_location(locations, location):
-    """Adds the location to the locations dictionary.
+@lru_cache(maxsize=None)
+def __transliterate(location):
+    """Returns the location provided transliterated to ASCII.
 
     Parameters
     ----------
-    locations : Dictionary
-        The dictionary containing the locations of origin and the number of
-        cases
     location : String
-        The string value of the location
-
-    Returns
-    ----------
-    None
-    """
-    location = unidecode.unidecode(location)
-    if location in locations:
-        locations[location] += 1
-    else:
-        locations[location] = 1
-
-def __fill_blank_days(dtfrm):
-    """Adds missing days to the provided dataframe.
-
-    For all missing days, the date is filled with a corresponding 0 value.
-
-    Parameters
-    ----------
-    dtfrm : Dataframe
-        A Dataframe object containing a linear (though incomplete) progression
-        of days
+        The name of a location
 
     Returns
     ----------
-    dtfrm : Dataframe
-        A Dataframe with a clean linear progression of days
+    String
     """
-    first_date = dtfrm.iloc[0]
-    last_date = dtfrm.iloc[-1]
-    date_range = pd.date_range(first_date.name, last_date.name)
-    return dtfrm.reindex(date_range, fill_value=0)
+    return unidecode.unidecode(location)
 
+@instrumented
 def cases_per_day():
     """Returns a Dataframe object `cpd` of the number of cases per day in
     Colombia.
@@ -214,19 +183,12 @@ def cases_per_day():
     cpd : Dataframe
         A Dataframe that contains the total number of cases per day in Colombia
     """
-    location = cases_worldwide["Country/Region"]
-    country_index = location[location == "Colombia"].index[0]
-    date_cases = {}
-    past_cases = 0
-    for i in range(__days_since_first_case().days + 1):
-        day = colombia_first_date + timedelta(days=i)
-        day = datetime.strftime(day, "%-m/%-d/%y")
-        curr_cases = cases_worldwide[day].iloc[country_index].item()
-        date_cases[day] = curr_cases - past_cases
-        past_cases = curr_cases
-    cpd = pd.DataFrame(date_cases.items(), columns=['date', 'cases'])
+    cases = __cases_registry().series("Colombia")
+    cpd = pd.DataFrame({"date" : date_labels(cases.index),
+                        "cases" : np.diff(cases.values, prepend=0)})
     return cpd
 
+@instrumented
 def deaths_per_day():
     """Returns a Dataframe object `dpd` of the number of deaths per day in
     Colombia.
@@ -236,19 +198,12 @@ def deaths_per_day():
     dpd : Dataframe
         A Dataframe that contains the total number of deaths per day in Colombia
     """
-    location = deaths_worldwide["Country/Region"]
-    country_index = location[location == "Colombia"].index[0]
-    date_deaths = {}
-    past_cases = 0
-    for i in range(__days_since_first_death().days + 1):
-        day = colombia_first_death_date + timedelta(days=i)
-        day = datetime.strftime(day, "%-m/%-d/%y")
-        curr_cases = deaths_worldwide[day].iloc[country_index].item()
-        date_deaths[day] = curr_cases - past_cases
-        past_cases = curr_cases
-    dpd = pd.DataFrame(date_deaths.items(), columns=['date', 'deaths'])
+    deaths = __deaths_registry().series("Colombia")
+    dpd = pd.DataFrame({"date" : date_labels(deaths.index),
+                        "deaths" : np.diff(deaths.values, prepend=0)})
     return dpd
 
+@instrumented
 def cases_per_city():
     """Returns a Dataframe object `cpc` of the total number of cases per city in
     Colombia.
@@ -258,10 +213,11 @@ def cases_per_city():
     cpc : Dataframe
         A Dataframe that contains the total number of cases per city in Colombia
     """
-    cpc = cases_colombia.city.value_counts().reset_index()
+    cpc = __aggregate(ValueCounts("city")).most_common().reset_index()
     cpc.columns = ["city", "cases"]
     return cpc
 
+@instrumented
 def cases_per_age():
     """Returns a Dataframe object `cpa` of the total number of cases per age
     group in Colombia.
@@ -272,11 +228,56 @@ def cases_per_age():
         A Dataframe that contains the total number of cases per age group in
         Colombia
     """
-    cpa = pd.DataFrame(cases_colombia.age.value_counts())\
+    cpa = pd.DataFrame(__aggregate(AgeHistogram()).result())\
         .rename(columns={"age" : "cases"})
     cpa.index.name = "age group"
     return cpa
 
+@instrumented
+def demographics(dimensions=("sex",), **filters):
+    """Returns a Series object `counts` with the number of cases in Colombia
+    of every combination of the demographic dimensions provided, rolled up from
+    the demographic cube of the cases.
+
+    Parameters
+    ----------
+    dimensions : List, optional
+        Dimensions of `aggregates.DemographicCube`, such as "dept", "city",
+        "age_group", "sex", "type", "locTreatment" or "date"
+    **filters
+        The value of some dimensions of the cases counted, such as
+        `dept="Antioquia"`
+
+    Returns
+    ----------
+    counts : Series
+        A Series indexed by `dimensions`
+    """
+    return __aggregate(DemographicCube()).rollup(list(dimensions), **filters)
+
+@instrumented
+def cases_per_demographic():
+    """Returns five Dataframe objects with the total number of cases in
+    Colombia per department, age group, sex, type and treatment, each rolled
+    up from the demographic cube of the cases.
+
+    Returns
+    ----------
+    breakdowns : (Dataframe, Dataframe, Dataframe, Dataframe, Dataframe)
+        A Dataframe per dimension, with the columns of the dimension and of
+        the cases, sorted by the dimension
+    """
+    cube = __aggregate(DemographicCube())
+    breakdowns = tuple(cube.rollup([dimension]).rename("cases")
+                       .rename_axis(label).reset_index()
+                       for dimension, label in (("dept", "department"),
+                                                ("age_group", "age group"),
+                                                ("sex", "sex"),
+                                                ("type", "type"),
+                                                ("locTreatment", "treatment")))
+    return breakdowns
+
+@instrumented
 def origins_and_possible():
     """Returns two Series objects, `places_origin` and `possible_origin`, that
     list the original locations of where cases came from, and the possible
@@ -290,12 +291,13 @@ def origins_and_possible():
         A series that lists the possible places where some cases came from
     """
     places_origin, possible_origins = __get_locations()
-    places_origin = pd.Series(places_origin).reset_index()
-    possible_origins = pd.Series(possible_origins).reset_index()
+    places_origin = places_origin.reset_index()
+    possible_origins = possible_origins.reset_index()
     places_origin.columns = ["origin", "cases"]
     possible_origins.columns = ["origin", "cases"]
     return places_origin, possible_origins
 
+@instrumented
 def total_cases_per_day():
     """Returns a Dataframe object `tcpd` of the total number of cases per day in
     Colombia.
@@ -305,17 +307,12 @@ def total_cases_per_day():
     tcpd : Dataframe
         Dataframe with the total number of cases per day in Colombia
     """
-    location = cases_worldwide["Country/Region"]
-    country_index = location[location == "Colombia"].index[0]
-    date_cases = {}
-    for i in range(__days_since_first_case().days + 1):
-        day = colombia_first_date + timedelta(days=i)
-        day = datetime.strftime(day, "%-m/%-d/%y")
-        curr_cases = cases_worldwide[day].iloc[country_index].item()
-        date_cases[day] = curr_cases
-    tcpd = pd.DataFrame(date_cases.items(), columns=['date', 'cases'])
+    cases = __cases_registry().series("Colombia")
+    tcpd = pd.DataFrame({"date" : date_labels(cases.index),
+                         "cases" : cases.values})
     return tcpd
 
+@instrumented
 def total_deaths_per_day():
     """Returns a Dataframe object `tdpd` of the total number of deaths per day
     in Colombia.
@@ -325,194 +322,208 @@ def total_deaths_per_day():
     tdpd : Dataframe
         Dataframe with the total number of deaths per day in Colombia
     """
-    location = deaths_worldwide["Country/Region"]
-    country_index = location[location == "Colombia"].index[0]
-    date_deaths = {}
-    for i in range(__days_since_first_death().days + 1):
-        day = colombia_first_death_date + timedelta(days=i)
-        day = datetime.strftime(day, "%-m/%-d/%y")
-        curr_cases = deaths_worldwide[day].iloc[country_index].item()
-        date_deaths[day] = curr_cases
-    tdpd = pd.DataFrame(date_deaths.items(), columns=['date', 'deaths'])
+    deaths = __deaths_registry().series("Colombia")
+    tdpd = pd.DataFrame({"date" : date_labels(deaths.index),
+                         "deaths" : deaths.values})
     return tdpd
 
-def __days_since_first_case():
-    """Returns a Timedelta object with the number of days since the first
-    reported case in Colombia.
+def __cases_registry():
+    """Returns the cached country registry of the global cases.
 
     Returns
     ----------
-    Timedelta
+    CountryRegistry
     """
-    last_date = datetime.strptime(cases_worldwide[cases_worldwide.columns[-1]]
-        .name, "%m/%d/%y")
-    return last_date - colombia_first_date
+    return __registry("cases_worldwide")
 
-def __days_since_first_death():
-    """Returns a Timedelta object with the number of days since the first
-    reported death in Colombia.
+def __deaths_registry():
+    """Returns the cached country registry of the global deaths.
 
     Returns
     ----------
-    Timedelta
+    CountryRegistry
     """
-    last_death_date = datetime.strptime(deaths_worldwide[deaths_worldwide
-        .columns[-1]].name, "%m/%d/%y")
-    return last_death_date - colombia_first_death_date
+    return __registry("deaths_worldwide")
 
-def __city_cases_per_day(city):
-    """Returns a Series object `ccpd` with the cases per day in the city
-    provided.
+def __registry(name):
+    """Returns the cached country registry of the global time series `name`.
 
     Parameters
     ----------
-    city : String
-        A string object value of the city whose cases per day is being returned
+    name : String
+        "cases_worldwide" or "deaths_worldwide"
 
     Returns
     ----------
-    ccpd : Series
-        A Series that contains the cases per day in the city
+    CountryRegistry
     """
-    ccpd = cases_colombia[(cases_colombia["city"] == city)
-        & cases_colombia["date_death"].isnull()]
-    ccpd = ccpd[["date", "city"]]
-    ccpd = ccpd.date.value_counts()
-    ccpd.index = pd.to_datetime(ccpd.index, format="%d/%m/%Y %H:%M:%S")
-    ccpd = ccpd.sort_index()
-    return ccpd
+    return dataset_registry(datasets, name)
 
-def __city_cases_progression(city):
-    """Returns a Series object `ccp` with the cumulative cases per day in the
-    city provided.
+def share_datasets(names):
+    """Returns a dictionary `shared` with a SharedFrame for each of the
+    datasets `names`, placed in shared memory so that the processes of a pool
+    attach to them with `attach_datasets` instead of parsing their csv files.
+
+    The cases in Colombia are shared with their typed columns, and the global
+    time series as the matrices of their country registries. The caller owns
+    the blocks of shared memory, and unlinks them once the pool is done.
 
     Parameters
     ----------
-    city : String
-        A string object value of the city whose progression of cases is being
-        returned
+    names : List
+        The names of the datasets, among "cases_colombia", "cases_worldwide"
+        and "deaths_worldwide"
 
     Returns
     ----------
-    ccp : Series
-        A Series that contains the cumulative progression of cases in the city
+    shared : Dictionary
+        The SharedFrame of every dataset, keyed by its name
     """
-    ccp = __city_cases_per_day(city).cumsum()
-    return ccp
-
-def __country_cases_progression(country, date):
-    """Returns a list `progression_list` containing the progression of cases in
-    the country provided.
-
-    For countries that have had more days since their first reported case than
-    Colombia, up to two extra weeks of the progression is also returned.
+    shared = {}
+    try:
+        for name in names:
+            if name == "cases_colombia":
+                frame = datasets.get(name, __SHARED_COLUMNS)
+            else:
+                frame = __registry(name).matrix
+            shared[name] = SharedFrame.create(frame)
+    except BaseException:
+        for frame in shared.values():
+            frame.unlink()
+        raise
+    return shared
+
+def attach_datasets(handles):
+    """Provides the datasets shared by `share_datasets` in another process to
+    `datasets`, so that they are not parsed again by the current process.
 
     Parameters
     ----------
-    country : String
-        A string object value of the country whose progression is being
-        generated
-
-    date : Datetime
-        A datetime object whose value is the first date of a reported Covid case
-        in the country
+    handles : Dictionary
+        The handle of the SharedFrame of every dataset, keyed by its name
 
     Returns
     ----------
-    progression_list : List
-        A list containing the progressive increase in cases in the country
-        provided
+    None
     """
-    location = cases_worldwide["Country/Region"]
-    country_index = location[location == country].index[0]
-    progression_list = []
-    for i in range(__days_since_first_case().days + 14):
-        day = date + timedelta(days=i)
-        day = datetime.strftime(day, "%-m/%-d/%y")
-        if day in cases_worldwide.columns:
-            progression_list.append(cases_worldwide[day]
-                .iloc[country_index].item())
+    for name, handle in handles.items():
+        frame = SharedFrame.attach(handle).frame()
+        if name == "cases_colombia":
+            datasets.preload(name, frame)
         else:
-            break
-    return progression_list
+            datasets.preload(name, derived={"registry" :
+                CountryRegistry(frame, DATASET_OVERRIDES[name])})
 
-def __city_deaths_per_day(city):
-    """Returns a Series object `cdpd` with the deaths per day in the city
-    provided.
+def __city_matrices():
+    """Returns two DailyMatrix objects, `ccpd` and `cdpd`, with the cases and
+    deaths per day of every city.
 
-    Parameters
-    ----------
-    city : String
-        A string object value of the city whose deaths of deaths is being
-        returned
+    Both matrices have a row for every city with a case, in the same order,
+    and a column for every day from the first to the last date of the cases,
+    zero-filled once for every city. The cases do not include the cases that
+    died. The matrices are cached along with the aggregation of the cases, so
+    every exporter of city data shares them.
 
     Returns
     ----------
-    cdpd : Series
-        A Series that contains the deaths per day in the city
+    ccpd : DailyMatrix
+        A matrix with the cases per day of every city
+    cdpd : DailyMatrix
+        A matrix with the deaths per day of every city
     """
-    cdpd = cases_colombia[(cases_colombia["city"] == city)
-        & cases_colombia["date_death"].notnull()]
-    cdpd = cdpd[["date", "city"]]
-    cdpd = cdpd.date.value_counts()
-    cdpd.index = pd.to_datetime(cdpd.index, format="%d/%m/%Y %H:%M:%S")
-    cdpd = cdpd.sort_index()
-    return cdpd
+    return __build_city_matrices(__aggregate(CityDailyCounts()))
 
-def __city_deaths_progression(city):
-    """Returns a Series object `cdp` with the cumulative deaths per day in the
-    city provided.
+@lru_cache(maxsize=1)
+def __build_city_matrices(counts):
+    """Returns the cases and deaths per day of every city in the accumulator
+    of CityDailyCounts provided, as two DailyMatrix objects.
 
     Parameters
     ----------
-    city : String
-        A string object value of the city whose progression of deaths is being
-        returned
+    counts : CityDailyCounts
+        The aggregation of the cases
 
     Returns
     ----------
-    cdp : Series
-        A Series that contains the cumulative progression of deaths in the city
+    ccpd : DailyMatrix
+    cdpd : DailyMatrix
     """
-    cdp = __city_deaths_per_day(city).cumsum()
-    return cdp
+    cities = counts.cities()
+    cases, deaths = counts.result()
+    dates = __date_range(pd.concat([cases, deaths]))
+    return tuple(DailyMatrix.from_series(series, "city", cities, dates)
+                 for series in (cases, deaths))
 
-def __country_deaths_progression(country, date):
-    """Returns a list `progression_list` containing the progression of deaths in
-    the country provided.
+def __aggregate(accumulator):
+    """Returns the accumulator provided updated with every case reported in
+    Colombia, either at once or one chunk at a time if `datasets` has a chunk
+    size.
 
-    For countries that have had more days since their first reported death than
-    Colombia, up to two extra weeks of the progression is also returned.
+    When the cases are streamed, in chunks or from a refresh state, every
+    accumulator of the exporters is updated along with it, in the same read
+    of the cases, so that the cases are only read once per process.
 
     Parameters
     ----------
-    country : String
-        A string object value of the country whose progression is being
-        generated
-
-    date : Datetime
-        A datetime object whose value is the first date of a reported Covid
-        death in the country
+    accumulator : Object
+        An accumulator of `aggregates`
 
     Returns
     ----------
-    progression_list : List
-        A list containing the progressive increase in deaths in the country
-        provided
+    accumulator : Object
+        The updated accumulator, cached by `datasets`
     """
-    location = deaths_worldwide["Country/Region"]
-    country_index = location[location == country].index[0]
-    progression_list = []
-    for i in range(__days_since_first_death().days + 14):
-        day = date + timedelta(days=i)
-        day = datetime.strftime(day, "%-m/%-d/%y")
-        if day in deaths_worldwide.columns:
-            progression_list.append(deaths_worldwide[day]
-                .iloc[country_index].item())
-        else:
-            break
-    return progression_list
+    accumulators = [accumulator]
+    if datasets.chunksize or datasets.state is not None:
+        accumulators += [create() for create in __ACCUMULATORS]
+    return datasets.aggregate_many("cases_colombia", accumulators)[0]
+
+def __write_cities(matrix, folder, header, daily=None):
+    """Writes a csv file in `folder` for the Series of every single city with a
+    diagnosed case in Colombia.
+
+    Only the days of every city with a value per day are written, so cities
+    without any value are written as empty files. With a refresh state in
+    `datasets`, only the files of the cities whose counts changed since
+    `folder` was last written, and the missing files, are written, and only
+    if they changed. The files are serialized and written atomically over the
+    worker pool of `writer`, and `folder` is marked as written once they all
+    are.
 
+    Parameters
+    ----------
+    matrix : DailyMatrix
+        The values to write of every city
+    folder : String
+        The path of the folder where the csv files are written
+    header : String
+        The name of the column of values in the csv files
+    daily : DailyMatrix, optional
+        The values per day of every city, when `matrix` has their cumulative
+        values, which select the days written
+
+    Returns
+    ----------
+    report : WriteReport
+        The number of files and bytes written and the time taken
+    """
+    previous = datasets.written("cases_colombia", CityDailyCounts.key, folder)
+    refreshed = None if previous is None \
+        else set(__aggregate(CityDailyCounts()).changed(previous))
+    written = (matrix if daily is None else daily).values > 0
+    jobs = []
+    for city in matrix.entities:
+        path = folder + city.lower() + ".csv"
+        if refreshed is None or city in refreshed \
+                or not os.path.exists(path):
+            city_series = matrix.series(city, written[matrix.rows[city]])
+            jobs.append((city_series, path, {"header" : [header]}))
+    report = writer.write(jobs, if_changed=refreshed is not None,
+                          label=folder)
+    datasets.mark("cases_colombia", CityDailyCounts.key, folder)
+    return report
+
+@instrumented
 def cities_cases_per_day():
     """Writes a csv file for each Series representing the cases per day of every
     single city with a diagnosed case in Colombia.
@@ -521,13 +532,11 @@ def cities_cases_per_day():
     ----------
     None
     """
-    cities = cases_colombia.city.unique()
-    for city in cities:
-        city_cases = __city_cases_per_day(city)
-        city_cases.index.name = "date"
-        city_cases.to_csv("../covid-in-colombia/data/cities/cases/per_day/"
-            + city.lower() + ".csv", header=["cases"])
+    ccpd, _ = __city_matrices()
+    __write_cities(ccpd, "../covid-in-colombia/data/cities/cases/per_day/",
+        "cases")
 
+@instrumented
 def cities_cases_progression():
     """Writes a csv file for each Series representing the cumulative cases per
     day of every single city with a diagnosed case in Colombia.
@@ -536,13 +545,11 @@ def cities_cases_progression():
     ----------
     None
     """
-    cities = cases_colombia.city.unique()
-    for city in cities:
-        city_cases = __city_cases_progression(city)
-        city_cases.index.name = "date"
-        city_cases.to_csv("../covid-in-colombia/data/cities/cases/total/"
-            + city.lower() + ".csv", header=["cases"])
+    ccpd, _ = __city_matrices()
+    __write_cities(ccpd.cumsum(),
+        "../covid-in-colombia/data/cities/cases/total/", "cases", ccpd)
 
+@instrumented
 def cities_deaths_per_day():
     """Writes a csv file for each Series representing the cases per day of every
     single city with a reported death in Colombia.
@@ -551,13 +558,11 @@ def cities_deaths_per_day():
     ----------
     None
     """
-    cities = cases_colombia.city.unique()
-    for city in cities:
-        city_deaths = __city_deaths_per_day(city)
-        city_deaths.index.name = "date"
-        city_deaths.to_csv("../covid-in-colombia/data/cities/deaths/per_day/"
-            + city.lower() + ".csv", header=["deaths"])
+    _, cdpd = __city_matrices()
+    __write_cities(cdpd, "../covid-in-colombia/data/cities/deaths/per_day/",
+        "deaths")
 
+@instrumented
 def cities_deaths_progression():
     """Writes a csv file for each Series representing the cumulative deaths per
     day of every single city with a reported death in Colombia.
@@ -566,16 +571,263 @@ def cities_deaths_progression():
     ----------
     None
     """
-    cities = cases_colombia.city.unique()
-    for city in cities:
-        city_deaths = __city_deaths_progression(city)
-        city_deaths.index.name = "date"
-        city_deaths.to_csv("../covid-in-colombia/data/cities/deaths/total/"
-            + city.lower() + ".csv", header=["deaths"])
+    _, cdpd = __city_matrices()
+    __write_cities(cdpd.cumsum(),
+        "../covid-in-colombia/data/cities/deaths/total/", "deaths", cdpd)
+
+@instrumented
+def cities_consolidated(folder="../covid-in-colombia/data/cities/"):
+    """Writes the cases and deaths per day of every city in Colombia, daily and
+    cumulative, to the single files `cities.csv` and `cities.feather`, along
+    with the index `cities_index.csv`, and returns them in a Dataframe object
+    `consolidated`.
+
+    The rows are sorted by city and date. The index has, for every city, the
+    range of its rows (`row_start` to `row_end`, excluding the header) and the
+    range of their bytes in `cities.csv` (`byte_start` to `byte_end`), both
+    with exclusive ends, so that a single city can be fetched with a range
+    read of either file. The cases are every diagnosed case, including the
+    cases that died, unlike in the csv files of every city.
+
+    Parameters
+    ----------
+    folder : String, optional
+        The path of the folder where the files are written
+
+    Returns
+    ----------
+    consolidated : Dataframe
+        A Dataframe with the city, date, cases, deaths, cum_cases and
+        cum_deaths columns
+    """
+    ccpd, cdpd = __city_matrices()
+    ccpd = ccpd + cdpd
+    rows, days = np.nonzero(ccpd.values > 0)
+    consolidated = pd.DataFrame({
+        "city" : np.array(ccpd.entities, dtype=object)[rows],
+        "date" : ccpd.dates[days],
+        "cases" : ccpd.values[rows, days],
+        "deaths" : cdpd.values[rows, days],
+        "cum_cases" : ccpd.cumsum().values[rows, days],
+        "cum_deaths" : cdpd.cumsum().values[rows, days]
+    })
+
+    content = consolidated.to_csv(index=False, date_format="%Y-%m-%d")\
+        .encode("utf-8")
+    line_ends = np.flatnonzero(np.frombuffer(content, dtype=np.uint8)
+        == ord("\n")) + 1
+    cities = consolidated["city"]
+    row_start = np.flatnonzero(cities.ne(cities.shift()).to_numpy())
+    row_end = np.append(row_start, len(consolidated))[1:]
+    index = pd.DataFrame({
+        "city" : cities.iloc[row_start].to_numpy(),
+        "row_start" : row_start,
+        "row_end" : row_end,
+        "byte_start" : line_ends[row_start],
+        "byte_end" : line_ends[row_end]
+    })
+
+    write_atomic(content, folder + "cities.csv")
+    write_feather(consolidated, folder + "cities.feather")
+    write_atomic(index.to_csv(index=False).encode("utf-8"),
+        folder + "cities_index.csv")
+    return consolidated
+
+@instrumented
+def departments_per_day():
+    """Returns a Dataframe object `dpd` with the cases and deaths per day, and
+    their cumulative totals, of every department in Colombia.
+
+    The counts are rolled up from the cases and deaths per day of the cities,
+    and every department has a row for every day from the first to the last
+    date of the cases. The cases are every diagnosed case, including the
+    cases that died, so the deaths are a subset of the cases, as in every
+    other Dataframe of Colombia except the Series of the cities.
+
+    Returns
+    ----------
+    dpd : Dataframe
+        A Dataframe with the columns "dept", "date", "cases", "deaths",
+        "total_cases" and "total_deaths"
+    """
+    frames = []
+    for name, matrix in zip(("cases", "deaths"), __daily_matrices("dept")):
+        frames.append(matrix.stack().rename(name))
+        frames.append(matrix.cumsum(axis=1).stack().rename("total_" + name))
+    dpd = pd.concat(frames, axis=1).astype("int64").reset_index()\
+        [["dept", "date", "cases", "deaths", "total_cases", "total_deaths"]]
+    return dpd
+
+@instrumented
+def national_per_day():
+    """Returns a Dataframe object `npd` with the cases and deaths per day in
+    Colombia, and their cumulative totals, rolled up from the cases and deaths
+    per day of the cities, along with the cumulative totals of the global time
+    series on the same days to reconcile both sources.
+
+    The cases are every diagnosed case, including the cases that died, as in
+    the global time series, so the total cases are reconciled directly with
+    the global total of cases.
+
+    Returns
+    ----------
+    npd : Dataframe
+        A Dataframe with the columns "date", "cases", "deaths", "total_cases",
+        "total_deaths", "global_total_cases" and "global_total_deaths". The
+        global totals are empty on the days missing from the global time
+        series
+    """
+    cases, deaths = __aggregate(CityDailyCounts()).rollup()
+    cases = cases.add(deaths, fill_value=0)
+    dates = __date_range(cases)
+    npd = pd.DataFrame({"cases" : cases, "deaths" : deaths}, index=dates)\
+        .fillna(0).astype("int64")
+    npd["total_cases"] = npd["cases"].cumsum()
+    npd["total_deaths"] = npd["deaths"].cumsum()
+    npd["global_total_cases"] = __cases_registry().matrix["Colombia"]\
+        .reindex(dates).astype("Int64")
+    npd["global_total_deaths"] = __deaths_registry().matrix["Colombia"]\
+        .reindex(dates).astype("Int64")
+    npd = npd.rename_axis("date").reset_index()
+    return npd
+
+def __daily_matrices(level):
+    """Returns two Dataframe objects, `cases` and `deaths`, with the cases and
+    deaths per day of every city or department, with a row per city or
+    department and a column for every day from the first to the last date of
+    the cases. The cases include the cases that died.
+
+    The departments are rolled up from the cases and deaths per day of the
+    cities, on the calendar of the cities.
+
+    Parameters
+    ----------
+    level : String
+        "city" or "dept"
+
+    Returns
+    ----------
+    cases : Dataframe
+        A Dataframe indexed by `level` with a column per date
+    deaths : Dataframe
+        A Dataframe like `cases` with the deaths per day
+    """
+    ccpd, cdpd = __city_matrices()
+    if level == "city":
+        cases, deaths = ccpd, cdpd
+    else:
+        cases, deaths = __aggregate(CityDailyCounts()).rollup(level)
+        entities = sorted(set(cases.index.unique(level=level))
+                          | set(deaths.index.unique(level=level)))
+        cases = DailyMatrix.from_series(cases, level, entities, ccpd.dates)
+        deaths = DailyMatrix.from_series(deaths, level, entities, ccpd.dates)
+    cases = cases + deaths
+    return cases.to_frame(level), deaths.to_frame(level)
+
+def __date_range(series):
+    """Returns a DatetimeIndex object with every day from the first to the last
+    date of the Series provided, indexed by date or by a level and date.
+
+    Parameters
+    ----------
+    series : Series
+        A Series with a "date" level in its index
+
+    Returns
+    ----------
+    DatetimeIndex
+    """
+    dates = series.index.get_level_values("date")
+    if len(dates) == 0:
+        return pd.DatetimeIndex([], name="date")
+    return pd.date_range(dates.min(), dates.max(), name="date")
+
+@instrumented
+def countries_metrics():
+    """Returns a Dataframe object `metrics` with the rolling-window metrics of
+    the cases and deaths per day of every country.
+
+    Returns
+    ----------
+    metrics : Dataframe
+        A Dataframe with the columns "country" and "date", and the columns of
+        `analytics.METRICS` prefixed with "cases_" and "deaths_"
+    """
+    cases, deaths = [registry.matrix.diff().fillna(registry.matrix).T
+                     .rename_axis("country")
+                     for registry in (__cases_registry(), __deaths_registry())]
+    return __metrics(cases, deaths, POPULATIONS)
 
-def countries_cases_progression():
+@instrumented
+def departments_metrics():
+    """Returns a Dataframe object `metrics` with the rolling-window metrics of
+    the cases and deaths per day of every department in Colombia, rolled up
+    from those of the cities. The cases include the cases that died.
+
+    Returns
+    ----------
+    metrics : Dataframe
+        A Dataframe with the columns "dept" and "date", and the columns of
+        `analytics.METRICS` prefixed with "cases_" and "deaths_"
+    """
+    return __metrics(*__daily_matrices("dept"))
+
+@instrumented
+def cities_metrics():
+    """Returns a Dataframe object `metrics` with the rolling-window metrics of
+    the cases and deaths per day of every city in Colombia. The cases include
+    the cases that died.
+
+    Returns
+    ----------
+    metrics : Dataframe
+        A Dataframe with the columns "city" and "date", and the columns of
+        `analytics.METRICS` prefixed with "cases_" and "deaths_"
+    """
+    return __metrics(*__daily_matrices("city"))
+
+def __metrics(cases, deaths, populations=None):
+    """Returns a Dataframe object `table` with the rolling-window metrics of
+    the cases and deaths per day provided, side by side.
+
+    Parameters
+    ----------
+    cases : Dataframe
+        A Dataframe with a row per entity and a column per day with the cases
+        per day
+    deaths : Dataframe
+        A Dataframe like `cases` with the deaths per day
+    populations : Dictionary, optional
+        The number of inhabitants of the entities, keyed by entity
+
+    Returns
+    ----------
+    table : Dataframe
+        A Dataframe with a column for the entity and the date, and the metrics
+        of the cases and deaths, which are empty on the days only one of them
+        has values for
+    """
+    table = pd.concat([metrics(values, populations).add_prefix(name + "_")
+                       for name, values in (("cases", cases),
+                                            ("deaths", deaths))],
+                      axis=1).round(4)
+    counts = [name + "_" + metric for name in ("cases", "deaths")
+              for metric in ("new", "total")]
+    table[counts] = table[counts].astype("Int64")
+    table.index = table.index.set_names("date", level=1)
+    table = table.reset_index()
+    return table
+
+@instrumented
+def countries_cases_progression(countries=None):
     """Returns a Dataframe `dataframe` containing the progressions of cases of
-    all the countries of interest.
+    the countries provided, aligned by the days since their first case.
+
+    Parameters
+    ----------
+    countries : List OR String, optional
+        The countries whose progressions are returned, `COUNTRIES` if none are
+        provided, or every country with a reported case if it is "all"
 
     Returns
     ----------
@@ -584,36 +836,19 @@ def countries_cases_progression():
         their outbreak up until two weeks in advance of the amount of days
         Colombia has endured.
     """
-    colombia = __country_cases_progression("Colombia", colombia_first_date)
-    italy = __country_cases_progression("Italy", italy_first_date)
-    spain = __country_cases_progression("Spain", spain_first_date)
-    peru = __country_cases_progression("Peru", peru_first_date)
-    ecuador = __country_cases_progression("Ecuador", ecuador_first_date)
-    argentina = __country_cases_progression("Argentina", argentina_first_date)
-    chile = __country_cases_progression("Chile", chile_first_date)
-    venezuela = __country_cases_progression("Venezuela", venezuela_first_date)
-    brazil = __country_cases_progression("Brazil", brazil_first_date)
-    mexico = __country_cases_progression("Mexico", mexico_first_date)
-
-    data = dict(Colombia = np.array(colombia),
-                Italy = np.array(italy),
-                Spain = np.array(spain),
-                Peru = np.array(peru),
-                Ecuador = np.array(ecuador),
-                Argentina = np.array(argentina),
-                Chile = np.array(chile),
-                Venezuela = np.array(venezuela),
-                Brazil = np.array(brazil),
-                Mexico = np.array(mexico))
-
-    dataframe = pd.DataFrame({k : pd.Series(v) for k, v in data.items()})
-    dataframe.index.name = "day"
-    dataframe.index += 1
+    dataframe = __countries_progression(__cases_registry(), countries)
     return dataframe
 
-def countries_deaths_progression():
+@instrumented
+def countries_deaths_progression(countries=None):
     """Returns a Dataframe `dataframe` containing the progressions of deaths of
-    all the countries of interest.
+    the countries provided, aligned by the days since their first death.
+
+    Parameters
+    ----------
+    countries : List OR String, optional
+        The countries whose progressions are returned, `COUNTRIES` if none are
+        provided, or every country with a reported death if it is "all"
 
     Returns
     ----------
@@ -622,32 +857,33 @@ def countries_deaths_progression():
         first day of a reported death up until two weeks in advance of the
         amount of days Colombia has endured.
     """
-    italy = __country_deaths_progression("Italy", italy_first_death_date)
-    spain = __country_deaths_progression("Spain", spain_first_death_date)
-    peru = __country_deaths_progression("Peru", peru_first_death_date)
-    ecuador = __country_deaths_progression("Ecuador", ecuador_first_death_date)
-    chile = __country_deaths_progression("Chile", chile_first_death_date)
-    brazil = __country_deaths_progression("Brazil", brazil_first_death_date)
-    mexico = __country_deaths_progression("Mexico", mexico_first_death_date)
-    colombia = __country_deaths_progression("Colombia",\
-        colombia_first_death_date)
-    argentina = __country_deaths_progression("Argentina",\
-        argentina_first_death_date)
-    venezuela = __country_deaths_progression("Venezuela",\
-        venezuela_first_death_date)
-
-    data = dict(Colombia = np.array(colombia),
-                Italy = np.array(italy),
-                Spain = np.array(spain),
-                Peru = np.array(peru),
-                Ecuador = np.array(ecuador),
-                Argentina = np.array(argentina),
-                Chile = np.array(chile),
-                Venezuela = np.array(venezuela),
-                Brazil = np.array(brazil),
-                Mexico = np.array(mexico))
-
-    dataframe = pd.DataFrame({k : pd.Series(v) for k, v in data.items()})
-    dataframe.index.name = "day"
-    dataframe.index += 1
+    dataframe = __countries_progression(__deaths_registry(), countries)
+    return dataframe
+
+def __countries_progression(registry, countries):
+    """Returns a Dataframe object `dataframe` with the progressions of the
+    countries provided in the registry provided.
+
+    For countries that have had more days since their first date than
+    Colombia, up to two extra weeks of the progression is also returned.
+
+    Parameters
+    ----------
+    registry : CountryRegistry
+        The registry of the global cases or deaths
+    countries : List OR String
+        The countries whose progressions are returned, `COUNTRIES` if it is
+        None, or every country with a first date if it is "all"
+
+    Returns
+    ----------
+    dataframe : Dataframe
+        A Dataframe indexed by day with a column per country
+    """
+    if countries is None:
+        countries = COUNTRIES
+    elif countries == "all":
+        countries = registry.countries
+    days = registry.days_since_first(REFERENCE_COUNTRY).days + 14
+    dataframe = registry.progressions(countries, days)
     return dataframe
@@ -0,0 +1,218 @@
+"""Countries
+
+Registry of the countries in the global time series of cases or deaths, with
+the date of the first reported case or death of every country. The first dates
+are derived from the time series as the first day with a nonzero value, and
+can be overridden for countries whose time series starts earlier than their
+actual outbreak.
+
+Classes
+----------
+CountryRegistry
+    The time series of every country, with their first dates and progressions
+
+Functions
+----------
+country_matrix : Dataframe
+    Returns a Dataframe with a row per day and a column per country, from the
+    global time series
+dataset_registry : CountryRegistry
+    Returns the cached CountryRegistry of a global time series of a DataLoader
+"""
+
+import numpy as np
+import pandas as pd
+from dates import parse_labels
+from timeseries import TimeSeries
+from variables.countries import FIRST_DATE_OVERRIDES
+from variables.countries import FIRST_DEATH_DATE_OVERRIDES
+
+DATASET_OVERRIDES = {
+    "cases_worldwide" : FIRST_DATE_OVERRIDES,
+    "deaths_worldwide" : FIRST_DEATH_DATE_OVERRIDES
+}
+
+def country_matrix(dtfrm):
+    """Returns a Dataframe object `matrix` indexed by date with the values of
+    every country in the global Dataframe provided.
+
+    The provinces of each country are summed into a single column.
+
+    Parameters
+    ----------
+    dtfrm : Dataframe
+        A Dataframe with the global time series, with a row per location and
+        a column per day
+
+    Returns
+    ----------
+    matrix : Dataframe
+        A Dataframe with a row per day and a column per country
+    """
+    matrix = dtfrm.drop(columns=["Province/State", "Lat", "Long"])\
+        .groupby("Country/Region").sum().T
+    matrix.index = parse_labels(matrix.index)
+    matrix.index.name = "date"
+    matrix.columns.name = None
+    return matrix
+
+class CountryRegistry:
+    """The time series of every country, with the date of their first nonzero
+    value.
+
+    Parameters
+    ----------
+    matrix : Dataframe
+        A Dataframe with a row per day and a column per country, as returned by
+        `country_matrix`
+    overrides : Dictionary, optional
+        First dates that replace the derived ones, keyed by country
+    """
+
+    def __init__(self, matrix, overrides=None):
+        self.matrix = matrix
+        started = (matrix.values > 0).any(axis=0)
+        first = (matrix.values > 0).argmax(axis=0)
+        first_dates = pd.Series(matrix.index[first], index=matrix.columns)
+        first_dates[~started] = pd.NaT
+        for country, date in (overrides or {}).items():
+            first_dates[country] = pd.Timestamp(date)
+        self.first_dates = first_dates
+
+    @classmethod
+    def from_time_series(cls, dtfrm, overrides=None):
+        """Returns a CountryRegistry object `registry` of the global time series
+        provided.
+
+        Parameters
+        ----------
+        dtfrm : Dataframe or TimeSeries
+            A Dataframe with the global time series, with a row per location and
+            a column per day, or a TimeSeries
+        overrides : Dictionary, optional
+            First dates that replace the derived ones, keyed by country
+
+        Returns
+        ----------
+        registry : CountryRegistry
+        """
+        if isinstance(dtfrm, TimeSeries):
+            matrix = dtfrm.by_country()
+        else:
+            matrix = country_matrix(dtfrm)
+        registry = cls(matrix, overrides)
+        return registry
+
+    @property
+    def countries(self):
+        """List: every country with at least one nonzero value."""
+        return self.first_dates.dropna().index.tolist()
+
+    def first_date(self, country):
+        """Returns a Timestamp object with the first date of the country
+        provided.
+
+        Parameters
+        ----------
+        country : String
+            The name of the country
+
+        Returns
+        ----------
+        Timestamp
+            The first date, or NaT if the country has no nonzero value
+        """
+        return self.first_dates[country]
+
+    def days_since_first(self, country):
+        """Returns a Timedelta object with the number of days from the first
+        date of the country provided to the last day of the time series.
+
+        Parameters
+        ----------
+        country : String
+            The name of the country
+
+        Returns
+        ----------
+        Timedelta
+        """
+        return self.matrix.index[-1] - self.first_date(country)
+
+    def series(self, country):
+        """Returns a Series object `series` with the values of the country
+        provided from its first date on.
+
+        Parameters
+        ----------
+        country : String
+            The name of the country
+
+        Returns
+        ----------
+        series : Series
+            A Series indexed by date
+        """
+        series = self.matrix.loc[self.first_date(country):, country]
+        return series
+
+    def progressions(self, countries=None, days=None):
+        """Returns a Dataframe object `progressions` with the values of every
+        country provided, aligned by the number of days since their first date.
+
+        The values of all the countries are gathered from the matrix at once.
+        A country is padded with NaN after the last day of the time series,
+        and countries without a first date have no values.
+
+        Parameters
+        ----------
+        countries : List, optional
+            The countries to include, in order. Every country with a first date
+            is included if none are provided
+        days : Integer, optional
+            The maximum number of days of every progression
+
+        Returns
+        ----------
+        progressions : Dataframe
+            A Dataframe indexed by day, starting at 1, with a column per country
+        """
+        countries = self.countries if countries is None else list(countries)
+        dates = self.first_dates.reindex(countries)
+        starts = self.matrix.index.searchsorted(dates.fillna(
+            self.matrix.index[-1] + pd.Timedelta(days=1)))
+        lengths = len(self.matrix) - starts
+        rows = int(lengths.max()) if len(lengths) else 0
+        if days is not None:
+            rows = min(rows, days)
+        values = self.matrix.reindex(columns=countries).values
+        positions = starts[None, :] + np.arange(rows)[:, None]
+        inside = positions < len(self.matrix)
+        gathered = np.take_along_axis(values,
+            np.minimum(positions, len(self.matrix) - 1), axis=0)
+        progressions = pd.DataFrame(np.where(inside, gathered, np.nan),
+            columns=countries, index=pd.RangeIndex(1, rows + 1, name="day"))
+        complete = inside.all(axis=0)
+        progressions[progressions.columns[complete]] = \
+            progressions.loc[:, complete].astype(self.matrix.values.dtype)
+        return progressions
+
+def dataset_registry(loader, name):
+    """Returns the CountryRegistry object of the global time series `name` of
+    the DataLoader provided, with the first dates of `DATASET_OVERRIDES`,
+    derived once per load of the dataset.
+
+    Parameters
+    ----------
+    loader : DataLoader
+        A loader with the dataset `name`
+    name : String
+        "cases_worldwide" or "deaths_worldwide"
+
+    Returns
+    ----------
+    CountryRegistry
+    """
+    return loader.derived(name, "registry",
+        lambda series: CountryRegistry.from_time_series(series,
+            DATASET_OVERRIDES[name]))
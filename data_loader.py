@@ -0,0 +1,727 @@
+"""Data Loader
+
+Lazy loader of the datasets used by `corona_utils`. Each dataset is parsed from
+its csv file the first time it is accessed, and is kept in memory for the rest
+of the process until its file changes on disk.
+
+Classes
+----------
+DataLoader
+    Loads registered datasets on first access and caches them, along with any
+    data derived from them, while their source files are unchanged
+
+Functions
+----------
+read_cases_colombia : Dataframe
+    Returns a Dataframe object of the cases reported in Colombia
+read_cases_colombia_chunks : Iterator
+    Returns an iterator over the cases reported in Colombia, read from the csv
+    file in Dataframe objects of a bounded number of rows
+read_cases_colombia_cached : Dataframe
+    Returns a Dataframe object of the cases reported in Colombia, read from a
+    columnar cache of the csv file when available
+memory_footprint : (Integer, Integer)
+    Returns the memory used by the cases reported in Colombia with the default
+    dtypes of `pandas` and with `COLOMBIA_SCHEMA`
+read_worldwide : Dataframe
+    Returns a Dataframe object of a global time series
+read_worldwide_cached : TimeSeries
+    Returns a TimeSeries object of a global time series, memory-mapped from a
+    cache of the csv file when available
+content_hash : String
+    Returns the sha256 of a file, hashing it once per modification time and
+    size
+default_loader : DataLoader
+    Returns a DataLoader with the datasets of cases and deaths registered
+"""
+
+import csv
+import glob
+import hashlib
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+try:
+    from pyarrow import feather
+except ImportError:
+    feather = None
+from dates import parse_dates
+from instrumentation import recorder
+from timeseries import TimeSeries
+
+CACHE_DIR = ".cache"
+CACHE_VERSION = 2
+REFRESH_CHUNKSIZE = 100000
+
+COLOMBIA_COLUMNS = {
+    "Fecha de notificación" : "date",
+    "Fecha de muerte" : "date_death",
+    "Nombre municipio" : "city",
+    "Departamento" : "dept",
+    "Atención" : "locTreatment",
+    "Edad" : "age",
+    "Sexo" : "sex",
+    "Tipo" : "type",
+    "Nombre del país" : "origin",
+    "Fecha recuperado" : "date_recovered"
+}
+
+COLOMBIA_SCHEMA = {
+    "Nombre municipio" : "category",
+    "Departamento" : "category",
+    "Atención" : "category",
+    "Edad" : "uint8",
+    "Sexo" : "category",
+    "Tipo" : "category",
+    "Nombre del país" : "category"
+}
+
+COLOMBIA_DATES = ["date", "date_death", "date_recovered"]
+
+# The dates are read as categories so that every distinct string is held, and
+# parsed by `dates.parse_dates`, only once
+_DATE_CATEGORIES = {column : "category" for column, renamed
+                    in COLOMBIA_COLUMNS.items() if renamed in COLOMBIA_DATES}
+
+class DataLoader:
+    """Loads registered datasets on first access and caches them, along with
+    any data derived from them, while their source files are unchanged.
+
+    A dataset is parsed again, and everything derived from it is dropped, when
+    the modification time or the size of its file changes. Datasets registered
+    as columnar are read one column at a time, only when a column is first
+    requested.
+
+    Parameters
+    ----------
+    chunksize : Integer, optional
+        The maximum number of rows held in memory at once when computing
+        aggregates of the datasets that can be read in chunks. Those datasets
+        are read whole if no chunk size is provided
+    state : RefreshState, optional
+        The persisted aggregates of the datasets that can be read in chunks.
+        When provided, the aggregates are refreshed with only the rows
+        appended to those datasets since they were last computed
+    """
+
+    def __init__(self, chunksize=None, state=None):
+        self.chunksize = chunksize
+        self.state = state
+        self.__sources = {}
+        self.__cache = {}
+        self.__lock = threading.RLock()
+
+    def register(self, name, path, reader, columnar=False, chunks=None):
+        """Registers the dataset `name`, read from `path` with `reader`.
+
+        Parameters
+        ----------
+        name : String
+            The name the dataset is accessed by
+        path : String
+            The path of the source file of the dataset
+        reader : Function
+            A function that takes `path` and returns the parsed dataset
+        columnar : Boolean, optional
+            Whether `reader` also takes a `columns` list, and returns only the
+            columns in it
+        chunks : Function, optional
+            A function that takes `path`, a chunk size and a `columns` list,
+            and returns an iterator over the dataset in chunks
+
+        Returns
+        ----------
+        None
+        """
+        with self.__lock:
+            self.__sources[name] = (path, reader, columnar, chunks)
+            self.__cache.pop(name, None)
+
+    def path(self, name):
+        """Returns the path of the source file of the dataset `name`.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset
+
+        Returns
+        ----------
+        path : String
+        """
+        return self.__sources[name][0]
+
+    def get(self, name, columns=None):
+        """Returns the dataset `name`, parsing it if it has not been loaded yet
+        or if its source file has changed since it was loaded.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset
+        columns : List, optional
+            The columns of the dataset that are needed. Every column is
+            returned if none are provided
+
+        Returns
+        ----------
+        data : Dataframe
+            The parsed dataset
+        """
+        with self.__lock:
+            entry = self.__entry(name)
+            _, reader, columnar, _ = self.__sources[name]
+            if not columnar:
+                if entry["data"] is None:
+                    entry["data"] = self.__read(name, reader)
+                    entry["complete"] = True
+            elif columns is None:
+                if not entry["complete"]:
+                    entry["data"] = self.__read(name, reader)
+                    entry["complete"] = True
+            elif not entry["complete"]:
+                loaded = entry["data"]
+                missing = [column for column in columns if loaded is None
+                           or column not in loaded.columns]
+                if missing:
+                    data = self.__read(name, reader, missing)
+                    if entry["data"] is not None:
+                        data = entry["data"].join(data)
+                    entry["data"] = data
+            data = entry["data"]
+            if columnar and columns is not None:
+                data = data[list(columns)]
+            return data
+
+    def derived(self, name, key, builder, columns=None):
+        """Returns the value `key` derived from the dataset `name`, building it
+        with `builder` the first time it is requested.
+
+        Derived values are dropped along with the dataset they come from.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset the value is derived from
+        key : String
+            The name of the derived value
+        builder : Function
+            A function that takes the dataset and returns the derived value
+        columns : List, optional
+            The columns of the dataset that `builder` needs
+
+        Returns
+        ----------
+        value : Object
+            The derived value
+        """
+        with self.__lock:
+            entry = self.__entry(name)
+            if key not in entry["derived"]:
+                data = self.get(name, columns)
+                entry = self.__entry(name)
+                entry["derived"][key] = builder(data)
+            return entry["derived"][key]
+
+    def preload(self, name, data=None, derived=None):
+        """Provides the dataset `name`, or values derived from it, that were
+        loaded elsewhere, such as in the shared memory of another process, as
+        if they had been loaded from its current source file.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset
+        data : Dataframe, optional
+            The dataset, or some of its columns if it is columnar
+        derived : Dictionary, optional
+            Values derived from the dataset, keyed like in `derived`
+
+        Returns
+        ----------
+        None
+        """
+        with self.__lock:
+            entry = self.__entry(name)
+            if data is not None:
+                entry["data"] = data
+                entry["complete"] = not self.__sources[name][2]
+            entry["derived"].update(derived or {})
+
+    def aggregate(self, name, accumulator):
+        """Returns the accumulator `accumulator` updated with every row of the
+        dataset `name`, as `aggregate_many` does for a single accumulator.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset
+        accumulator : Object
+            An accumulator of `aggregates`, with `columns`, `key` and `update`
+
+        Returns
+        ----------
+        accumulator : Object
+            The updated accumulator
+        """
+        return self.aggregate_many(name, [accumulator])[0]
+
+    def aggregate_many(self, name, accumulators):
+        """Returns a list `updated` with the accumulators provided updated with
+        every row of the dataset `name`, reading the dataset once for all of
+        them.
+
+        When a chunk size is set and the dataset can be read in chunks, the
+        dataset is streamed through the accumulators and never held in memory,
+        and every chunk updates every accumulator. With a refresh state, only
+        the rows appended since the last refresh are streamed. Otherwise the
+        accumulators are updated once with the whole dataset. The updated
+        accumulators are cached under their `key`, like derived values, and
+        those already cached are not updated again.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset
+        accumulators : List
+            Accumulators of `aggregates`, with `columns`, `key` and `update`
+
+        Returns
+        ----------
+        updated : List
+            The updated accumulators, in the order provided
+        """
+        with self.__lock:
+            path, _, _, chunks = self.__sources[name]
+            entry = self.__entry(name)
+            missing = list({accumulator.key : accumulator
+                            for accumulator in accumulators
+                            if accumulator.key not in entry["derived"]}
+                           .values())
+            if missing:
+                keys = ", ".join(accumulator.key for accumulator in missing)
+                columns = _columns(missing)
+                with recorder.stage("aggregate " + keys) as stage:
+                    if self.state is not None and chunks is not None:
+                        missing = self.state.refresh(path, missing,
+                            lambda offset, needed: chunks(path,
+                                self.chunksize or REFRESH_CHUNKSIZE, needed,
+                                offset))
+                        rows = None
+                    elif self.chunksize and chunks is not None:
+                        rows = 0
+                        for chunk in chunks(path, self.chunksize, columns):
+                            for accumulator in missing:
+                                accumulator.update(chunk)
+                            rows += len(chunk)
+                    else:
+                        data = self.get(name, columns)
+                        for accumulator in missing:
+                            accumulator.update(data)
+                        rows = len(data)
+                    if stage is not None:
+                        stage.rows = rows
+                for accumulator in missing:
+                    entry["derived"][accumulator.key] = accumulator
+            updated = [entry["derived"][accumulator.key]
+                       for accumulator in accumulators]
+            return updated
+
+    def written(self, name, key, output):
+        """Returns the accumulator `key` of the dataset `name` as it was when
+        the output `output` was last written from it.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset
+        key : String
+            The key of the accumulator
+        output : String
+            The path of the output
+
+        Returns
+        ----------
+        accumulator : Object
+            The accumulator the output was written from, or None if there is
+            no refresh state or the output was never written from it
+        """
+        if self.state is None:
+            return None
+        return self.state.written(self.__sources[name][0], key, output)
+
+    def mark(self, name, key, output):
+        """Records that the output `output` was written in full from the
+        accumulator `key` of the dataset `name`, as of its last refresh. It
+        does nothing if there is no refresh state.
+
+        Parameters
+        ----------
+        name : String
+            The name of the dataset
+        key : String
+            The key of the accumulator
+        output : String
+            The path of the output
+
+        Returns
+        ----------
+        None
+        """
+        if self.state is not None:
+            self.state.mark(self.__sources[name][0], key, output)
+
+    def invalidate(self, name=None):
+        """Drops the dataset `name`, or every dataset if no name is provided,
+        so that it is parsed again on its next access.
+
+        Parameters
+        ----------
+        name : String, optional
+            The name of the dataset to drop
+
+        Returns
+        ----------
+        None
+        """
+        with self.__lock:
+            if name is None:
+                self.__cache.clear()
+            else:
+                self.__cache.pop(name, None)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self.__sources:
+            raise AttributeError("No dataset registered as " + repr(name))
+        return self.get(name)
+
+    def __read(self, name, reader, columns=None):
+        """Parses the columns `columns` of the dataset `name` with `reader`,
+        or every column if none are provided, as an instrumented stage.
+        """
+        path = self.__sources[name][0]
+        with recorder.stage("parse " + name) as stage:
+            if columns is None:
+                data = reader(path)
+            else:
+                data = reader(path, columns=columns)
+            if stage is not None:
+                stage.rows = len(data)
+        return data
+
+    def __entry(self, name):
+        with self.__lock:
+            path = self.__sources[name][0]
+            signature = _signature(path)
+            entry = self.__cache.get(name)
+            if entry is None or entry["signature"] != signature:
+                entry = {
+                    "signature" : signature,
+                    "data" : None,
+                    "complete" : False,
+                    "derived" : {}
+                }
+                self.__cache[name] = entry
+            return entry
+
+def _columns(accumulators):
+    """Returns the columns of every accumulator provided, in order and without
+    repetitions.
+    """
+    return list(dict.fromkeys(column for accumulator in accumulators
+                              for column in accumulator.columns))
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+_hashes = {}
+
+def content_hash(path):
+    """Returns the sha256 hex digest of the file `path`, hashing the file only
+    once for every modification time and size it has.
+
+    Parameters
+    ----------
+    path : String
+        The path of the file
+
+    Returns
+    ----------
+    String
+    """
+    key = (os.path.abspath(path),) + _signature(path)
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(1 << 20), b""):
+                digest.update(block)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+def read_cases_colombia(path, columns=None, schema=True):
+    """Returns a Dataframe object `cases` of the cases reported in Colombia.
+
+    Parameters
+    ----------
+    path : String
+        The path of the csv file published by the Instituto Nacional de Salud
+    columns : List, optional
+        The renamed columns to read. Every column is read if none are provided
+    schema : Boolean, optional
+        Whether the columns are read with the dtypes of `COLOMBIA_SCHEMA`, and
+        the columns of `COLOMBIA_DATES` are parsed as dates
+
+    Returns
+    ----------
+    cases : Dataframe
+        A Dataframe with a row per reported case
+    """
+    cases = pd.read_csv(path, **_csv_options(columns, schema))
+    return _prepare_cases(cases, columns, schema)
+
+def read_cases_colombia_chunks(path, chunksize, columns=None, offset=0):
+    """Returns an iterator over the cases reported in Colombia, read from the
+    csv file in Dataframe objects of at most `chunksize` rows.
+
+    Each chunk is renamed and typed as the Dataframe of `read_cases_colombia`,
+    but every chunk has its own categories. When every row is read and the
+    columnar cache of `read_cases_colombia_cached` exists, the chunks are
+    read from the memory-mapped cache instead of parsing the csv file, if it
+    has every column requested.
+
+    Parameters
+    ----------
+    path : String
+        The path of the csv file published by the Instituto Nacional de Salud
+    chunksize : Integer
+        The maximum number of rows of every chunk
+    columns : List, optional
+        The renamed columns to read. Every column is read if none are provided
+    offset : Integer, optional
+        The byte offset of the first row to read. Every row is read if no
+        offset is provided
+
+    Returns
+    ----------
+    chunks : Iterator
+        An iterator of Dataframes with a row per reported case
+    """
+    cache = _cache_path(path)
+    if not offset and cache is not None and os.path.exists(cache):
+        table = feather.read_table(cache, memory_map=True)
+        if columns is None or set(columns) <= set(table.column_names):
+            if columns is not None:
+                table = table.select(list(columns))
+            for batch in table.to_batches(max_chunksize=chunksize):
+                yield _from_arrow(batch)
+            return
+    options = _csv_options(columns, True)
+    with open(path, "rb") as source:
+        if offset:
+            header = source.readline().decode("utf-8")
+            options["names"] = next(csv.reader([header]))
+            options["header"] = None
+            source.seek(offset)
+            if not source.peek(1):
+                return
+        with pd.read_csv(source, chunksize=chunksize, **options) as reader:
+            for chunk in reader:
+                yield _prepare_cases(chunk, columns, True)
+
+def _csv_options(columns, schema):
+    """Returns the keyword arguments of `pandas.read_csv` that read the renamed
+    `columns` of the csv file of the cases, with or without the schema.
+    """
+    options = {"dtype" : dict(COLOMBIA_SCHEMA, **_DATE_CATEGORIES)
+               if schema else None}
+    if columns is None:
+        options["parse_dates"] = ["Fecha de diagnóstico"]
+        return options
+    original = {renamed : column
+                for column, renamed in COLOMBIA_COLUMNS.items()}
+    options["usecols"] = [original.get(column, column) for column in columns]
+    options["parse_dates"] = [column for column in options["usecols"]
+                              if column == "Fecha de diagnóstico"]
+    return options
+
+def _prepare_cases(cases, columns, schema):
+    """Returns the Dataframe `cases` read from the csv file with its columns
+    renamed, and its dates parsed if `schema` is set.
+    """
+    cases = cases.rename(columns=COLOMBIA_COLUMNS)
+    if columns is None:
+        cases = cases.drop(columns="ID de caso")
+    else:
+        cases = cases[list(columns)]
+    if schema:
+        for column in COLOMBIA_DATES:
+            if column in cases:
+                cases[column] = parse_dates(cases[column])
+    return cases
+
+def memory_footprint(path):
+    """Returns the memory, in bytes, used by the cases reported in Colombia
+    with the default dtypes of `pandas` and with `COLOMBIA_SCHEMA`.
+
+    Parameters
+    ----------
+    path : String
+        The path of the csv file published by the Instituto Nacional de Salud
+
+    Returns
+    ----------
+    before : Integer
+        The bytes used by the cases read with the default dtypes
+    after : Integer
+        The bytes used by the cases read with `COLOMBIA_SCHEMA`
+    """
+    before = read_cases_colombia(path, schema=False)\
+        .memory_usage(deep=True).sum()
+    after = read_cases_colombia(path).memory_usage(deep=True).sum()
+    return int(before), int(after)
+
+def read_cases_colombia_cached(path, columns=None):
+    """Returns a Dataframe object `cases` of the cases reported in Colombia,
+    read from a columnar cache of the csv file when available.
+
+    The cache is a Feather file in `CACHE_DIR`, keyed by the sha256 of the csv
+    file and `CACHE_VERSION`, that holds the parsed and typed Dataframe. It is
+    written the first time the csv file is parsed, and is memory-mapped on
+    later reads, so that only the requested columns are read from disk.
+    Without `pyarrow` the csv file is parsed every time.
+
+    Parameters
+    ----------
+    path : String
+        The path of the csv file published by the Instituto Nacional de Salud
+    columns : List, optional
+        The renamed columns to read. Every column is read if none are provided
+
+    Returns
+    ----------
+    cases : Dataframe
+        A Dataframe with a row per reported case
+    """
+    cache = _cache_path(path)
+    if cache is None:
+        return read_cases_colombia(path, columns)
+    if not os.path.exists(cache):
+        cases = read_cases_colombia(path)
+        _write_cache(cases, cache, _cache_name(path))
+        return cases if columns is None else cases[list(columns)]
+    table = feather.read_table(cache, columns=columns, memory_map=True)
+    return _from_arrow(table)
+
+def _cache_name(path):
+    """Returns the name of the caches of the csv file `path`."""
+    return os.path.splitext(os.path.basename(path))[0].lower()
+
+def _cache_path(path):
+    """Returns the path of the Feather cache of the cases of the csv file
+    `path`, or None without `pyarrow`.
+    """
+    if feather is None:
+        return None
+    return os.path.join(CACHE_DIR, _cache_name(path) + "-" + content_hash(path)
+        + "-v" + str(CACHE_VERSION) + ".feather")
+
+def _from_arrow(table):
+    """Returns the cases of an Arrow table or record batch of the Feather
+    cache as a Dataframe, with NaN for the missing strings.
+    """
+    cases = table.to_pandas()
+    text = cases.select_dtypes(include="object").columns
+    cases[text] = cases[text].where(cases[text].notnull(), np.nan)
+    return cases
+
+def _write_cache(cases, cache, name):
+    """Writes `cases` to the Feather file `cache`, replacing any cache of an
+    older version of the same csv file.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temporary = cache + ".tmp"
+    feather.write_feather(cases, temporary, compression="uncompressed")
+    os.replace(temporary, cache)
+    for stale in glob.glob(os.path.join(CACHE_DIR, name + "-*.feather")):
+        if stale != cache:
+            os.remove(stale)
+
+def read_worldwide(path):
+    """Returns a Dataframe object `worldwide` of a global time series.
+
+    Parameters
+    ----------
+    path : String
+        The path of the csv file of the time series
+
+    Returns
+    ----------
+    worldwide : Dataframe
+        A Dataframe with a row per location and a column per day
+    """
+    worldwide = pd.read_csv(path)
+    return worldwide
+
+def read_worldwide_cached(path):
+    """Returns a TimeSeries object `series` of a global time series, read from
+    a memory-mapped cache of the csv file when available.
+
+    The cache is a `.npy` file in `CACHE_DIR` with the values of every location
+    per day, along with a json file with the locations and the first date,
+    both keyed by the sha256 of the csv file and `CACHE_VERSION`. It is written
+    the first time the csv file is parsed, and later reads memory-map the
+    values instead of parsing the csv file.
+
+    Parameters
+    ----------
+    path : String
+        The path of the csv file of the time series
+
+    Returns
+    ----------
+    series : TimeSeries
+        The values of every location per day
+    """
+    name = os.path.splitext(os.path.basename(path))[0].lower()
+    prefix = os.path.join(CACHE_DIR, name + "-" + content_hash(path)
+        + "-v" + str(CACHE_VERSION))
+    if os.path.exists(prefix + ".json"):
+        return TimeSeries.load(prefix)
+    series = TimeSeries.from_frame(read_worldwide(path))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    series.save(prefix)
+    version = re.compile(re.escape(name) + r"-[0-9a-f]{64}-v\d+\.(npy|json)")
+    for stale in os.listdir(CACHE_DIR):
+        if version.fullmatch(stale) and not os.path.join(CACHE_DIR, stale)\
+                .startswith(prefix + "."):
+            os.remove(os.path.join(CACHE_DIR, stale))
+    return series
+
+def default_loader():
+    """Returns a DataLoader object `loader` with the cases in Colombia and the
+    global cases and deaths registered.
+
+    Returns
+    ----------
+    loader : DataLoader
+        A DataLoader with the `cases_colombia`, `cases_worldwide` and
+        `deaths_worldwide` datasets
+    """
+    loader = DataLoader()
+    loader.register("cases_colombia", "Casos.csv", read_cases_colombia_cached,
+        columnar=True, chunks=read_cases_colombia_chunks)
+    loader.register("cases_worldwide", "confirmed-global.csv",
+        read_worldwide_cached)
+    loader.register("deaths_worldwide", "confirmed-global-deaths.csv",
+        read_worldwide_cached)
+    return loader
+
+if __name__ == "__main__":
+    BEFORE, AFTER = memory_footprint("Casos.csv")
+    print("Casos.csv uses {:.1f} MB with the default dtypes and {:.1f} MB "
+          "with the schema".format(BEFORE / 2**20, AFTER / 2**20))
@@ -0,0 +1,160 @@
+"""Dates
+
+Parsing and formatting of the dates of the datasets. The cases in Colombia
+have millions of rows but only a few hundred distinct dates, and the global
+time series a column per day named like "1/22/20", so every distinct string is
+parsed only once, through a lookup table kept for the rest of the process, and
+the rows are mapped to the parsed dates by their position in the table.
+
+The dates of the cases are accepted in the ISO 8601 format of the current
+`Casos.csv`, like "2020-04-08T00:00:00.000", and in the older day first
+format of the Instituto Nacional de Salud, like "08/04/2020 00:00:00". Dates
+can also be mapped to int32 offsets in days from `EPOCH`.
+
+Functions
+----------
+parse_dates : ndarray
+    Returns the dates of an array of strings, parsing every distinct string
+    once
+parse_labels : DatetimeIndex
+    Returns the dates of the column names of the global time series
+date_labels : Index
+    Returns dates formatted as the column names of the global time series
+day_offsets : ndarray
+    Returns dates as int32 offsets in days from `EPOCH`
+from_offsets : ndarray
+    Returns the dates of int32 offsets in days from `EPOCH`
+"""
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+FORMATS = ("%d/%m/%Y %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S",
+           "%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+LABEL_FORMAT = "%m/%d/%y"
+EPOCH = np.datetime64("1970-01-01", "D")
+MISSING_DAY = np.iinfo(np.int32).min
+
+_parsed = {}
+_labels = {}
+
+def parse_dates(values, formats=FORMATS):
+    """Returns an ndarray object `dates` with the dates of the strings
+    provided, parsing every distinct string only once.
+
+    Parameters
+    ----------
+    values : Series, Index or ndarray
+        The strings to parse, possibly categorical, with missing values for
+        missing dates
+    formats : Tuple, optional
+        The formats the strings are tried in, in order
+
+    Returns
+    ----------
+    dates : ndarray
+        An array of datetime64[ns], with NaT for the missing values
+
+    Raises
+    ----------
+    ValueError
+        If a string is in none of the formats
+    """
+    codes, uniques = pd.factorize(values)
+    table = _parsed.setdefault(formats, {})
+    parsed = np.empty(len(uniques) + 1, dtype="datetime64[ns]")
+    parsed[-1] = np.datetime64("NaT")
+    for position, text in enumerate(uniques):
+        if text not in table:
+            table[text] = _parse(text, formats)
+        parsed[position] = table[text]
+    dates = parsed[codes]
+    return dates
+
+def parse_labels(labels):
+    """Returns a DatetimeIndex object with the dates of the column names of
+    the global time series provided, like "1/22/20".
+
+    Parameters
+    ----------
+    labels : List
+        The column names of the days
+
+    Returns
+    ----------
+    DatetimeIndex
+    """
+    return pd.DatetimeIndex(parse_dates(pd.Index(labels, dtype=object),
+                                        (LABEL_FORMAT,)))
+
+def date_labels(dates):
+    """Returns an Index object with the dates provided formatted as the column
+    names of the global time series, like "1/22/20", formatting every distinct
+    date only once.
+
+    Parameters
+    ----------
+    dates : DatetimeIndex
+        The dates to format
+
+    Returns
+    ----------
+    Index
+    """
+    labels = []
+    for date in dates:
+        if date not in _labels:
+            _labels[date] = "{}/{}/{:02d}".format(date.month, date.day,
+                                                  date.year % 100)
+        labels.append(_labels[date])
+    return pd.Index(labels, dtype=object)
+
+def day_offsets(dates):
+    """Returns an ndarray object `offsets` with the number of days from
+    `EPOCH` to every date provided.
+
+    Parameters
+    ----------
+    dates : Series, DatetimeIndex or ndarray
+        The dates, with NaT for missing dates
+
+    Returns
+    ----------
+    offsets : ndarray
+        An array of int32, with `MISSING_DAY` for the missing dates
+    """
+    days = np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]")
+    offsets = np.where(np.isnat(days), MISSING_DAY,
+                       (days - EPOCH).astype("int64")).astype(np.int32)
+    return offsets
+
+def from_offsets(offsets):
+    """Returns an ndarray object `dates` with the dates of the offsets in days
+    from `EPOCH` provided.
+
+    Parameters
+    ----------
+    offsets : ndarray
+        An array of int32 offsets, with `MISSING_DAY` for missing dates
+
+    Returns
+    ----------
+    dates : ndarray
+        An array of datetime64[ns], with NaT for the missing dates
+    """
+    dates = (EPOCH + offsets.astype("timedelta64[D]")).astype("datetime64[ns]")
+    dates[offsets == MISSING_DAY] = np.datetime64("NaT")
+    return dates
+
+def _parse(text, formats):
+    """Returns the datetime64 of the string `text` in the first of `formats`
+    it matches.
+    """
+    for date_format in formats:
+        try:
+            return np.datetime64(datetime.strptime(text, date_format), "ns")
+        except (TypeError, ValueError):
+            continue
+    raise ValueError("Date {!r} does not match any of the formats {}".format(
+        text, ", ".join(formats)))
@@ -4,9 +4,40 @@ This script downloads – using the `requests` module – the global and Colombi
 cases and deaths found in specific urls from the World Health Organization and
 the Instituto Nacional de Salud, and writes that data to csv files within the
 same directory.
+
+The files are downloaded concurrently over a shared connection pool, and each
+body is streamed to disk through a partial file that replaces the csv file
+once it is complete and has the expected size. A dropped connection is retried
+with an exponential backoff, and the partial file is kept between runs and
+resumed with HTTP Range requests, so a large download does not start over. The
+ETag and Last-Modified headers of every download are kept in a state file, so
+that a source that has not changed since the previous download is skipped.
+
+Classes
+----------
+DownloadError
+    The downloaded file does not have the expected size or checksum
+
+Functions
+----------
+make_session : Session
+    Returns a Session object with a connection pool shared by the downloads
+download : (Boolean, Dictionary)
+    Downloads a url to a file, unless it has not changed since the previous
+    download
+download_all : Dictionary
+    Downloads every source concurrently
 """
 
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from writers import atomic_output
 
 GLOBAL_CASES_URL = "https://raw.githubusercontent.com/CSSEGISandData/"\
                  + "COVID-19/master/csse_covid_19_data/"\
@@ -19,10 +50,296 @@ GLOBAL_DEATHS_URL = "https://raw.githubusercontent.com/CSSEGISandData/"\
 COLOMBIA_CASES_URL = "https://www.datos.gov.co/api/views/gt2j-8ykr/"\
                    + "rows.csv?accessType=DOWNLOAD"
 
-global_cases = requests.get(GLOBAL_CASES_URL, allow_redirects=True)
-global_deaths = requests.get(GLOBAL_DEATHS_URL, allow_redirects=True)
-colombia_cases = requests.get(COLOMBIA_CASES_URL, allow_redirects=True)
+SOURCES = {
+    "confirmed-global.csv" : GLOBAL_CASES_URL,
+    "confirmed-global-deaths.csv" : GLOBAL_DEATHS_URL,
+    "Casos.csv" : COLOMBIA_CASES_URL
+}
+
+STATE_FILE = ".cache/downloads.json"
+CHUNK_SIZE = 1 << 20
+TIMEOUT = 60
+RETRIES = 5
+BACKOFF = 1.0
+PART_SUFFIX = ".part"
+
+LOGGER = logging.getLogger(__name__)
+
+class DownloadError(requests.RequestException):
+    """The downloaded file does not have the expected size or checksum."""
+
+class _Truncated(DownloadError):
+    """The downloaded file is shorter than expected, and can be resumed."""
+
+def make_session(pool_size=len(SOURCES)):
+    """Returns a Session object `session` with a connection pool shared by the
+    downloads.
+
+    Parameters
+    ----------
+    pool_size : Integer, optional
+        The maximum number of connections kept open to every host
+
+    Returns
+    ----------
+    session : Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def download(session, url, path, validators=None, checksum=None,
+             retries=RETRIES, backoff=BACKOFF):
+    """Downloads `url` to the file `path`, unless the server reports that it
+    has not changed since the download that returned `validators`.
+
+    The body is streamed in chunks to the partial file `path` + ".part", which
+    replaces `path` only once the whole body has been written and verified. A
+    dropped connection is retried after an exponential backoff, and both the
+    retries and the next run continue from the end of the partial file with an
+    HTTP Range request when the server supports it. The validators of the
+    partial file are kept next to it, so it is only resumed while it is still
+    the same version of `url`.
+
+    Parameters
+    ----------
+    session : Session
+        The session whose connection pool is used
+    url : String
+        The url to download
+    path : String
+        The path of the file the body is written to
+    validators : Dictionary, optional
+        The ETag and Last-Modified headers of the previous download
+    checksum : String, optional
+        The expected sha256 of the file, in hexadecimal
+    retries : Integer, optional
+        The number of times a failed transfer is retried
+    backoff : Float, optional
+        The seconds waited before the first retry, doubled on every other one
+
+    Returns
+    ----------
+    changed : Boolean
+        Whether the file was downloaded
+    validators : Dictionary
+        The ETag and Last-Modified headers of the current version of `url`,
+        and the sha256 of the file
+    """
+    validators = validators or {}
+    partial = path + PART_SUFFIX
+    start = time.perf_counter()
+    progress = {"received" : 0}
+    for attempt in range(retries + 1):
+        try:
+            complete = _transfer(session, url, partial,
+                validators if os.path.exists(path) else {}, progress)
+            if complete is not None:
+                digest = _verify(partial, complete["size"], checksum)
+            break
+        except requests.RequestException as error:
+            if attempt == retries or not _retryable(error):
+                raise
+            delay = backoff * 2 ** attempt
+            LOGGER.warning("%s: %s, retrying in %.0f s from byte %d", path,
+                error, delay, _partial_size(partial))
+            time.sleep(delay)
+    if complete is None:
+        return False, validators
+    mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    os.chmod(partial, mode)
+    os.replace(partial, path)
+    _discard(partial)
+    seconds = time.perf_counter() - start
+    received = progress["received"]
+    if progress.get("resumed"):
+        note = ", resumed from byte {}".format(progress["resumed"])
+    elif progress.get("restarted"):
+        note = ", restarted as the server ignored the Range request"
+    else:
+        note = ""
+    LOGGER.info("%s: %.1f MB in %.1f s (%.1f MB/s)%s", path,
+        received / 2 ** 20, seconds,
+        received / 2 ** 20 / seconds if seconds else 0.0, note)
+    validators = {header : complete[header]
+                  for header in ("ETag", "Last-Modified") if header in complete}
+    validators["sha256"] = digest
+    return True, validators
+
+def download_all(sources=None, state_file=STATE_FILE, workers=None,
+                 checksums=None):
+    """Downloads every source concurrently, skipping the ones that have not
+    changed since their previous download.
+
+    Parameters
+    ----------
+    sources : Dictionary, optional
+        The urls to download, keyed by the path of the file they are written
+        to. `SOURCES` is downloaded if none are provided
+    state_file : String, optional
+        The path of the json file with the validators of every download
+    workers : Integer, optional
+        The number of concurrent downloads. Every source is downloaded at once
+        if none is provided
+    checksums : Dictionary, optional
+        The expected sha256 of some of the files, keyed by their path
+
+    Returns
+    ----------
+    changed : Dictionary
+        Whether each file was downloaded, keyed by its path
+    """
+    sources = SOURCES if sources is None else sources
+    state = {}
+    if os.path.exists(state_file):
+        with open(state_file) as current:
+            state = json.load(current)
+    checksums = checksums or {}
+    workers = workers or len(sources)
+    changed = {}
+    errors = []
+    with make_session(workers) as session, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {path : executor.submit(download, session, url, path,
+                                          state.get(path), checksums.get(path))
+                   for path, url in sources.items()}
+        for path, future in futures.items():
+            try:
+                changed[path], state[path] = future.result()
+            except requests.RequestException as error:
+                LOGGER.error("%s: %s", path, error)
+                errors.append(error)
+                continue
+            LOGGER.info("%s: %s", path,
+                "downloaded" if changed[path] else "not modified")
+    folder = os.path.dirname(state_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with atomic_output(state_file) as output:
+        output.write(json.dumps(state, indent=2).encode("utf-8"))
+    if errors:
+        raise errors[0]
+    return changed
+
+def _transfer(session, url, partial, validators, progress):
+    """Streams `url` to the partial file `partial`, resuming it with a Range
+    request if it has the validators of its version, and returns the headers
+    and expected size of the file, or None if `url` has not changed.
+
+    The bytes received are added to the "received" entry of `progress`. The
+    offset of the first request the server answered with the partial content
+    is kept in its "resumed" entry, and its "restarted" entry is set when the
+    server answered a Range request with the whole file instead.
+    """
+    offset = _partial_size(partial)
+    meta = {}
+    if offset and os.path.exists(partial + ".json"):
+        with open(partial + ".json") as current:
+            meta = json.load(current)
+    validator = meta.get("ETag", "")
+    if not validator or validator.startswith("W/"):
+        validator = meta.get("Last-Modified")
+    headers = {"Accept-Encoding" : "identity"}
+    if offset and validator:
+        headers["Range"] = "bytes={}-".format(offset)
+        headers["If-Range"] = validator
+    else:
+        _discard(partial)
+        offset = 0
+        if "ETag" in validators:
+            headers["If-None-Match"] = validators["ETag"]
+        if "Last-Modified" in validators:
+            headers["If-Modified-Since"] = validators["Last-Modified"]
+    with session.get(url, headers=headers, stream=True, allow_redirects=True,
+                     timeout=TIMEOUT) as response:
+        if response.status_code == 304 and not offset:
+            return None
+        if response.status_code == 416 and offset:
+            if _content_range(response)[1] == offset:
+                return dict(meta, size=offset)
+            _discard(partial)
+            return _transfer(session, url, partial, validators, progress)
+        response.raise_for_status()
+        if response.status_code == 206:
+            first, size = _content_range(response)
+            if first != offset:
+                _discard(partial)
+                return _transfer(session, url, partial, validators, progress)
+            progress.setdefault("resumed", offset)
+            mode = "ab"
+        else:
+            length = response.headers.get("Content-Length")
+            meta = {header : response.headers[header]
+                    for header in ("ETag", "Last-Modified")
+                    if header in response.headers}
+            size = int(length) if length is not None else None
+            with open(partial + ".json", "w") as current:
+                json.dump(meta, current)
+            mode = "wb"
+            if offset:
+                progress.pop("resumed", None)
+                progress["restarted"] = True
+        if size is not None:
+            meta["size"] = size
+        with open(partial, mode) as output:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                output.write(chunk)
+                progress["received"] += len(chunk)
+    return meta
+
+def _verify(partial, size, checksum):
+    """Checks that the partial file `partial` has `size` bytes and the sha256
+    `checksum`, if they are not None, and returns its sha256.
+    """
+    actual = _partial_size(partial)
+    if size is not None and actual < size:
+        raise _Truncated("{}: {} of {} bytes".format(partial, actual, size))
+    digest = hashlib.sha256()
+    with open(partial, "rb") as data:
+        for block in iter(lambda: data.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    digest = digest.hexdigest()
+    if size is not None and actual > size:
+        _discard(partial)
+        raise DownloadError("{}: {} bytes instead of {}".format(partial,
+            actual, size))
+    if checksum is not None and digest != checksum.lower():
+        _discard(partial)
+        raise DownloadError("{}: sha256 {} instead of {}".format(partial,
+            digest, checksum))
+    return digest
+
+def _retryable(error):
+    """Whether the transfer that raised `error` is worth retrying."""
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None \
+            else None
+        return status == 429 or (status or 0) >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout,
+        requests.exceptions.ChunkedEncodingError, _Truncated))
+
+def _content_range(response):
+    """Returns the first byte and the total size in the Content-Range header
+    of `response`, with None for the parts it does not have.
+    """
+    unit, _, span = response.headers.get("Content-Range", "").partition(" ")
+    span, _, total = span.partition("/")
+    first = span.partition("-")[0]
+    return (int(first) if first.isdigit() else None,
+            int(total) if total.isdigit() else None)
+
+def _partial_size(partial):
+    """Returns the size of the partial file `partial`, or 0 if it is missing."""
+    return os.path.getsize(partial) if os.path.exists(partial) else 0
+
+def _discard(partial):
+    """Removes the partial file `partial` and its validators."""
+    for name in (partial, partial + ".json"):
+        if os.path.exists(name):
+            os.remove(name)
 
-open("confirmed-global.csv", "wb").write(global_cases.content)
-open("confirmed-global-deaths.csv", "wb").write(global_deaths.content)
-open("Casos.csv", "wb").write(colombia_cases.content)
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    download_all()
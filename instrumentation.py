@@ -0,0 +1,358 @@
+"""Instrumentation
+
+Opt-in instrumentation of the stages of a run of `corona.py`: every call to a
+public function of `corona_utils`, every dataset parsed or aggregated by the
+`DataLoader`, and every write of csv files. For each stage the wall time, the
+CPU time, the number of rows it produced, parsed or wrote, and the memory used
+are recorded, and the whole run is saved as a json report.
+
+One stage can also be profiled, either with `cProfile`, or by sampling the
+stacks of the thread that runs it into a file of folded stacks, the input of
+flame graph tools like `flamegraph.pl` or speedscope.
+
+Nothing is recorded, and stages cost a single check, until `recorder` is
+started.
+
+Classes
+----------
+Recorder
+    Records the stages of a run and saves them as a json report
+Stage
+    The measurements of a stage of a run
+
+Functions
+----------
+instrumented : Function
+    Decorates a function so that each call to it is recorded as a stage
+rss : Integer
+    Returns the resident memory of the process in bytes
+peak_rss : Integer
+    Returns the peak resident memory of the process in bytes
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime, timezone
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+class Stage:
+    """The measurements of a stage of a run.
+
+    Parameters
+    ----------
+    name : String
+        The name of the stage
+    parent : String
+        The name of the stage it runs within, or None
+    start : Float
+        The seconds from the start of the run to the start of the stage
+    """
+
+    def __init__(self, name, parent, start):
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.rows = None
+        self.peak_traced_bytes = None
+        self.rss_bytes = None
+
+    def as_dict(self):
+        """Returns a Dictionary `stage` with the measurements of the stage.
+
+        Returns
+        ----------
+        stage : Dictionary
+        """
+        stage = dict(vars(self))
+        return stage
+
+class Recorder:
+    """Records the stages of a run and saves them as a json report.
+
+    Stages are only recorded in the thread that starts the recorder, and a
+    stage that starts within another one is recorded with it as its parent.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = []
+        self.trace_memory = False
+        self.profile_stage = None
+        self.profile_path = None
+        self.__thread = None
+        self.__stack = []
+        self.__started = None
+        self.__profiled = False
+
+    def start(self, trace_memory=False, profile_stage=None,
+              profile_path=None):
+        """Starts recording stages.
+
+        Parameters
+        ----------
+        trace_memory : Boolean, optional
+            Whether the peak memory allocated within every stage is traced
+            with `tracemalloc`, which makes the run noticeably slower
+        profile_stage : String, optional
+            The name of the stage to profile. Only its first run is profiled
+        profile_path : String, optional
+            The file the profile is written to. A file ending in ".folded"
+            gets sampled stacks in the folded format, and any other file gets
+            the statistics of `cProfile`
+
+        Returns
+        ----------
+        None
+        """
+        self.enabled = True
+        self.stages = []
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path
+        self.__thread = threading.get_ident()
+        self.__stack = []
+        self.__profiled = False
+        self.__started = (datetime.now(timezone.utc), time.perf_counter(),
+                          time.process_time())
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Returns a context manager that records the code within it as the
+        stage `name`.
+
+        Parameters
+        ----------
+        name : String
+            The name of the stage
+        rows : Integer, optional
+            The number of rows of the stage, which can also be set on the
+            Stage object returned
+
+        Returns
+        ----------
+        stage : Stage
+            The measurements of the stage, or None if nothing is recorded
+        """
+        if not self.enabled or threading.get_ident() != self.__thread:
+            yield None
+            return
+        stage = Stage(name, self.__stack[-1][0].name if self.__stack else None,
+                      time.perf_counter() - self.__started[1])
+        stage.rows = rows
+        self.stages.append(stage)
+        if self.trace_memory:
+            if self.__stack:
+                self.__stack[-1][1] = max(self.__stack[-1][1],
+                                          tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.__stack.append([stage, 0])
+        profiler = self.__profiler(name)
+        start = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield stage
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                if isinstance(profiler, _StackSampler):
+                    profiler.dump(self.profile_path)
+                else:
+                    profiler.dump_stats(self.profile_path)
+            stage.wall_seconds = time.perf_counter() - start
+            stage.cpu_seconds = time.process_time() - cpu
+            stage.rss_bytes = rss()
+            _, peak = self.__stack.pop()
+            if self.trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                stage.peak_traced_bytes = peak
+                if self.__stack:
+                    self.__stack[-1][1] = max(self.__stack[-1][1], peak)
+                tracemalloc.reset_peak()
+
+    def report(self):
+        """Returns a Dictionary `report` with the measurements of the run and
+        of every stage recorded, in the order they started.
+
+        Returns
+        ----------
+        report : Dictionary
+        """
+        started, wall, cpu = self.__started
+        report = {
+            "started" : started.isoformat(),
+            "wall_seconds" : time.perf_counter() - wall,
+            "cpu_seconds" : time.process_time() - cpu,
+            "peak_rss_bytes" : peak_rss(),
+            "trace_memory" : self.trace_memory,
+            "profile" : {"stage" : self.profile_stage,
+                         "path" : self.profile_path},
+            "stages" : [stage.as_dict() for stage in self.stages]
+        }
+        return report
+
+    def save(self, path):
+        """Writes the report of the run to the json file `path`.
+
+        Parameters
+        ----------
+        path : String
+            The path of the json file
+
+        Returns
+        ----------
+        None
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, "w") as report:
+            json.dump(self.report(), report, indent=2)
+        os.replace(temporary, path)
+
+    def __profiler(self, name):
+        """Returns a profiler for the stage `name` if it is the first run of
+        the stage to profile, or None.
+        """
+        if name != self.profile_stage or self.profile_path is None \
+                or self.__profiled:
+            return None
+        self.__profiled = True
+        if self.profile_path.endswith(".folded"):
+            return _StackSampler(threading.get_ident())
+        return cProfile.Profile()
+
+recorder = Recorder()
+
+def instrumented(function):
+    """Decorates the function `function` so that each call to it is recorded
+    by `recorder` as a stage named after it, with the number of rows of the
+    value it returns.
+
+    Parameters
+    ----------
+    function : Function
+        The function to decorate
+
+    Returns
+    ----------
+    wrapper : Function
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not recorder.enabled:
+            return function(*args, **kwargs)
+        with recorder.stage(function.__name__) as stage:
+            result = function(*args, **kwargs)
+            if stage is not None:
+                stage.rows = _rows(result)
+        return result
+    return wrapper
+
+class _StackSampler:
+    """Samples the stack of a thread at a fixed interval, with the interface of
+    `cProfile.Profile` used by Recorder.
+    """
+
+    def __init__(self, thread, interval=0.001):
+        self.thread = thread
+        self.interval = interval
+        self.stacks = Counter()
+        self.__running = threading.Event()
+        self.__sampler = None
+
+    def enable(self):
+        """Starts sampling in a background thread."""
+        self.__running.set()
+        self.__sampler = threading.Thread(target=self.__sample, daemon=True)
+        self.__sampler.start()
+
+    def disable(self):
+        """Stops sampling."""
+        self.__running.clear()
+        self.__sampler.join()
+
+    def dump(self, path):
+        """Writes a line per sampled stack, with its frames from the outermost
+        to the innermost separated by semicolons, and its number of samples.
+        """
+        lines = ["{} {}\n".format(stack, count)
+                 for stack, count in self.stacks.most_common()]
+        with open(path, "w") as folded:
+            folded.writelines(lines)
+
+    def __sample(self):
+        while self.__running.is_set():
+            frame = sys._current_frames().get(self.thread)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append("{}:{}".format(
+                    os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+            time.sleep(self.interval)
+
+def _rows(result):
+    """Returns the number of rows of a value returned by a stage, summed over
+    the items of a tuple, or None if it has no length.
+    """
+    if isinstance(result, tuple):
+        counts = [_rows(item) for item in result]
+        return sum(counts) if None not in counts else None
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+def rss():
+    """Returns the resident memory of the current process in bytes.
+
+    Returns
+    ----------
+    Integer
+        The resident memory, or None where it is not available
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def peak_rss(children=False):
+    """Returns the peak resident memory of the current process in bytes.
+
+    Parameters
+    ----------
+    children : Boolean, optional
+        Whether the peak of the largest of its child processes is returned
+        instead if it is higher
+
+    Returns
+    ----------
+    Integer
+        The peak resident memory, or None where it is not available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak = max(peak,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak if sys.platform == "darwin" else peak * 1024
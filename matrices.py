@@ -0,0 +1,171 @@
+"""Matrices
+
+Values per day of a set of entities, such as cities or departments, as a dense
+(entity x day) array of integers on a calendar shared by every entity, with an
+index of the row of every entity. The days without values are filled with
+zeros once, when the matrix is built, so the value of any entity on any day is
+an array lookup, and the cumulative values of every entity are a single
+`cumsum` along the days.
+
+Classes
+----------
+DailyMatrix
+    The values per day of every entity, as a dense array of integers
+"""
+
+import numpy as np
+import pandas as pd
+
+class DailyMatrix:
+    """The values per day of every entity, as a dense (entity x day) array of
+    int64 with a column for every day of a calendar.
+
+    Parameters
+    ----------
+    values : ndarray
+        A two dimensional array with a row per entity and a column per day
+    entities : List
+        The entity of every row of `values`
+    start : Timestamp
+        The date of the first column of `values`
+    """
+
+    def __init__(self, values, entities, start):
+        self.values = values
+        self.entities = list(entities)
+        self.start = pd.Timestamp(start)
+        self.rows = {entity : row for row, entity in enumerate(self.entities)}
+
+    @classmethod
+    def from_series(cls, series, level, entities=None, dates=None):
+        """Returns a DailyMatrix object `matrix` with the values of a Series
+        indexed by entity and date, and zeros on the days without a value.
+
+        Parameters
+        ----------
+        series : Series
+            A Series of integers with a unique index of the levels `level`
+            and "date"
+        level : String
+            The level of the index with the entities
+        entities : List, optional
+            The entities of the rows, in order. The entities of `series`,
+            sorted, are used if none are provided
+        dates : DatetimeIndex, optional
+            The calendar of consecutive days of the columns, which must include
+            every date of `series`. Every day from the first to the last date
+            of `series` is used if none is provided
+
+        Returns
+        ----------
+        matrix : DailyMatrix
+        """
+        keys = series.index.get_level_values(level)
+        days = series.index.get_level_values("date")
+        if entities is None:
+            entities = sorted(keys.unique())
+        if dates is None:
+            dates = pd.date_range(days.min(), days.max()) if len(days) \
+                else pd.DatetimeIndex([])
+        values = np.zeros((len(entities), len(dates)), dtype="int64")
+        if len(series):
+            rows = pd.Index(entities).get_indexer(keys)
+            columns = (days - dates[0]).days.to_numpy()
+            values[rows, columns] = series.to_numpy(dtype="int64")
+        start = dates[0] if len(dates) else pd.NaT
+        matrix = cls(values, entities, start)
+        return matrix
+
+    @property
+    def dates(self):
+        """DatetimeIndex: the date of every column of the values."""
+        return pd.date_range(self.start, periods=self.values.shape[1],
+                             name="date")
+
+    def row(self, entity):
+        """Returns an ndarray object with the values of every day of the entity
+        provided, which is a view of the values.
+
+        Parameters
+        ----------
+        entity : String
+            The entity
+
+        Returns
+        ----------
+        ndarray
+        """
+        return self.values[self.rows[entity]]
+
+    def at(self, entity, date):
+        """Returns the value of the entity provided on the date provided.
+
+        Parameters
+        ----------
+        entity : String
+            The entity
+        date : Timestamp
+            The date, which must be in the calendar of the matrix
+
+        Returns
+        ----------
+        Integer
+        """
+        return int(self.values[self.rows[entity],
+                               (pd.Timestamp(date) - self.start).days])
+
+    def cumsum(self):
+        """Returns a DailyMatrix object with the cumulative values of every
+        entity.
+
+        Returns
+        ----------
+        DailyMatrix
+        """
+        return DailyMatrix(np.cumsum(self.values, axis=1), self.entities,
+                           self.start)
+
+    def __add__(self, other):
+        return DailyMatrix(self.values + other.values, self.entities,
+                           self.start)
+
+    def series(self, entity, days=None):
+        """Returns a Series object `series` with the values of the entity
+        provided, indexed by date.
+
+        Parameters
+        ----------
+        entity : String
+            The entity
+        days : ndarray, optional
+            A boolean mask of the days included. Every day is included if none
+            is provided
+
+        Returns
+        ----------
+        series : Series
+        """
+        values = self.row(entity)
+        dates = self.dates
+        if days is not None:
+            values = values[days]
+            dates = dates[days]
+        series = pd.Series(values, index=dates, name=entity)
+        return series
+
+    def to_frame(self, name=None):
+        """Returns a Dataframe object `frame` with a row per entity and a
+        column per day.
+
+        Parameters
+        ----------
+        name : String, optional
+            The name of the index of the entities
+
+        Returns
+        ----------
+        frame : Dataframe
+        """
+        frame = pd.DataFrame(self.values, columns=self.dates,
+                             index=pd.Index(self.entities, name=name))
+        return frame
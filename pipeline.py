@@ -0,0 +1,477 @@
+"""Pipeline
+
+The computations of `corona.py` declared as a graph of named tasks, each with
+the files it reads and the files it writes. A task depends on the tasks that
+write the files it reads, and tasks without a dependency between them are run
+in parallel over a pool of processes.
+
+A task only runs when one of its outputs is missing, or when the content of
+one of its inputs has changed since its last successful run, unless it is
+forced. The sha256 of the inputs of every task are kept in a state file for
+that purpose, along with those of the modules and configuration the task
+depends on, so that a change of the code or of `variables` also runs it. The files written by the tasks of a pool are recorded in the
+manifest of `writers` of the calling process once each task has finished.
+
+Classes
+----------
+Task
+    A named computation of `corona_utils`, with its input and output files
+Pipeline
+    A graph of tasks that runs the tasks requested and those they depend on
+
+Functions
+----------
+configure : None
+    Sets the options of the datasets and the writer of `corona_utils`
+default_pipeline : Pipeline
+    Returns the Pipeline of every csv file written by `corona.py`
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+import logging
+import os
+import time
+import corona_utils
+from data_loader import content_hash
+from refresh import RefreshState
+import writers
+from writers import Manifest, write_if_changed
+
+STATE_FILE = ".cache/pipeline.json"
+DATA_FOLDER = "../covid-in-colombia/data/"
+SOURCE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+COMMON_CODE = ["pipeline.py", "corona_utils.py", "data_loader.py", "dates.py",
+               "writers.py"]
+WORLDWIDE_CODE = ["countries.py", "timeseries.py", "variables/countries.py"]
+COLOMBIA_CODE = ["aggregates.py", "matrices.py"]
+METRICS_CODE = ["analytics.py", "variables/countries.py"]
+
+LOGGER = logging.getLogger(__name__)
+
+class Task:
+    """A named computation of `corona_utils`, with the files it reads and the
+    files it writes.
+
+    Parameters
+    ----------
+    name : String
+        The name of the task, which is also the name of the function of
+        `corona_utils` it calls
+    inputs : List
+        The paths of the files the task reads
+    outputs : List
+        The paths of the files the task writes
+    writes : Boolean, optional
+        Whether the function writes its outputs itself. Otherwise the value it
+        returns, or each value of the tuple it returns, is written to the csv
+        file of the same position in `outputs`
+    default : Boolean, optional
+        Whether the task runs when no task is requested
+    code : List, optional
+        The paths of the modules and configuration files the task depends on,
+        whose changes also make it run again
+    """
+
+    def __init__(self, name, inputs, outputs, writes=False, default=True,
+                 code=()):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.writes = writes
+        self.default = default
+        self.code = list(code)
+
+    def run(self):
+        """Calls the function of the task and writes the values it returns.
+
+        Returns
+        ----------
+        updates : (Dictionary, List)
+            The entries of the files written and the files changed, drained
+            from the manifest of `writers`, or None if it is not set
+        """
+        result = getattr(corona_utils, self.name)()
+        if not self.writes:
+            values = result if isinstance(result, tuple) else (result,)
+            for value, path in zip(values, self.outputs):
+                write_if_changed(value, path)
+        if writers.manifest is not None:
+            return writers.manifest.drain()
+        return None
+
+class Pipeline:
+    """A graph of tasks that runs the tasks requested, along with the tasks
+    they depend on, in parallel where they do not depend on each other.
+
+    Parameters
+    ----------
+    tasks : List
+        The tasks of the graph. No two tasks can write the same file
+    state_file : String, optional
+        The path of the json file with the sha256 of the inputs of every task
+        in its last successful run
+    """
+
+    def __init__(self, tasks, state_file=STATE_FILE):
+        self.tasks = {task.name : task for task in tasks}
+        self.state_file = state_file
+        producers = {}
+        for task in tasks:
+            for output in task.outputs:
+                if output in producers:
+                    raise ValueError("{} is written by both {} and {}".format(
+                        output, producers[output], task.name))
+                producers[output] = task.name
+        self.dependencies = {task.name : sorted({producers[path]
+                                                 for path in task.inputs
+                                                 if path in producers})
+                             for task in tasks}
+        self.order = self.__sort()
+
+    def select(self, targets=None):
+        """Returns a list `selected` with the names of the tasks requested and
+        of the tasks they depend on, in an order where every task comes after
+        its dependencies.
+
+        Parameters
+        ----------
+        targets : List, optional
+            The names of the tasks requested. The default tasks are requested
+            if none are provided
+
+        Returns
+        ----------
+        selected : List
+        """
+        if not targets:
+            targets = [name for name in self.order
+                       if self.tasks[name].default]
+        unknown = [name for name in targets if name not in self.tasks]
+        if unknown:
+            raise KeyError("Unknown tasks: " + ", ".join(unknown))
+        selected = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.dependencies[name])
+        selected = [name for name in self.order if name in selected]
+        return selected
+
+    def run(self, targets=None, jobs=None, force=False, initializer=None,
+            initargs=(), prepare=None):
+        """Runs the tasks requested, and the tasks they depend on, whose
+        outputs are missing or whose inputs have changed since their last
+        successful run, along with the tasks that depend on those. An output
+        folder without files counts as missing.
+
+        A task is run once every task it depends on has finished, and the
+        tasks ready at the same time run in parallel over a pool of processes.
+        A task whose dependency failed is not run.
+
+        Parameters
+        ----------
+        targets : List, optional
+            The names of the tasks requested. The default tasks are requested
+            if none are provided
+        jobs : Integer, optional
+            The number of processes. The default of `concurrent.futures` is
+            used if none is provided, and the tasks are run in the calling
+            process if it is 1
+        force : Boolean, optional
+            Whether the tasks are run even if their inputs have not changed
+        initializer : Function, optional
+            A function called at the start of every process of the pool
+        initargs : Tuple, optional
+            The arguments passed on to `initializer`
+        prepare : Function, optional
+            A function called with the tasks about to run before the pool is
+            started, whose result is passed on to `initializer` after
+            `initargs`
+
+        Returns
+        ----------
+        statuses : Dictionary
+            Whether each task "ran", was "unchanged", "failed", or was
+            "blocked" by a failed dependency, keyed by its name
+        """
+        selected = self.select(targets)
+        state = self.__load()
+        stale = self.__stale(selected, state, force)
+        statuses = {}
+        errors = []
+        pending = list(selected)
+        running = {}
+        executor = None
+        if jobs != 1 and stale:
+            if prepare is not None:
+                initargs = tuple(initargs) \
+                    + (prepare([self.tasks[name] for name in stale]),)
+            executor = ProcessPoolExecutor(max_workers=jobs,
+                initializer=initializer, initargs=initargs)
+        try:
+            while pending or running:
+                for name in list(pending):
+                    dependencies = [statuses.get(dependency)
+                                    for dependency in self.dependencies[name]
+                                    if dependency in selected]
+                    if None in dependencies:
+                        continue
+                    pending.remove(name)
+                    task = self.tasks[name]
+                    if "failed" in dependencies or "blocked" in dependencies:
+                        statuses[name] = "blocked"
+                        LOGGER.error("%s: blocked by a failed dependency",
+                            name)
+                        continue
+                    if name not in stale:
+                        statuses[name] = "unchanged"
+                        LOGGER.info("%s: unchanged", name)
+                        continue
+                    digests = self.__digests(task, state)
+                    start = time.perf_counter()
+                    if executor is None:
+                        try:
+                            updates = task.run()
+                            error = None
+                        except Exception as exception:
+                            updates, error = None, exception
+                        statuses[name] = self.__finish(name, digests, start,
+                            error, state, errors, updates)
+                    else:
+                        running[executor.submit(task.run)] = \
+                            (name, digests, start)
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name, digests, start = running.pop(future)
+                        error = future.exception()
+                        updates = None if error is not None \
+                            else future.result()
+                        statuses[name] = self.__finish(name, digests, start,
+                            error, state, errors, updates)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self.__save(state)
+        if errors:
+            raise errors[0]
+        return statuses
+
+    def __finish(self, name, digests, start, error, state, errors,
+                 updates=None):
+        """Records the outcome of a task, and the files it wrote in the
+        manifest of `writers`, and returns its status.
+        """
+        if updates is not None and writers.manifest is not None:
+            writers.manifest.merge(updates)
+        if error is not None:
+            LOGGER.error("%s: failed", name, exc_info=error)
+            errors.append(error)
+            state["tasks"].pop(name, None)
+            return "failed"
+        LOGGER.info("%s: ran in %.2f s", name, time.perf_counter() - start)
+        state["tasks"][name] = digests
+        return "ran"
+
+    def __stale(self, selected, state, force):
+        """Returns the names of the tasks of `selected` that have to run: those
+        forced, those whose outputs are missing or whose inputs have changed,
+        and those that depend on a task that has to run.
+        """
+        stale = []
+        for name in selected:
+            task = self.tasks[name]
+            digests = self.__digests(task, state)
+            if force or state["tasks"].get(name) != digests \
+                    or not all(_exists(path) for path in task.outputs) \
+                    or any(dependency in stale
+                           for dependency in self.dependencies[name]):
+                stale.append(name)
+        return stale
+
+    def __sort(self):
+        """Returns the names of the tasks in an order where every task comes
+        after its dependencies, keeping the declared order otherwise.
+        """
+        order = []
+        visiting = set()
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError("The tasks depend on each other in a cycle "
+                                 "through " + name)
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+        for name in self.tasks:
+            visit(name)
+        return order
+
+    def __digests(self, task, state):
+        """Returns the sha256 of the inputs and the code of `task`, keyed by
+        path.
+        """
+        return {path : self.__digest(path, state)
+                for path in task.inputs + task.code}
+
+    def __digest(self, path, state):
+        """Returns the sha256 of the file `path`, or None if it is missing.
+
+        The digest of every file is kept in `state` along with its
+        modification time and size, and only computed again when those
+        change.
+        """
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        signature = [stat.st_mtime_ns, stat.st_size]
+        entry = state["files"].get(path)
+        if entry is None or entry["signature"] != signature:
+            entry = {"signature" : signature, "sha256" : content_hash(path)}
+            state["files"][path] = entry
+        return entry["sha256"]
+
+    def __load(self):
+        """Returns the state of the previous runs, or an empty state."""
+        if os.path.exists(self.state_file):
+            with open(self.state_file) as state:
+                return json.load(state)
+        return {"files" : {}, "tasks" : {}}
+
+    def __save(self, state):
+        """Writes `state` to the state file."""
+        directory = os.path.dirname(self.state_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self.state_file + ".tmp"
+        with open(temporary, "w") as current:
+            json.dump(state, current, indent=2)
+        os.replace(temporary, self.state_file)
+
+def configure(chunksize=None, workers=None, processes=False, state=None,
+              manifest=None, shared=None):
+    """Sets the options of the datasets and the writer of `corona_utils`, in
+    the calling process or as the initializer of the processes of a pool.
+
+    Parameters
+    ----------
+    chunksize : Integer, optional
+        The maximum number of cases in Colombia held in memory at once
+    workers : Integer, optional
+        The number of workers writing the csv files of the cities
+    processes : Boolean, optional
+        Whether the csv files of the cities are written with processes
+    state : String, optional
+        The path of the refresh state of the aggregates of the cases in
+        Colombia, which are then refreshed incrementally
+    manifest : String, optional
+        The path of the manifest of the files written, which are then only
+        written when their content changed
+    shared : Dictionary, optional
+        The handles of the datasets placed in shared memory by
+        `corona_utils.share_datasets`, which are attached to instead of parsed
+
+    Returns
+    ----------
+    None
+    """
+    corona_utils.datasets.chunksize = chunksize
+    corona_utils.writer.workers = workers
+    corona_utils.writer.processes = processes
+    if state is not None:
+        corona_utils.datasets.state = RefreshState(state)
+    if manifest is not None:
+        writers.manifest = Manifest(manifest)
+    if shared:
+        corona_utils.attach_datasets(shared)
+
+def default_pipeline(state_file=STATE_FILE, folder=DATA_FOLDER):
+    """Returns a Pipeline object `pipeline` with a task for every function of
+    `corona_utils` that `corona.py` writes the output of.
+
+    The task of `cities_consolidated` only runs when requested. Every task
+    depends on the modules of `COMMON_CODE`, on those of `COLOMBIA_CODE` and
+    `WORLDWIDE_CODE` when it reads the cases in Colombia or a global time
+    series, and on those of `METRICS_CODE` when it computes metrics.
+
+    Parameters
+    ----------
+    state_file : String, optional
+        The path of the state file of the pipeline
+    folder : String, optional
+        The path of the data folder of the `covid-in-colombia` site
+
+    Returns
+    ----------
+    pipeline : Pipeline
+    """
+    colombia = corona_utils.datasets.path("cases_colombia")
+    cases = corona_utils.datasets.path("cases_worldwide")
+    deaths = corona_utils.datasets.path("deaths_worldwide")
+    cities = folder + "cities/"
+    tasks = [
+        Task("cases_per_day", [cases], [folder + "cases_per_day.csv"]),
+        Task("deaths_per_day", [deaths], [folder + "deaths_per_day.csv"]),
+        Task("cases_per_city", [colombia], [folder + "cases_per_city.csv"]),
+        Task("cases_per_age", [colombia], [folder + "cases_per_age.csv"]),
+        Task("total_cases_per_day", [cases],
+             [folder + "total_cases_per_day.csv"]),
+        Task("total_deaths_per_day", [deaths],
+             [folder + "total_deaths_per_day.csv"]),
+        Task("cases_per_demographic", [colombia],
+             [folder + "cases_per_department.csv",
+              folder + "cases_per_age_group.csv",
+              folder + "cases_per_sex.csv", folder + "cases_per_type.csv",
+              folder + "cases_per_treatment.csv"]),
+        Task("origins_and_possible", [colombia],
+             [folder + "cases_per_origin.csv",
+              folder + "possible_origins_cases.csv"]),
+        Task("countries_cases_progression", [cases],
+             [folder + "countries_progression.csv"]),
+        Task("countries_deaths_progression", [deaths],
+             [folder + "countries_death_progression.csv"]),
+        Task("cities_cases_per_day", [colombia],
+             [cities + "cases/per_day/"], writes=True),
+        Task("cities_cases_progression", [colombia],
+             [cities + "cases/total/"], writes=True),
+        Task("cities_deaths_per_day", [colombia],
+             [cities + "deaths/per_day/"], writes=True),
+        Task("cities_deaths_progression", [colombia],
+             [cities + "deaths/total/"], writes=True),
+        Task("departments_per_day", [colombia],
+             [folder + "departments_per_day.csv"]),
+        Task("national_per_day", [colombia, cases, deaths],
+             [folder + "national_per_day.csv"]),
+        Task("countries_metrics", [cases, deaths],
+             [folder + "countries_metrics.csv"]),
+        Task("departments_metrics", [colombia],
+             [folder + "departments_metrics.csv"]),
+        Task("cities_metrics", [colombia], [folder + "cities_metrics.csv"]),
+        Task("cities_consolidated", [colombia],
+             [cities + "cities.csv", cities + "cities.feather",
+              cities + "cities_index.csv"], writes=True, default=False)
+    ]
+    for task in tasks:
+        code = list(COMMON_CODE)
+        if colombia in task.inputs:
+            code += COLOMBIA_CODE
+        if cases in task.inputs or deaths in task.inputs:
+            code += WORLDWIDE_CODE
+        if task.name.endswith("_metrics"):
+            code += METRICS_CODE
+        task.code = [os.path.join(SOURCE_FOLDER, path)
+                     for path in dict.fromkeys(code)]
+    pipeline = Pipeline(tasks, state_file)
+    return pipeline
+
+def _exists(path):
+    """Whether the output `path` exists, and has files if it is a folder."""
+    if os.path.isdir(path):
+        return bool(os.listdir(path))
+    return os.path.exists(path)
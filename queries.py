@@ -0,0 +1,255 @@
+"""Queries
+
+Ad hoc questions about the cases in Colombia and the global time series, such
+as the curve of a single city, the ages of the cases of a department or the
+deaths of a country since a given day, answered without scanning every case.
+
+The positions of the cases of every city and every department, sorted by date,
+are indexed once per load of the cases, as a value derived from the dataset,
+so that a query only reads the rows of its group and date range. The results
+of the latest queries are kept in a bounded LRU cache, which is cleared
+whenever the dataset is loaded again because its source file changed.
+
+Classes
+----------
+Query
+    Answers queries over the datasets of a DataLoader from group indexes
+"""
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from countries import dataset_registry
+from dates import day_offsets, from_offsets
+
+CACHE_SIZE = 256
+INDEX_COLUMNS = ["city", "dept", "date", "date_death", "age"]
+GROUPS = ["city", "dept"]
+
+class Query:
+    """Answers queries over the cases in Colombia and the global time series
+    of a DataLoader, from indexes of the positions of the cases of every city
+    and department.
+
+    The Dataframes and Series returned are cached and shared between equal
+    queries, so they must not be modified.
+
+    Parameters
+    ----------
+    loader : DataLoader
+        A loader with the `cases_colombia`, `cases_worldwide` and
+        `deaths_worldwide` datasets of `data_loader.default_loader`
+    maxsize : Integer, optional
+        The maximum number of results kept in the cache
+    """
+
+    def __init__(self, loader, maxsize=CACHE_SIZE):
+        self.loader = loader
+        self.__index = None
+        self.__cached = lru_cache(maxsize=maxsize)(self.__answer)
+
+    def city(self, name, start=None, end=None):
+        """Returns a Dataframe object `counts` with the cases and deaths per
+        day of the city provided, counted as in the csv files of the cities.
+
+        Parameters
+        ----------
+        name : String
+            The name of the city
+        start : Timestamp, optional
+            The first date included, the first date of the cases by default
+        end : Timestamp, optional
+            The last date included, the last date of the cases by default
+
+        Returns
+        ----------
+        counts : Dataframe
+            A Dataframe indexed by date with the columns "cases" and "deaths"
+        """
+        return self.__query("daily", "city", name, start, end)
+
+    def department(self, name, start=None, end=None):
+        """Returns a Dataframe object `counts` with the cases and deaths per
+        day of the department provided.
+
+        Parameters
+        ----------
+        name : String
+            The name of the department
+        start : Timestamp, optional
+            The first date included, the first date of the cases by default
+        end : Timestamp, optional
+            The last date included, the last date of the cases by default
+
+        Returns
+        ----------
+        counts : Dataframe
+            A Dataframe indexed by date with the columns "cases" and "deaths"
+        """
+        return self.__query("daily", "dept", name, start, end)
+
+    def date_range(self, start=None, end=None):
+        """Returns a Dataframe object `counts` with the cases and deaths per
+        day in Colombia between two dates.
+
+        Parameters
+        ----------
+        start : Timestamp, optional
+            The first date included, the first date of the cases by default
+        end : Timestamp, optional
+            The last date included, the last date of the cases by default
+
+        Returns
+        ----------
+        counts : Dataframe
+            A Dataframe indexed by date with the columns "cases" and "deaths"
+        """
+        return self.__query("daily", None, None, start, end)
+
+    def ages(self, city=None, department=None, start=None, end=None):
+        """Returns a Series object `counts` with the number of cases of every
+        age, from the most to the least common, in a city, a department or the
+        whole country.
+
+        Parameters
+        ----------
+        city : String, optional
+            The name of the city
+        department : String, optional
+            The name of the department, if no city is provided
+        start : Timestamp, optional
+            The first date included, the first date of the cases by default
+        end : Timestamp, optional
+            The last date included, the last date of the cases by default
+
+        Returns
+        ----------
+        counts : Series
+            A Series indexed by age, with the ages without cases left out
+        """
+        if city is not None:
+            return self.__query("ages", "city", city, start, end)
+        if department is not None:
+            return self.__query("ages", "dept", department, start, end)
+        return self.__query("ages", None, None, start, end)
+
+    def country(self, name, since=1, deaths=False):
+        """Returns a Series object `progression` with the cumulative cases, or
+        deaths, of the country provided from a number of days since its first
+        date on.
+
+        Parameters
+        ----------
+        name : String
+            The name of the country
+        since : Integer, optional
+            The first day included, where the first date of the country is
+            day 1
+        deaths : Boolean, optional
+            Whether the deaths are returned instead of the cases
+
+        Returns
+        ----------
+        progression : Series
+            A Series indexed by day
+        """
+        dataset = "deaths_worldwide" if deaths else "cases_worldwide"
+        registry = dataset_registry(self.loader, dataset)
+        return self.__cached("country", registry, name, since, None)
+
+    def cache_info(self):
+        """Returns the hits, misses, maximum size and current size of the
+        cache of results, as `functools.lru_cache` does.
+
+        Returns
+        ----------
+        CacheInfo
+        """
+        return self.__cached.cache_info()
+
+    def clear(self):
+        """Empties the cache of results.
+
+        Returns
+        ----------
+        None
+        """
+        self.__cached.cache_clear()
+
+    def __query(self, kind, group, name, start, end):
+        """Returns the cached answer of a query over the cases, clearing the
+        cache first if the cases were loaded again.
+        """
+        index = self.loader.derived("cases_colombia", "query_index",
+            _Index, INDEX_COLUMNS)
+        if index is not self.__index:
+            self.__cached.cache_clear()
+            self.__index = index
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        return self.__cached(kind, group, name, start, end)
+
+    def __answer(self, kind, group, name, start, end):
+        """Computes the answer of a query that is not in the cache."""
+        if kind == "country":
+            series = group.series(name)
+            progression = pd.Series(series.values, name=name,
+                index=pd.RangeIndex(1, len(series) + 1, name="day"))
+            return progression.loc[max(start, 1):]
+        rows = self.__index.rows(group, name, start, end)
+        if kind == "ages":
+            return self.__index.ages(rows)
+        return self.__index.daily(rows)
+
+class _Index:
+    """The positions of the cases of every city, of every department and of
+    the whole country, each sorted by date, with the dates of the cases held
+    as int32 offsets in days.
+    """
+
+    def __init__(self, cases):
+        self.days = day_offsets(cases["date"])
+        self.died = cases["date_death"].notnull().to_numpy()
+        self.age = cases["age"].to_numpy(dtype="int64")
+        order = np.argsort(self.days, kind="stable")
+        self.groups = {None : ({None : 0}, order, np.array([0, len(order)]))}
+        for group in GROUPS:
+            codes, names = pd.factorize(cases[group])
+            order = np.lexsort((self.days, codes))
+            bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+            positions = {name : code for code, name in enumerate(names)}
+            self.groups[group] = (positions, order, bounds)
+
+    def rows(self, group, name, start, end):
+        """Returns the positions of the cases of `name` in `group` between
+        the dates `start` and `end`, sorted by date.
+        """
+        positions, order, bounds = self.groups[group]
+        if name not in positions:
+            return order[:0]
+        code = positions[name]
+        rows = order[bounds[code]:bounds[code + 1]]
+        days = self.days[rows]
+        first = 0 if start is None else np.searchsorted(days,
+            day_offsets([start])[0])
+        last = len(rows) if end is None else np.searchsorted(days,
+            day_offsets([end])[0], side="right")
+        return rows[first:last]
+
+    def daily(self, rows):
+        """Returns the cases and deaths per day of the cases at `rows`."""
+        died = self.died[rows]
+        dates = pd.DatetimeIndex(from_offsets(self.days[rows]), name="date")
+        cases = pd.Series(~died, index=dates).groupby(level="date").sum()
+        deaths = pd.Series(died, index=dates).groupby(level="date").sum()
+        counts = pd.DataFrame({"cases" : cases.astype("int64"),
+                               "deaths" : deaths.astype("int64")})
+        return counts
+
+    def ages(self, rows):
+        """Returns the number of cases of every age of the cases at `rows`."""
+        counts = np.bincount(self.age[rows], minlength=256)
+        ages = np.flatnonzero(counts)
+        counts = pd.Series(counts[ages], index=ages, name="age")\
+            .sort_values(ascending=False, kind="mergesort")
+        return counts
@@ -0,0 +1,251 @@
+"""Refresh
+
+Incremental refresh of the aggregates of the cases reported in Colombia. The
+csv file of the Instituto Nacional de Salud grows every day by appended rows,
+so the aggregates of one run are kept in a state file along with the bytes of
+the csv file they cover, and the next run only reads the rows appended since.
+
+The aggregates every output was last written from are kept as well, so that
+an output only written in part, such as a folder of csv files of the cities
+with new cases, is brought up to date from the aggregates it was written from,
+even when the aggregates were refreshed by a run that did not write it.
+
+Classes
+----------
+RefreshState
+    Persisted aggregates of a csv file that are refreshed with its new rows
+"""
+
+import copy
+import hashlib
+import os
+import pickle
+
+class RefreshState:
+    """Persisted aggregates of a csv file that are refreshed with the rows
+    appended to it since they were last computed.
+
+    For every accumulator the state holds the number of bytes of the file it
+    covers, the sha256 of those bytes and the last row ID read. The aggregates
+    are rebuilt from the whole file when those bytes have changed, or when an
+    appended row has an ID that is not greater than the last one, since both
+    mean that rows already processed were revised upstream.
+
+    For every output written from an accumulator, the state also holds the
+    accumulator as it was when the output was last written in full.
+
+    Parameters
+    ----------
+    path : String
+        The path of the state file
+    id_column : String, optional
+        The column of the csv file with the increasing ID of every row
+    """
+
+    def __init__(self, path, id_column="ID de caso"):
+        self.path = path
+        self.id_column = id_column
+        self.__entries = {}
+        self.__snapshots = {}
+        self.__digests = {}
+        if os.path.exists(path):
+            with open(path, "rb") as state:
+                self.__entries = pickle.load(state)
+
+    def refresh(self, source, accumulators, read):
+        """Returns a list `refreshed` with the accumulators of the csv file
+        `source` refreshed with the rows appended since their last refresh,
+        or rebuilt from every row.
+
+        The accumulators refreshed from the same offset are updated in a
+        single read of the rows from that offset, and those rebuilt in a
+        single read of every row.
+
+        Parameters
+        ----------
+        source : String
+            The path of the csv file
+        accumulators : List
+            Empty accumulators of `aggregates`
+        read : Function
+            A function that takes a byte offset of `source` and a list of
+            columns, and returns an iterator over the rows from that offset
+            in chunks with those columns
+
+        Returns
+        ----------
+        refreshed : List
+            The accumulators updated with every row of `source`, in the order
+            provided
+        """
+        path = os.path.abspath(source)
+        size = os.path.getsize(source)
+        groups = {}
+        rebuilt = []
+        for accumulator in accumulators:
+            entry = self.__entries.get((path, accumulator.key))
+            if entry is not None and entry["offset"] <= size and \
+                    self.__digest(source, entry["offset"]) == entry["digest"]:
+                groups.setdefault(entry["offset"], []).append(accumulator)
+            else:
+                rebuilt.append(accumulator)
+        results = {}
+        for offset, group in groups.items():
+            entries = [self.__entries[(path, accumulator.key)]
+                       for accumulator in group]
+            deltas = [copy.deepcopy(accumulator) for accumulator in group]
+            last_ids = self.__update(deltas,
+                read(offset, self.__columns(group)),
+                [entry["last_id"] for entry in entries])
+            for accumulator, entry, delta, last_id in zip(group, entries,
+                                                          deltas, last_ids):
+                if last_id is None:
+                    rebuilt.append(accumulator)
+                else:
+                    results[accumulator.key] = \
+                        (entry["accumulator"].merge(delta), last_id)
+        if rebuilt:
+            last_ids = self.__update(rebuilt,
+                read(0, self.__columns(rebuilt)), [None] * len(rebuilt))
+            for accumulator, last_id in zip(rebuilt, last_ids):
+                results[accumulator.key] = (accumulator, last_id)
+        digest = self.__digest(source, size)
+        for key, (accumulator, last_id) in results.items():
+            entry = self.__entries.get((path, key))
+            self.__entries[(path, key)] = {
+                "offset" : size,
+                "digest" : digest,
+                "last_id" : last_id,
+                "accumulator" : accumulator,
+                "written" : {} if entry is None else entry.get("written", {})
+            }
+            self.__snapshots.pop((path, key), None)
+        refreshed = [results[accumulator.key][0]
+                     for accumulator in accumulators]
+        return refreshed
+
+    def written(self, source, key, output):
+        """Returns the accumulator under `key` of the csv file `source` as it
+        was when the output `output` was last written from it.
+
+        Parameters
+        ----------
+        source : String
+            The path of the csv file
+        key : String
+            The key of the accumulator
+        output : String
+            The path of the output
+
+        Returns
+        ----------
+        accumulator : Object
+            The accumulator the output was written from, or None if the
+            output was never written from it
+        """
+        entry = self.__entries.get((os.path.abspath(source), key))
+        if entry is None:
+            return None
+        return entry.get("written", {}).get(output)
+
+    def mark(self, source, key, output):
+        """Records that the output `output` was written in full from the
+        accumulator under `key` of the csv file `source`, as of its last
+        refresh.
+
+        Parameters
+        ----------
+        source : String
+            The path of the csv file
+        key : String
+            The key of the accumulator
+        output : String
+            The path of the output
+
+        Returns
+        ----------
+        None
+        """
+        key = (os.path.abspath(source), key)
+        entry = self.__entries.get(key)
+        if entry is None:
+            return
+        if key not in self.__snapshots:
+            self.__snapshots[key] = copy.deepcopy(entry["accumulator"])
+        entry.setdefault("written", {})[output] = self.__snapshots[key]
+
+    def save(self):
+        """Writes the state to its file.
+
+        Returns
+        ----------
+        None
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as state:
+            pickle.dump(self.__entries, state)
+        os.replace(temporary, self.path)
+
+    def __columns(self, accumulators):
+        """Returns the columns of every accumulator provided and the ID
+        column, without repetitions.
+        """
+        return list(dict.fromkeys([column for accumulator in accumulators
+                                   for column in accumulator.columns]
+                                  + [self.id_column]))
+
+    def __update(self, accumulators, chunks, last_ids):
+        """Updates every accumulator of `accumulators` with `chunks` and
+        returns the last row ID of each, or None for those whose last row ID
+        in `last_ids` is not less than a row ID of `chunks`, which are no
+        longer updated. A last row ID of None is not checked.
+        """
+        last_ids = list(last_ids)
+        failed = [False] * len(accumulators)
+        for chunk in chunks:
+            ids = chunk[self.id_column]
+            if len(ids) == 0:
+                continue
+            first, last = int(ids.min()), int(ids.max())
+            for position, accumulator in enumerate(accumulators):
+                if failed[position]:
+                    continue
+                last_id = last_ids[position]
+                if last_id is not None and first <= last_id:
+                    failed[position] = True
+                    continue
+                accumulator.update(chunk)
+                last_ids[position] = max(last, last_id or 0)
+            if all(failed):
+                break
+        return [None if failure else last_id
+                for failure, last_id in zip(failed, last_ids)]
+
+    def __digest(self, source, offset):
+        """Returns the sha256 of the first `offset` bytes of `source`.
+
+        The digests of every offset in the state and of the whole file are
+        computed in a single pass and kept for the rest of the process.
+        """
+        stat = os.stat(source)
+        signature = (os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+        if (signature, offset) not in self.__digests:
+            offsets = {entry["offset"] for entry in self.__entries.values()}
+            offsets = sorted(offsets | {offset, stat.st_size})
+            digest = hashlib.sha256()
+            position = 0
+            with open(source, "rb") as data:
+                for target in offsets:
+                    if target > stat.st_size:
+                        break
+                    while position < target:
+                        block = data.read(min(1 << 20, target - position))
+                        if not block:
+                            break
+                        digest.update(block)
+                        position += len(block)
+                    self.__digests[(signature, target)] = digest.hexdigest()
+        return self.__digests.get((signature, offset))
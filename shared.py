@@ -0,0 +1,200 @@
+"""Shared
+
+Dataframes placed once in shared memory, so that the processes of a pool attach
+to them instead of parsing the csv files again. The columns of a Dataframe are
+copied into a single block of `multiprocessing.shared_memory`, and the
+Dataframe rebuilt by every process that attaches to it is a set of views of
+that block, so the memory used does not grow with the number of processes.
+
+Numeric, boolean and datetime columns are shared as they are, and categorical
+columns as their codes, with their categories passed along with the handle of
+the block. A Dataframe whose columns all have the same numeric dtype, like the
+global time series, is shared as a single two dimensional array.
+
+Classes
+----------
+SharedFrame
+    A Dataframe whose columns are held in a block of shared memory
+"""
+
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+ALIGNMENT = 64
+
+_attached = {}
+
+class SharedFrame:
+    """A Dataframe whose columns are held in a block of shared memory.
+
+    A SharedFrame is created from a Dataframe by the process that owns the
+    block, with `create`, and attached to from other processes with `attach`
+    and its `handle`, which can be pickled.
+
+    Parameters
+    ----------
+    memory : SharedMemory
+        The block of shared memory
+    layout : Dictionary
+        The description of the columns in the block and of the index
+    """
+
+    def __init__(self, memory, layout):
+        self.memory = memory
+        self.layout = layout
+        self.__frame = None
+
+    @classmethod
+    def create(cls, frame):
+        """Returns a SharedFrame object `shared` with the columns of the
+        Dataframe `frame` copied into a new block of shared memory.
+
+        Parameters
+        ----------
+        frame : Dataframe
+            A Dataframe with numeric, boolean, datetime or categorical columns
+
+        Returns
+        ----------
+        shared : SharedFrame
+        """
+        dtypes = set(frame.dtypes)
+        if len(dtypes) == 1 and frame.shape[1] > 1 \
+                and np.issubdtype(next(iter(dtypes)), np.number):
+            arrays = [("matrix", np.ascontiguousarray(frame.to_numpy()), None,
+                       None)]
+            kind = "matrix"
+        else:
+            arrays = [(column,) + _column_array(frame[column])
+                      for column in frame.columns]
+            kind = "columns"
+        columns = []
+        size = 0
+        for column, array, dtype, categories in arrays:
+            columns.append((column, array.dtype.str, array.shape, size, dtype,
+                            categories))
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (_, array, _, _), (_, _, _, offset, _, _) in zip(arrays, columns):
+            np.ndarray(array.shape, array.dtype, buffer=memory.buf,
+                       offset=offset)[...] = array
+        layout = {
+            "kind" : kind,
+            "columns" : columns,
+            "names" : frame.columns,
+            "index" : frame.index
+        }
+        shared = cls(memory, layout)
+        return shared
+
+    @classmethod
+    def attach(cls, handle):
+        """Returns a SharedFrame object `shared` attached to the block of
+        shared memory of the handle provided.
+
+        The process stays attached to the block until `close` is called, even
+        if `shared` is no longer referenced, since the Dataframes built from it
+        may still be.
+
+        Parameters
+        ----------
+        handle : Tuple
+            The `handle` of a SharedFrame
+
+        Returns
+        ----------
+        shared : SharedFrame
+        """
+        name, layout = handle
+        if name not in _attached:
+            _attached[name] = cls(shared_memory.SharedMemory(name=name),
+                                  layout)
+        shared = _attached[name]
+        return shared
+
+    @property
+    def handle(self):
+        """Tuple: the name of the block and the layout of the columns, which
+        can be pickled and passed to other processes to attach to it.
+        """
+        return self.memory.name, self.layout
+
+    @property
+    def nbytes(self):
+        """Integer: the size of the block of shared memory in bytes."""
+        return self.memory.size
+
+    def frame(self):
+        """Returns a Dataframe object `frame` with views of the columns in the
+        block of shared memory, which must not be modified.
+
+        Returns
+        ----------
+        frame : Dataframe
+        """
+        if self.__frame is not None:
+            return self.__frame
+        arrays = {}
+        for column, dtype, shape, offset, kind, categories in \
+                self.layout["columns"]:
+            array = np.ndarray(shape, np.dtype(dtype), buffer=self.memory.buf,
+                               offset=offset)
+            array.flags.writeable = False
+            if categories is not None:
+                array = pd.Categorical.from_codes(array, dtype=categories)
+            elif kind is not None:
+                array = array.view(kind)
+            arrays[column] = array
+        if self.layout["kind"] == "matrix":
+            frame = pd.DataFrame(arrays["matrix"], index=self.layout["index"],
+                                 columns=self.layout["names"], copy=False)
+        else:
+            frame = pd.DataFrame(arrays, index=self.layout["index"],
+                                 copy=False)
+        self.__frame = frame
+        return frame
+
+    def close(self):
+        """Detaches the current process from the block of shared memory. The
+        Dataframe returned by `frame` cannot be used afterwards.
+
+        Returns
+        ----------
+        None
+        """
+        self.__frame = None
+        _attached.pop(self.memory.name, None)
+        self.memory.close()
+
+    def unlink(self):
+        """Detaches the current process from the block of shared memory, if no
+        view of it is still in use, and frees it once every other process has
+        detached too. Only the process that created the block should call it.
+
+        Returns
+        ----------
+        None
+        """
+        try:
+            self.close()
+        except BufferError:
+            pass
+        self.memory.unlink()
+
+def _column_array(series):
+    """Returns the array of the Series `series` that is copied into shared
+    memory, with its values or its codes if it is categorical, along with the
+    datetime dtype it is viewed as and the categorical dtype it is rebuilt
+    with, if any.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return (np.ascontiguousarray(series.cat.codes.to_numpy()), None,
+                series.dtype)
+    if series.dtype.kind == "M" and isinstance(series.dtype, np.dtype):
+        return (np.ascontiguousarray(series.to_numpy().view("int64")),
+                series.dtype.str, None)
+    if series.dtype.kind in "biufc" and isinstance(series.dtype, np.dtype):
+        return np.ascontiguousarray(series.to_numpy()), None, None
+    raise TypeError("Column {!r} with dtype {} cannot be shared".format(
+        series.name, series.dtype))
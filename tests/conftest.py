@@ -0,0 +1,74 @@
+"""Fixtures that run `corona.py` in temporary copies of its working folder,
+with the folders of the `covid-in-colombia` site next to it.
+"""
+
+import csv
+from datetime import datetime, timedelta
+import os
+import random
+import shutil
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUTS = ["confirmed-global.csv", "confirmed-global-deaths.csv"]
+HEADER = ["ID de caso", "Fecha de notificación", "Código DIVIPOLA",
+          "Nombre municipio", "Departamento", "Atención", "Edad", "Sexo",
+          "Tipo", "Estado", "Nombre del país", "FIS", "Fecha de muerte",
+          "Fecha de diagnóstico", "Fecha recuperado", "fecha reporte web"]
+CITIES = [("Bogotá", "Bogotá D.C."), ("Medellín", "Antioquia"),
+          ("Cali", "Valle del Cauca"), ("Buga", "Valle del Cauca"),
+          ("Pasto", "Nariño"), ("Leticia", "Amazonas")]
+CITY_FOLDERS = ["cases/per_day", "cases/total", "deaths/per_day",
+                "deaths/total"]
+
+@pytest.fixture
+def site(tmp_path):
+    """Returns a function that creates the working folder `name` of a run of
+    `corona.py`, with its inputs and the folders of the cities of the site,
+    and returns its path.
+    """
+    def create(name="site", rows=3000):
+        work = os.path.join(str(tmp_path), name, "work")
+        os.makedirs(work)
+        for source in INPUTS:
+            shutil.copy(os.path.join(ROOT, source), work)
+        _cases(os.path.join(work, "Casos.csv"), rows)
+        for folder in CITY_FOLDERS:
+            os.makedirs(os.path.join(work, "..", "covid-in-colombia", "data",
+                                     "cities", folder))
+        return work
+    return create
+
+@pytest.fixture
+def corona():
+    """Returns a function that runs `corona.py` in the folder `work` with the
+    arguments provided.
+    """
+    def run(work, *args):
+        subprocess.run([sys.executable, os.path.join(ROOT, "corona.py")]
+                       + list(args), cwd=work, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return run
+
+def _cases(path, rows):
+    """Writes `rows` random cases, always the same ones, to the csv file
+    `path` in the format of the Instituto Nacional de Salud.
+    """
+    generator = random.Random(0)
+    first = datetime(2020, 3, 6)
+    with open(path, "w", newline="") as data:
+        cases = csv.writer(data)
+        cases.writerow(HEADER)
+        for case in range(1, rows + 1):
+            city, dept = generator.choice(CITIES)
+            date = first + timedelta(days=case * 60 // rows)
+            died = generator.random() < 0.1
+            death = (date + timedelta(days=5)).strftime("%d/%m/%Y %H:%M:%S") \
+                if died else ""
+            cases.writerow([case, date.strftime("%d/%m/%Y %H:%M:%S"), 11001,
+                city, dept, "Fallecido" if died else "Casa",
+                generator.randint(0, 99), generator.choice("MF"), "Importado",
+                "Leve", "España", "", death,
+                date.strftime("%Y-%m-%dT00:00:00.000"), "", date.isoformat()])
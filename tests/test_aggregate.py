@@ -0,0 +1,72 @@
+"""Tests of the aggregation of the cases in Colombia by `DataLoader`."""
+
+import os
+import pandas as pd
+from aggregates import AgeHistogram, CityDailyCounts, DemographicCube
+from aggregates import ValueCounts
+from data_loader import DataLoader, read_cases_colombia
+from data_loader import read_cases_colombia_chunks
+from refresh import RefreshState
+
+ACCUMULATORS = [lambda: ValueCounts("city"),
+                lambda: ValueCounts("origin", dropna=False), AgeHistogram,
+                DemographicCube, CityDailyCounts]
+
+def _loader(path, reads, chunksize=None, state=None):
+    """Returns a DataLoader of the cases of `path` that appends the offset of
+    every read of the csv file in chunks to `reads`.
+    """
+    def chunks(source, size, columns=None, offset=0):
+        reads.append(offset)
+        return read_cases_colombia_chunks(source, size, columns, offset)
+    loader = DataLoader(chunksize, state)
+    loader.register("cases_colombia", path, read_cases_colombia,
+                    columnar=True, chunks=chunks)
+    return loader
+
+def _results(accumulators):
+    return [accumulator.rollup(["sex"]) if isinstance(accumulator,
+                                                      DemographicCube)
+            else accumulator.result() for accumulator in accumulators]
+
+def _assert_equal(left, right):
+    for expected, actual in zip(left, right):
+        if isinstance(expected, tuple):
+            for series, other in zip(expected, actual):
+                pd.testing.assert_series_equal(series, other)
+        elif isinstance(expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(expected, actual)
+        elif isinstance(expected, pd.Series):
+            pd.testing.assert_series_equal(expected, actual)
+        else:
+            assert expected == actual
+
+def test_chunked_aggregates_read_the_cases_once(site):
+    path = os.path.join(site(), "Casos.csv")
+    whole = _results(_loader(path, []).aggregate_many("cases_colombia",
+        [create() for create in ACCUMULATORS]))
+    reads = []
+    chunked = _loader(path, reads, chunksize=700).aggregate_many(
+        "cases_colombia", [create() for create in ACCUMULATORS])
+    assert reads == [0]
+    _assert_equal(whole, _results(chunked))
+
+def test_refresh_reads_the_cases_once(site, tmp_path):
+    path = os.path.join(site(), "Casos.csv")
+    whole = _results(_loader(path, []).aggregate_many("cases_colombia",
+        [create() for create in ACCUMULATORS]))
+    with open(path, "rb") as data:
+        lines = data.readlines()
+    with open(path, "wb") as data:
+        data.writelines(lines[:1000])
+    offset = os.path.getsize(path)
+    reads = []
+    state = RefreshState(str(tmp_path / "state.pkl"))
+    _loader(path, reads, state=state).aggregate_many("cases_colombia",
+        [create() for create in ACCUMULATORS])
+    with open(path, "wb") as data:
+        data.writelines(lines)
+    refreshed = _loader(path, reads, state=state).aggregate_many(
+        "cases_colombia", [create() for create in ACCUMULATORS])
+    assert reads == [0, offset]
+    _assert_equal(whole, _results(refreshed))
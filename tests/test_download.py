@@ -0,0 +1,217 @@
+"""Tests of `download_cases` against a local HTTP stand-in of the sources."""
+
+import hashlib
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import pytest
+import requests
+import download_cases
+from download_cases import DownloadError, download, download_all, make_session
+
+LAST_MODIFIED = "Wed, 08 Apr 2020 00:00:00 GMT"
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the files of the stand-in, with validators and Range requests,
+    and the failures it is configured with.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        if server.barrier is not None:
+            server.barrier.wait(timeout=5)
+        body = server.files[self.path]
+        etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+        if (server.etag and self.headers.get("If-None-Match") == etag) or \
+                self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            self.__reply(304, b"", etag)
+            return
+        status, start = 200, 0
+        span = self.headers.get("Range")
+        if span and not server.ignore_range \
+                and self.headers.get("If-Range") in (etag, LAST_MODIFIED):
+            start = int(span[len("bytes="):-1])
+            if start >= len(body):
+                self.__reply(416, b"", etag,
+                             {"Content-Range" : "bytes */{}".format(len(body))})
+                return
+            status = 206
+        payload = server.corrupt.get(self.path, body)[start:]
+        headers = {}
+        if status == 206:
+            headers["Content-Range"] = "bytes {}-{}/{}".format(start,
+                len(body) - 1, len(body))
+        if server.drops:
+            server.drops -= 1
+            self.__reply(status, payload[:len(payload) // 2], etag, headers,
+                         length=len(payload))
+            self.close_connection = True
+            return
+        self.__reply(status, payload, etag, headers)
+
+    def __reply(self, status, payload, etag, headers=None, length=None):
+        self.send_response(status)
+        if self.server.etag:
+            self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length",
+                         str(len(payload) if length is None else length))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    """Returns a local HTTP server with the files "/cases.csv" and
+    "/deaths.csv", with ETags, that honours Range requests.
+    """
+    # chunks smaller than the body, so a dropped transfer leaves a partial file
+    monkeypatch.setattr(download_cases, "CHUNK_SIZE", 1 << 12)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.files = {"/cases.csv" : bytes(range(256)) * 1024,
+                    "/deaths.csv" : b"Country/Region,1/22/20\nItaly,0\n"}
+    server.requests = []
+    server.barrier = None
+    server.etag = True
+    server.ignore_range = False
+    server.drops = 0
+    server.corrupt = {}
+    server.url = "http://127.0.0.1:{}".format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _sources(server, folder):
+    return {str(folder / name[1:]) : server.url + name
+            for name in server.files}
+
+def test_download_all_concurrently_then_skip_unchanged(stand_in, tmp_path):
+    sources = _sources(stand_in, tmp_path)
+    state = str(tmp_path / "downloads.json")
+    stand_in.barrier = threading.Barrier(len(sources))
+    assert download_all(sources, state) == {path : True for path in sources}
+    stand_in.barrier = None
+    for path, url in sources.items():
+        with open(path, "rb") as data:
+            assert data.read() == stand_in.files[url[len(stand_in.url):]]
+    assert download_all(sources, state) == {path : False
+                                            for path in sources}
+    assert all("If-None-Match" in headers
+               for _, headers in stand_in.requests[len(sources):])
+
+def test_skip_unchanged_with_last_modified(stand_in, tmp_path):
+    stand_in.etag = False
+    sources = _sources(stand_in, tmp_path)
+    state = str(tmp_path / "downloads.json")
+    download_all(sources, state)
+    assert download_all(sources, state) == {path : False
+                                            for path in sources}
+    assert all(headers.get("If-Modified-Since") == LAST_MODIFIED
+               for _, headers in stand_in.requests[len(sources):])
+
+def test_failed_download_keeps_the_previous_file(stand_in, tmp_path):
+    path = str(tmp_path / "cases.csv")
+    with open(path, "wb") as data:
+        data.write(b"previous")
+    body = stand_in.files["/cases.csv"]
+    stand_in.corrupt["/cases.csv"] = bytes(reversed(body))
+    with pytest.raises(DownloadError):
+        download_all({path : stand_in.url + "/cases.csv"},
+                     str(tmp_path / "downloads.json"),
+                     checksums={path : hashlib.sha256(body).hexdigest()})
+    with open(path, "rb") as data:
+        assert data.read() == b"previous"
+    assert sorted(os.listdir(str(tmp_path))) == ["cases.csv",
+                                                 "downloads.json"]
+
+def _etag(body):
+    return '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+
+def _download(server, path, **kwargs):
+    with make_session() as session:
+        return download(session, server.url + "/cases.csv", path, backoff=0,
+                        **kwargs)
+
+def test_resume_after_dropped_connection(stand_in, tmp_path, caplog):
+    caplog.set_level(logging.INFO, logger="download_cases")
+    body = stand_in.files["/cases.csv"]
+    path = str(tmp_path / "cases.csv")
+    stand_in.drops = 1
+    changed, validators = _download(stand_in, path, retries=1)
+    assert changed and validators["ETag"] == _etag(body)
+    _, headers = stand_in.requests[-1]
+    assert headers["Range"] == "bytes={}-".format(len(body) // 2)
+    assert headers["If-Range"] == _etag(body)
+    with open(path, "rb") as data:
+        assert data.read() == body
+    assert "resumed from byte {}".format(len(body) // 2) in caplog.text
+    assert os.listdir(str(tmp_path)) == ["cases.csv"]
+
+def test_resume_partial_of_previous_run(stand_in, tmp_path):
+    body = stand_in.files["/cases.csv"]
+    path = str(tmp_path / "cases.csv")
+    stand_in.drops = 1
+    with pytest.raises(requests.RequestException):
+        _download(stand_in, path, retries=0)
+    assert not os.path.exists(path)
+    assert os.path.getsize(path + ".part") == len(body) // 2
+    assert _download(stand_in, path, retries=0)[0]
+    assert "Range" in stand_in.requests[-1][1]
+    with open(path, "rb") as data:
+        assert data.read() == body
+
+def test_restart_when_range_is_ignored(stand_in, tmp_path, caplog):
+    caplog.set_level(logging.INFO, logger="download_cases")
+    body = stand_in.files["/cases.csv"]
+    path = str(tmp_path / "cases.csv")
+    stand_in.drops = 1
+    stand_in.ignore_range = True
+    assert _download(stand_in, path, retries=1)[0]
+    assert "Range" in stand_in.requests[-1][1]
+    with open(path, "rb") as data:
+        assert data.read() == body
+    assert "restarted as the server ignored the Range request" in caplog.text
+
+def test_complete_partial_answered_with_416(stand_in, tmp_path):
+    body = stand_in.files["/cases.csv"]
+    path = str(tmp_path / "cases.csv")
+    with open(path + ".part", "wb") as data:
+        data.write(body)
+    with open(path + ".part.json", "w") as meta:
+        json.dump({"ETag" : _etag(body)}, meta)
+    changed, validators = _download(stand_in, path, retries=0,
+                                    checksum=hashlib.sha256(body).hexdigest())
+    assert changed and len(stand_in.requests) == 1
+    assert validators["sha256"] == hashlib.sha256(body).hexdigest()
+    with open(path, "rb") as data:
+        assert data.read() == body
+    assert os.listdir(str(tmp_path)) == ["cases.csv"]
+
+def test_corrupt_resumed_body_is_discarded(stand_in, tmp_path):
+    body = stand_in.files["/cases.csv"]
+    path = str(tmp_path / "cases.csv")
+    stand_in.drops = 1
+    stand_in.corrupt["/cases.csv"] = bytes(reversed(body))
+    with pytest.raises(DownloadError):
+        _download(stand_in, path, retries=1,
+                  checksum=hashlib.sha256(body).hexdigest())
+    assert "Range" in stand_in.requests[-1][1]
+    assert os.listdir(str(tmp_path)) == []
+    del stand_in.corrupt["/cases.csv"]
+    assert _download(stand_in, path, retries=0,
+                     checksum=hashlib.sha256(body).hexdigest())[0]
+    assert "Range" not in stand_in.requests[-1][1]
+    with open(path, "rb") as data:
+        assert data.read() == body
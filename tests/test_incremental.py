@@ -0,0 +1,36 @@
+"""Tests of the incremental refresh of the csv files of the cities, which must
+end up as a full run would write them after any sequence of partial runs.
+"""
+
+import filecmp
+import os
+import shutil
+from conftest import CITY_FOLDERS
+
+def _truncate(path, lines):
+    """Keeps only the first `lines` lines of the file `path`."""
+    with open(path, "rb") as data:
+        head = data.readlines()[:lines]
+    with open(path, "wb") as data:
+        data.writelines(head)
+
+def test_cities_after_partial_incremental_runs(site, corona):
+    expected = site("full")
+    corona(expected)
+    work = site("incremental")
+    casos = os.path.join(work, "Casos.csv")
+    shutil.copy(casos, casos + ".full")
+    _truncate(casos, 2000)
+    corona(work, "--incremental")
+    shutil.copy(casos + ".full", casos)
+    corona(work, "cities_cases_per_day", "--incremental")
+    corona(work, "--incremental")
+    for folder in CITY_FOLDERS:
+        left, right = [os.path.join(path, "..", "covid-in-colombia", "data",
+                                    "cities", folder)
+                       for path in (expected, work)]
+        names = sorted(os.listdir(left))
+        assert sorted(os.listdir(right)) == names
+        _, mismatch, errors = filecmp.cmpfiles(left, right, names,
+                                               shallow=False)
+        assert (folder, mismatch, errors) == (folder, [], [])
@@ -0,0 +1,27 @@
+"""Tests of the tasks that a Pipeline runs again."""
+
+from pipeline import Pipeline, Task
+
+class _Noop(Task):
+    """A task that does nothing instead of calling `corona_utils`."""
+
+    def run(self):
+        return None
+
+def _pipeline(tmp_path, config):
+    source = tmp_path / "source.csv"
+    output = tmp_path / "output.csv"
+    if not source.exists():
+        source.write_text("a\n1\n")
+        output.write_text("a\n1\n")
+    task = _Noop("task", [str(source)], [str(output)], code=[str(config)])
+    return Pipeline([task], str(tmp_path / "state.json"))
+
+def test_tasks_run_again_when_their_code_changes(tmp_path):
+    config = tmp_path / "config.py"
+    config.write_text("POPULATIONS = {}\n")
+    statuses = [_pipeline(tmp_path, config).run(jobs=1)["task"]]
+    statuses.append(_pipeline(tmp_path, config).run(jobs=1)["task"])
+    config.write_text("POPULATIONS = {'Colombia' : 50882884}\n")
+    statuses.append(_pipeline(tmp_path, config).run(jobs=1)["task"])
+    assert statuses == ["ran", "unchanged", "ran"]
@@ -0,0 +1,14 @@
+"""Tests of the report of the stages of a run of `corona.py`."""
+
+import json
+import os
+
+def test_report_of_time_series_task(site, corona):
+    work = site()
+    corona(work, "cases_per_day", "--report", "report.json")
+    with open(os.path.join(work, "report.json")) as report:
+        stages = {stage["name"] : stage
+                  for stage in json.load(report)["stages"]}
+    assert stages["parse cases_worldwide"]["rows"] > 0
+    assert os.path.exists(os.path.join(work, "..", "covid-in-colombia",
+                                       "data", "cases_per_day.csv"))
@@ -0,0 +1,35 @@
+"""Tests of the manifest of the files written by `writers`."""
+
+import os
+import pandas as pd
+import pytest
+import writers
+from writers import Manifest, ParallelWriter
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    """Sets `writers.manifest` to a Manifest in `tmp_path`."""
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(writers, "manifest", manifest)
+    return manifest
+
+def _write(folder, frames):
+    """Writes the Dataframes `frames`, keyed by file name, to `folder`."""
+    ParallelWriter(workers=2).write([(frame, os.path.join(folder, name), {})
+                                     for name, frame in frames.items()])
+
+def test_touched_files_with_the_same_content_are_not_changed(tmp_path,
+                                                             manifest):
+    folder = str(tmp_path)
+    frames = {"cali.csv" : pd.DataFrame({"cases" : [1, 2]}),
+              "buga.csv" : pd.DataFrame({"cases" : [3]})}
+    _write(folder, frames)
+    manifest.drain()
+    cali = os.path.join(folder, "cali.csv")
+    os.utime(cali, ns=(0, 0))
+    with open(os.path.join(folder, "buga.csv"), "a") as buga:
+        buga.write("x\n")
+    _write(folder, frames)
+    _, changed = manifest.drain()
+    assert changed == [os.path.join(folder, "buga.csv")]
+    assert os.stat(cali).st_mtime_ns == 0
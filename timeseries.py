@@ -0,0 +1,236 @@
+"""Time Series
+
+The global time series of cases or deaths held as a contiguous array of
+integers, with a row per location and a column per day, along with an index of
+the locations and the date of the first day. Unlike the wide Dataframe of the
+csv file, with a column named after every day, the values of any location or
+any window of days are slices of the array, and the array can be saved to a
+`.npy` file and memory-mapped back without parsing the csv file again.
+
+Classes
+----------
+TimeSeries
+    The values of every location per day, indexed by location and by date
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from dates import date_labels, parse_labels
+
+LOCATION_COLUMNS = ["Province/State", "Country/Region", "Lat", "Long"]
+
+class TimeSeries:
+    """The values of every location of a global time series per day, as a
+    (location x day) array of int64.
+
+    Parameters
+    ----------
+    values : ndarray
+        A two dimensional array with a row per location and a column per day,
+        which may be memory-mapped
+    locations : Dataframe
+        The `LOCATION_COLUMNS` of every location, in the order of the rows of
+        `values`
+    start : Timestamp
+        The date of the first column of `values`
+    """
+
+    def __init__(self, values, locations, start):
+        self.values = values
+        self.locations = locations
+        self.start = pd.Timestamp(start)
+        countries = locations["Country/Region"]
+        self.__rows = {country : _rows(positions)
+                       for country, positions in countries.groupby(
+                           countries.values, sort=False).indices.items()}
+
+    @classmethod
+    def from_frame(cls, dtfrm):
+        """Returns a TimeSeries object `series` with the values of the wide
+        Dataframe of a global time series.
+
+        Parameters
+        ----------
+        dtfrm : Dataframe
+            A Dataframe with a row per location, the `LOCATION_COLUMNS` and a
+            column per consecutive day named like "1/22/20"
+
+        Returns
+        ----------
+        series : TimeSeries
+        """
+        days = [column for column in dtfrm.columns
+                if column not in LOCATION_COLUMNS]
+        dates = parse_labels(days)
+        if len(dates) and not dates.equals(pd.date_range(dates[0],
+                                                         periods=len(dates))):
+            raise ValueError("The days of the time series are not "
+                             "consecutive")
+        values = np.ascontiguousarray(dtfrm[days].fillna(0)
+                                      .to_numpy(dtype=np.int64))
+        locations = dtfrm[LOCATION_COLUMNS].reset_index(drop=True)
+        start = dates[0] if len(dates) else pd.NaT
+        series = cls(values, locations, start)
+        return series
+
+    @classmethod
+    def load(cls, prefix, mmap_mode="r"):
+        """Returns a TimeSeries object `series` saved with `save`, with its
+        values memory-mapped from the `.npy` file.
+
+        Parameters
+        ----------
+        prefix : String
+            The path of the files without their extensions
+        mmap_mode : String, optional
+            The mode the values are memory-mapped with, as in `numpy.load`.
+            They are read into memory if it is None
+
+        Returns
+        ----------
+        series : TimeSeries
+        """
+        values = np.load(prefix + ".npy", mmap_mode=mmap_mode)
+        with open(prefix + ".json") as index:
+            index = json.load(index)
+        locations = pd.DataFrame(index["locations"], columns=LOCATION_COLUMNS)
+        series = cls(values, locations, index["start"])
+        return series
+
+    def save(self, prefix):
+        """Writes the values to the file `prefix`.npy, and the locations and
+        the first date to the file `prefix`.json. Each file is written to a
+        temporary file first, and the index last, so that a partial save is
+        never loaded.
+
+        Parameters
+        ----------
+        prefix : String
+            The path of the files without their extensions
+
+        Returns
+        ----------
+        None
+        """
+        with open(prefix + ".npy.tmp", "wb") as values:
+            np.save(values, np.ascontiguousarray(self.values))
+        os.replace(prefix + ".npy.tmp", prefix + ".npy")
+        locations = self.locations.astype(object)\
+            .where(self.locations.notnull(), None)
+        with open(prefix + ".json.tmp", "w") as index:
+            json.dump({"start" : self.start.isoformat(),
+                       "locations" : locations.values.tolist()}, index)
+        os.replace(prefix + ".json.tmp", prefix + ".json")
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    @property
+    def dates(self):
+        """DatetimeIndex: the date of every column of the values."""
+        return pd.date_range(self.start, periods=self.values.shape[1],
+                             name="date")
+
+    @property
+    def countries(self):
+        """List: every country with at least one location, in the order they
+        first appear.
+        """
+        return list(self.__rows)
+
+    def day(self, date):
+        """Returns the column of the values of the date provided.
+
+        Parameters
+        ----------
+        date : Timestamp
+            The date, or a string parsed as one
+
+        Returns
+        ----------
+        day : Integer
+            The number of days from the first date, which is out of the bounds
+            of the values for dates outside the time series
+        """
+        day = (pd.Timestamp(date) - self.start).days
+        return day
+
+    def rows(self, country):
+        """Returns the rows of the values of the locations of the country
+        provided, as a slice when they are consecutive.
+
+        Parameters
+        ----------
+        country : String
+            The name of the country
+
+        Returns
+        ----------
+        rows : slice or ndarray
+        """
+        return self.__rows[country]
+
+    def window(self, country=None, start=None, end=None):
+        """Returns an ndarray object `window` with the values of the locations
+        of a country between two dates, which is a view of the values, without
+        copying them, unless the locations of the country are not consecutive.
+
+        Parameters
+        ----------
+        country : String, optional
+            The name of the country. Every location is included if none is
+            provided
+        start : Timestamp, optional
+            The first date included, the first date of the series by default
+        end : Timestamp, optional
+            The last date included, the last date of the series by default
+
+        Returns
+        ----------
+        window : ndarray
+            An array with a row per location and a column per day
+        """
+        rows = slice(None) if country is None else self.rows(country)
+        first = 0 if start is None else max(self.day(start), 0)
+        last = None if end is None else max(self.day(end) + 1, 0)
+        window = self.values[rows, first:last]
+        return window
+
+    def by_country(self):
+        """Returns a Dataframe object `matrix` indexed by date with the values
+        of every country, with the values of its locations summed, and the
+        countries sorted by name.
+
+        Returns
+        ----------
+        matrix : Dataframe
+            A Dataframe with a row per day and a column per country
+        """
+        countries = self.locations["Country/Region"].values
+        matrix = pd.DataFrame(self.values).groupby(countries).sum().T
+        matrix.index = self.dates
+        matrix.columns.name = None
+        return matrix
+
+    def to_frame(self):
+        """Returns a Dataframe object `dtfrm` laid out like the csv file of the
+        time series, with a row per location and a column per day.
+
+        Returns
+        ----------
+        dtfrm : Dataframe
+        """
+        days = pd.DataFrame(np.asarray(self.values),
+                            columns=date_labels(self.dates))
+        dtfrm = pd.concat([self.locations, days], axis=1)
+        return dtfrm
+
+def _rows(positions):
+    """Returns the sorted row positions provided as a slice if they are
+    consecutive, or as they are otherwise.
+    """
+    if positions[-1] - positions[0] + 1 == len(positions):
+        return slice(int(positions[0]), int(positions[-1]) + 1)
+    return positions
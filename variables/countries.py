@@ -0,0 +1,48 @@
+"""Countries Variables
+
+The countries that are part of the comparison of the progressions of cases and
+deaths, in the order of their columns, and the country whose number of days
+since its first case or death sets the length of the progressions.
+
+The first dates of reported cases and deaths of every country are derived from
+the global time series as their first nonzero day. A date in the overrides
+replaces the derived one, for countries whose time series does not reflect the
+start of their outbreak, and can be a `datetime` object or a string like
+"2020-02-01".
+
+The populations of the countries are used for the values per 100,000
+inhabitants of the analytics, and are the estimates for 2020 of the United
+Nations World Population Prospects 2019. Countries without a population have
+no values per inhabitant.
+"""
+
+REFERENCE_COUNTRY = "Colombia"
+
+COUNTRIES = [
+    "Colombia",
+    "Italy",
+    "Spain",
+    "Peru",
+    "Ecuador",
+    "Argentina",
+    "Chile",
+    "Venezuela",
+    "Brazil",
+    "Mexico"
+]
+
+FIRST_DATE_OVERRIDES = {}
+FIRST_DEATH_DATE_OVERRIDES = {}
+
+POPULATIONS = {
+    "Colombia" : 50882884,
+    "Italy" : 60461828,
+    "Spain" : 46754783,
+    "Peru" : 32971846,
+    "Ecuador" : 17643060,
+    "Argentina" : 45195777,
+    "Chile" : 19116209,
+    "Venezuela" : 28435943,
+    "Brazil" : 212559409,
+    "Mexico" : 128932753
+}
@@ -1,30 +0,0 @@
-"""First Dates Variables
-
-All the variables of the first dates of reported cases and deaths for every
-single nation that's going to be part of the comparison. Uses the `datetime`
-module.
-"""
-
-from datetime import datetime
-
-spain_first_date = datetime(2020, 2, 1)
-italy_first_date = datetime(2020, 1, 31)
-brazil_first_date = datetime(2020, 2, 26)
-ecuador_first_date = datetime(2020, 3, 1)
-mexico_first_date = datetime(2020, 2, 28)
-peru_first_date = datetime(2020, 3, 6)
-venezuela_first_date = datetime(2020, 3, 14)
-colombia_first_date = datetime(2020, 3, 6)
-argentina_first_date = datetime(2020, 3, 3)
-chile_first_date = datetime(2020, 3, 3)
-
-spain_first_death_date = datetime(2020, 3, 3)
-italy_first_death_date = datetime(2020, 2, 21)
-brazil_first_death_date = datetime(2020, 3, 17)
-ecuador_first_death_date = datetime(2020, 3, 14)
-mexico_first_death_date = datetime(2020, 3, 19)
-peru_first_death_date = datetime(2020, 3, 20)
-venezuela_first_death_date = datetime(2020, 3, 27)
-colombia_first_death_date = datetime(2020, 3, 22)
-argentina_first_death_date = datetime(2020, 3, 8)
-chile_first_death_date = datetime(2020, 3, 22)
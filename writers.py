@@ -0,0 +1,436 @@
+"""Writers
+
+Helpers for writing the processed data to the csv files of the
+`covid-in-colombia` data tree. Every file is written atomically, through a
+temporary file that is renamed over it, so the site never serves a half
+written file.
+
+When `manifest` is set to a Manifest, the sha256 of every file written is
+kept in it, and a file is only written when its new content has a different
+sha256 than the one it was last written with, or, when the file was touched
+since, a different content than the file on disk, so unchanged files keep
+their modification time. The files whose content changed are listed for the
+deploy of the site.
+
+Classes
+----------
+Manifest
+    The sha256 of every file written, and the files changed in the current run
+ParallelWriter
+    Writes many csv files over a pool of workers
+WriteReport
+    Number of files and bytes written by a ParallelWriter, and the time taken
+
+Functions
+----------
+atomic_output : File
+    Returns a context manager with a file that atomically replaces another one
+write_atomic : None
+    Writes bytes to a file through a temporary file renamed over it
+write_if_changed : Boolean
+    Writes a Dataframe or Series to a csv file, unless the file already has the
+    same content
+write_feather : Boolean
+    Writes a Dataframe to a Feather file, if `pyarrow` is installed
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+try:
+    from pyarrow import feather
+except ImportError:
+    feather = None
+from instrumentation import recorder
+
+LOGGER = logging.getLogger(__name__)
+
+manifest = None
+
+class Manifest:
+    """The sha256 of every file written, along with the modification time and
+    size the file had once written, and the files whose content changed in
+    the current run.
+
+    A file whose modification time or size no longer matches the manifest was
+    changed by something else, and is written again even if the sha256 of its
+    new content is the same.
+
+    Parameters
+    ----------
+    path : String
+        The path of the json file of the manifest, which is read if it exists
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.changed = []
+        self.__updates = {}
+        self.__lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as entries:
+                self.entries = json.load(entries)
+
+    def known(self, path):
+        """Returns the entry of the file `path`, with its "sha256" and its
+        "signature", or None if it is not in the manifest.
+
+        Parameters
+        ----------
+        path : String
+            The path of the file
+
+        Returns
+        ----------
+        entry : Dictionary
+        """
+        return self.entries.get(os.path.normpath(path))
+
+    def record(self, path, digest, signature, changed):
+        """Records the sha256 and the signature of the file `path` after a
+        write, and whether its content changed.
+
+        Parameters
+        ----------
+        path : String
+            The path of the file
+        digest : String
+            The sha256 of the content of the file
+        signature : List
+            The modification time in nanoseconds and the size of the file
+        changed : Boolean
+            Whether the file was written with new content
+
+        Returns
+        ----------
+        None
+        """
+        path = os.path.normpath(path)
+        entry = {"sha256" : digest, "signature" : signature}
+        with self.__lock:
+            self.entries[path] = entry
+            self.__updates[path] = entry
+            if changed:
+                self.changed.append(path)
+
+    def drain(self):
+        """Returns the entries recorded and the files changed since the last
+        call, and forgets them, so that a process of a pool can pass them on
+        to the process that saves the manifest.
+
+        Returns
+        ----------
+        updates : (Dictionary, List)
+            The entries recorded, keyed by path, and the files changed
+        """
+        with self.__lock:
+            updates = self.__updates, self.changed
+            self.__updates = {}
+            self.changed = []
+        return updates
+
+    def merge(self, updates):
+        """Adds entries and changed files returned by `drain`, possibly in
+        another process, to the manifest.
+
+        Parameters
+        ----------
+        updates : (Dictionary, List)
+            The entries recorded, keyed by path, and the files changed
+
+        Returns
+        ----------
+        None
+        """
+        entries, changed = updates
+        with self.__lock:
+            self.entries.update(entries)
+            self.__updates.update(entries)
+            self.changed.extend(changed)
+
+    def save(self, changed_files=None):
+        """Writes the manifest to its json file, and the sorted list of the
+        files changed in the current run to the text file `changed_files`,
+        one path per line.
+
+        Parameters
+        ----------
+        changed_files : String, optional
+            The path of the list of changed files, which is not written if
+            none is provided
+
+        Returns
+        ----------
+        None
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.__lock:
+            content = json.dumps(self.entries, indent=1, sort_keys=True)
+            changed = sorted(set(self.changed))
+        write_atomic(content.encode("utf-8"), self.path, record=False)
+        if changed_files is not None:
+            write_atomic("".join(path + "\n" for path in changed).encode(
+                "utf-8"), changed_files, record=False)
+
+@contextmanager
+def atomic_output(path):
+    """Returns a context manager with a binary file that replaces the file
+    `path` when the context exits without errors.
+
+    The file is a temporary file in the same folder as `path`, that is renamed
+    over it, so `path` never has partial content. It is removed if the context
+    exits with an error.
+
+    Parameters
+    ----------
+    path : String
+        The path of the file
+
+    Returns
+    ----------
+    output : File
+        The temporary file to write to
+    """
+    folder, name = os.path.split(path)
+    mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    descriptor, temporary = tempfile.mkstemp(dir=folder or ".",
+        prefix="." + name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as output:
+            yield output
+        os.chmod(temporary, mode)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+def write_atomic(content, path, record=True):
+    """Writes the bytes `content` to the file `path` through a temporary file
+    in the same folder that is then renamed over it.
+
+    When `manifest` is set, the file is left as it was if it already has the
+    same content, and the write is recorded in the manifest.
+
+    Parameters
+    ----------
+    content : Bytes
+        The content of the file
+    path : String
+        The path of the file
+    record : Boolean, optional
+        Whether the write goes through `manifest`, if it is set
+
+    Returns
+    ----------
+    None
+    """
+    if record and manifest is not None:
+        size, digest, signature = _write_content(content, path, True,
+                                                 manifest.known(path))
+        manifest.record(path, digest, signature, size is not None)
+        return
+    with atomic_output(path) as output:
+        output.write(content)
+
+def write_if_changed(data, path, **kwargs):
+    """Writes the Dataframe or Series `data` to the csv file `path`, unless the
+    file already has the same content.
+
+    Parameters
+    ----------
+    data : Dataframe OR Series
+        The data to write
+    path : String
+        The path of the csv file
+    **kwargs
+        The keyword arguments passed on to `to_csv`
+
+    Returns
+    ----------
+    changed : Boolean
+        Whether the file was written
+    """
+    with recorder.stage("write " + path, rows=len(data)):
+        known = None if manifest is None else manifest.known(path)
+        size, digest, signature = _write_job((data, path, kwargs, True,
+                                              known))
+        if manifest is not None:
+            manifest.record(path, digest, signature, size is not None)
+        return size is not None
+
+def write_feather(data, path):
+    """Writes the Dataframe `data` to the Feather file `path`, uncompressed so
+    that readers can memory-map it, if `pyarrow` is installed.
+
+    Parameters
+    ----------
+    data : Dataframe
+        The data to write, with a default index
+    path : String
+        The path of the Feather file
+
+    Returns
+    ----------
+    written : Boolean
+        Whether the file was written, which is False without `pyarrow`
+    """
+    if feather is None:
+        LOGGER.warning("pyarrow is not installed, skipping %s", path)
+        return False
+    sink = io.BytesIO()
+    feather.write_feather(data, sink, compression="uncompressed")
+    write_atomic(sink.getvalue(), path)
+    return True
+
+def _write_job(job):
+    """Serializes and writes a job of a ParallelWriter, and returns the number
+    of bytes written, or None if the file was left as it was, along with the
+    sha256 of the content and the signature of the file.
+    """
+    data, path, kwargs, if_changed, known = job
+    content = data.to_csv(**kwargs).encode("utf-8")
+    return _write_content(content, path, if_changed, known)
+
+def _write_content(content, path, if_changed, known):
+    """Writes the bytes `content` to the file `path`, unless the manifest entry
+    `known` of the file has the same sha256 and the file is as it was left,
+    or `if_changed` is set and the file already has the same content.
+
+    Returns the number of bytes written, or None if the file was left as it
+    was, along with the sha256 of the content and the signature of the file.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    signature = _signature(path)
+    if known is not None and known["sha256"] == digest \
+            and known["signature"] == signature:
+        return None, digest, signature
+    if if_changed and signature is not None \
+            and signature[1] == len(content):
+        with open(path, "rb") as current:
+            if current.read() == content:
+                return None, digest, signature
+    with atomic_output(path) as output:
+        output.write(content)
+    return len(content), digest, _signature(path)
+
+def _signature(path):
+    """Returns the modification time in nanoseconds and the size of the file
+    `path`, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+class WriteReport:
+    """Number of files and bytes written by a ParallelWriter, and the time
+    taken to write them.
+
+    Parameters
+    ----------
+    files : Integer
+        The number of files written
+    skipped : Integer
+        The number of files left as they were because they had not changed
+    size : Integer
+        The number of bytes written
+    seconds : Float
+        The time taken to serialize and write the files
+    """
+
+    def __init__(self, files, skipped, size, seconds):
+        self.files = files
+        self.skipped = skipped
+        self.size = size
+        self.seconds = seconds
+
+    @property
+    def files_per_second(self):
+        """Float: the number of files written per second."""
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self):
+        """Float: the number of bytes written per second."""
+        return self.size / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return ("wrote {} files ({:.1f} kB, {} unchanged) in {:.2f} s: "
+                "{:.0f} files/s, {:.1f} kB/s").format(self.files,
+                    self.size / 1024, self.skipped, self.seconds,
+                    self.files_per_second, self.bytes_per_second / 1024)
+
+class ParallelWriter:
+    """Writes many csv files over a pool of workers.
+
+    Serializing a Dataframe or Series to csv and writing it is done by the
+    workers, one file per task, and every file is written atomically.
+
+    Parameters
+    ----------
+    workers : Integer, optional
+        The number of workers. The default of `concurrent.futures` is used if
+        none is provided, and the files are written in the calling thread if
+        it is 1
+    processes : Boolean, optional
+        Whether the workers are processes instead of threads
+    """
+
+    def __init__(self, workers=None, processes=False):
+        self.workers = workers
+        self.processes = processes
+
+    def write(self, jobs, if_changed=False, label="csv files"):
+        """Writes the csv file of every job in `jobs`.
+
+        Parameters
+        ----------
+        jobs : List
+            A list of (data, path, kwargs) tuples, where `data` is written to
+            the csv file `path` with the keyword arguments `kwargs` of `to_csv`
+        if_changed : Boolean, optional
+            Whether files that already have the same content are left as they
+            were, which they always are when `manifest` is set
+        label : String, optional
+            The name of the files in the logged report
+
+        Returns
+        ----------
+        report : WriteReport
+            The number of files and bytes written and the time taken
+        """
+        tasks = [(data, path, kwargs, if_changed or manifest is not None,
+                  None if manifest is None else manifest.known(path))
+                 for data, path, kwargs in jobs]
+        start = time.perf_counter()
+        with recorder.stage("write " + label, rows=len(tasks)):
+            if self.workers == 1 or len(tasks) <= 1:
+                results = [_write_job(task) for task in tasks]
+            else:
+                pool = ProcessPoolExecutor if self.processes \
+                    else ThreadPoolExecutor
+                with pool(max_workers=self.workers) as executor:
+                    results = list(executor.map(_write_job, tasks,
+                        chunksize=64 if self.processes else 1))
+        sizes = [size for size, _, _ in results]
+        written = [size for size in sizes if size is not None]
+        if manifest is not None:
+            for (_, path, _, _, _), (size, digest, signature) \
+                    in zip(tasks, results):
+                manifest.record(path, digest, signature, size is not None)
+        report = WriteReport(len(written), len(sizes) - len(written),
+            sum(written), time.perf_counter() - start)
+        LOGGER.info("%s: %s", label, report)
+        return report